@@ -2,12 +2,178 @@
 Clinic Legacy Application - Main Flask Routes
 Refactored to use ClinicRepository for data management.
 Phase 6: Added form validation with flash messages.
+Phase 13: Listing routes and the JSON API support keyset pagination (?limit=&cursor=).
+Phase 14: Streaming NDJSON / JSON array export endpoints.
+Phase 15: Read routes are cached per repository generation, with ETag / 304 support.
+Phase 16: Bulk import endpoint (/api/import) for CSV / NDJSON uploads.
+Phase 17: Appointment scheduling (time, duration, provider) with conflict checks and /api/free-slots.
+Phase 18: Dashboard counters come from incrementally maintained statistics, also at /api/stats.
+Phase 19: Prometheus /metrics endpoint and opt-in slow-request profiling (see metrics.py).
+Phase 20: Ranked full-text search over notes and descriptions (/appointments?text=, /api/search).
+Phase 21: Typo-tolerant patient lookup by name and phone (/api/patients/search, see fuzzy.py).
+Phase 22: Table rows are rendered from cached per-record fragments; compiled templates are
+          cached on disk (CLINIC_TEMPLATE_CACHE_DIR) to cut cold-start time.
+Phase 23: Grouped reports over NumPy column arrays at /api/reports (needs NumPy; else 501).
+Phase 24: Change feed for delta sync (/api/changes?since=, with long polling).
+Phase 25: Batched reads: /api/patients?ids=, /api/patients/<id>(/appointments), ?include=appointments.
+Phase 26: Fingerprinted, precompressed static assets with immutable caching (asset_url() in
+          templates, see assets.py); HTML and JSON responses are compressed when accepted.
 """
-from flask import Flask, request, redirect, url_for, render_template, jsonify, flash
-from repository import clinic
+import json
+import os
+from functools import wraps
+from itertools import islice
+
+from flask import (Flask, Response, request, redirect, url_for, render_template, jsonify, flash,
+                   session, stream_with_context)
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from assets import AssetPipeline, compress_responses
+from cache import LRUCache
+from importer import KINDS, ImportStopped, import_records, read_records
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, SlowRequestProfiler, cache_metrics,
+                     instrument_app, instrument_repository)
+from reports import HAVE_NUMPY, ClinicReports
+from repository import get_default
+from fuzzy import PatientMatcher
+from scheduling import DEFAULT_DURATION, SchedulingConflict
+from search import TextSearch
+from stats import ClinicStats
+from validators import (MAX_PAGE_SIZE, PatientNotFound, id_list, page_args, validate_appointment, validate_patient,
+                        validate_schedule)
 
 app = Flask(__name__)
 app.secret_key = 'clinic-legacy-secret-key-2025'  # Required for flash messages
+# Compiled templates are reused across restarts (default: a per-user temp directory)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(os.environ.get('CLINIC_TEMPLATE_CACHE_DIR') or None)
+
+PAGE_SIZE = 50  # Default rows per page on the HTML listing pages
+DASHBOARD_ROWS = 5
+MAX_CHANGES_WAIT = 30  # Longest /api/changes long poll, in seconds
+
+
+# Rendered HTML / JSON responses, keyed by request path and tagged with the
+# repository generation they were rendered at.
+response_cache = LRUCache(max_entries=512, max_bytes=64 * 1024 * 1024)
+
+# Rendered table rows, keyed by record and tagged with what the row shows that
+# can change (the patient version; the patient name on appointment rows), so a
+# write re-renders only the rows it touched.
+row_cache = LRUCache(max_entries=50_000, max_bytes=32 * 1024 * 1024)
+
+# Compressed bodies of cached responses, keyed by URL and encoding and tagged with the ETag
+compressed_cache = LRUCache(max_entries=1024, max_bytes=16 * 1024 * 1024)
+
+# Metrics served at /metrics; set CLINIC_PROFILE_SLOW_MS to profile slow requests
+metrics = Registry()
+caches = {'response': response_cache, 'row': row_cache, 'compressed': compressed_cache}
+cache_metrics(metrics, caches)
+instrument_app(app, metrics, profiler=SlowRequestProfiler.from_environ())
+
+clinic = stats = text_search = patient_matcher = reports = None  # Repository served and its read models
+
+
+def use_repository(repository):
+    """
+    Serve repository from now on (e.g. a benchmark's or a test's data set).
+    The read models are rebuilt from it and the response caches cleared.
+    """
+    global clinic, stats, text_search, patient_matcher, reports
+    for follower in (stats, text_search, patient_matcher, reports):
+        if follower is not None:  # Stop following the previous repository
+            clinic.unsubscribe(follower.handle)
+    clinic = repository
+    # Running totals and distributions, updated by repository mutation events
+    stats = ClinicStats(clinic)
+    # Full-text indexes over patient notes and appointment descriptions
+    text_search = TextSearch(clinic)
+    # Fuzzy name / phone index for finding existing patients
+    patient_matcher = PatientMatcher(clinic)
+    # Column arrays for /api/reports (None without NumPy)
+    reports = ClinicReports(clinic) if HAVE_NUMPY else None
+    instrument_repository(clinic, metrics)
+    caches['query'] = clinic._query_cache
+    for cache in (response_cache, row_cache, compressed_cache):
+        cache.clear()
+
+
+use_repository(get_default())
+
+# Minified, fingerprinted static assets, rebuilt at startup (CLINIC_ASSET_DIR: where to)
+assets = AssetPipeline(app, os.environ.get('CLINIC_ASSET_DIR') or None)
+compress_responses(app, cache=compressed_cache)
+
+
+def cached_view(view=None, daily=False):
+    """
+    Cache a GET view's response until the next repository mutation.
+    
+    The ETag is the repository version tag, so a client revalidating with
+    If-None-Match gets a 304 without the page being rendered at all. Pages
+    with pending flash messages are rendered fresh and never cached.
+    Use @cached_view(daily=True) for pages that also show date-relative
+    counts: the date is then part of the version, so they expire at midnight.
+    """
+    if view is None:
+        return lambda view: cached_view(view, daily)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('_flashes'):
+            return view(*args, **kwargs)
+        version = clinic.version_tag
+        if daily:
+            version = f'{version}-{stats.today()}'
+        etag = f'"{version}"'
+        if request.if_none_match.contains_weak(version):  # Compressed responses carry W/ ETags
+            response = Response(status=304)
+            response.headers['ETag'] = etag
+            return response
+        key = request.url
+        cached = response_cache.get(key, version)
+        if cached is None:
+            response = app.make_response(view(*args, **kwargs))
+            body = response.get_data()
+            headers = [(k, v) for k, v in response.headers.items() if k != 'Content-Length']
+            cached = (body, response.status_code, headers)
+            response_cache.set(key, version, cached, size=len(body) + 256)
+        body, status, headers = cached
+        response = Response(body, status=status, headers=headers)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+
+def _render_rows(macro, records, key, tag):
+    """
+    Render each record with a row macro from _rows.html, reusing the HTML
+    cached for the record's key at its current tag. One call per table keeps
+    Jinja's per-call overhead out of the row loop.
+    """
+    render = getattr(app.jinja_env.get_template('_rows.html').module, macro)
+    rows = []
+    for record in records:
+        row_key, row_tag = key(record), tag(record)
+        html = row_cache.get(row_key, row_tag)
+        if html is None:
+            html = render(record)
+            row_cache.set(row_key, row_tag, html, size=len(html) + 128)
+        rows.append(html)
+    return Markup('\n'.join(rows))
+
+
+@app.template_global()
+def patient_rows(patients):
+    """The <tr> rows for patient dicts on patients.html."""
+    return _render_rows('patient_row', patients, lambda p: ('patient', p['id']), lambda p: p['version'])
+
+
+@app.template_global()
+def appointment_rows(appointments):
+    """The <tr> rows for appointment dicts (with patient_name) on appointments.html."""
+    return _render_rows('appointment_row', appointments,
+                        lambda a: ('appointment', a['id']), lambda a: a['patient_name'])
 
 
 # ========================================
@@ -15,17 +181,29 @@ app.secret_key = 'clinic-legacy-secret-key-2025'  # Required for flash messages
 # ========================================
 
 @app.route('/')
+@cached_view(daily=True)
 def index():
     """Dashboard showing patients and appointments."""
+    patients, _ = clinic.get_patients_page(DASHBOARD_ROWS)
+    appointments, _ = clinic.get_appointments_page(DASHBOARD_ROWS, with_patient_names=True)
     return render_template('index.html', 
-                          patients=clinic.get_all_patients(), 
-                          appointments=clinic.get_appointments_with_patient_names())
+                          patients=patients, 
+                          appointments=appointments,
+                          stats=stats.snapshot())
 
 
 @app.route('/patients')
+@cached_view
 def list_patients():
-    """List all patients."""
-    return render_template('patients.html', patients=clinic.get_all_patients())
+    """List patients, one page at a time."""
+    limit, cursor = page_args(request.args, PAGE_SIZE)
+    patients, next_cursor = clinic.get_patients_page(limit, cursor)
+    return render_template('patients.html', 
+                          patients=patients,
+                          total=clinic.count_patients(),
+                          limit=limit,
+                          cursor=cursor,
+                          next_cursor=next_cursor)
 
 
 @app.route('/patients/add', methods=['GET', 'POST'])
@@ -35,25 +213,18 @@ def patient_add():
         name = request.form.get('name', '').strip()
         age = request.form.get('age', '').strip()
         phone = request.form.get('phone', '').strip()
+        notes = request.form.get('notes', '').strip()
         
         # Validation
-        errors = []
-        if not name:
-            errors.append('Name is required')
-        if not age:
-            errors.append('Age is required')
-        elif not age.isdigit() or int(age) < 0 or int(age) > 150:
-            errors.append('Age must be a valid number between 0 and 150')
-        if not phone:
-            errors.append('Phone is required')
+        errors = validate_patient(name, age, phone)
         
         if errors:
             for error in errors:
                 flash(error, 'error')
             return render_template('patient_add.html', 
-                                  name=name, age=age, phone=phone)
+                                  name=name, age=age, phone=phone, notes=notes)
         
-        clinic.add_patient(name, age, phone)
+        clinic.add_patient(name, age, phone, notes)
         flash('Patient added successfully!', 'success')
         return redirect(url_for('list_patients'))
     return render_template('patient_add.html')
@@ -71,25 +242,18 @@ def patient_edit(pid):
         name = request.form.get('name', '').strip()
         age = request.form.get('age', '').strip()
         phone = request.form.get('phone', '').strip()
+        notes = request.form.get('notes', '').strip()
         
         # Validation
-        errors = []
-        if not name:
-            errors.append('Name is required')
-        if not age:
-            errors.append('Age is required')
-        elif not age.isdigit() or int(age) < 0 or int(age) > 150:
-            errors.append('Age must be a valid number between 0 and 150')
-        if not phone:
-            errors.append('Phone is required')
+        errors = validate_patient(name, age, phone)
         
         if errors:
             for error in errors:
                 flash(error, 'error')
             return render_template('patient_edit.html', 
-                                  patient={'id': pid, 'name': name, 'age': age, 'phone': phone})
+                                  patient={'id': pid, 'name': name, 'age': age, 'phone': phone, 'notes': notes})
         
-        clinic.update_patient(pid, name, age, phone)
+        clinic.update_patient(pid, name, age, phone, notes)
         flash('Patient updated successfully!', 'success')
         return redirect(url_for('list_patients'))
     return render_template('patient_edit.html', patient=patient)
@@ -108,22 +272,39 @@ def del_patient(pid):
 # ========================================
 
 @app.route('/appointments')
+@cached_view
 def list_appointments():
-    """List all appointments with optional search."""
+    """List appointments (paginated) with optional name / date / full-text search."""
     search_query = request.args.get('q', '').strip()
     search_date = request.args.get('date', '').strip()
+    search_text = request.args.get('text', '').strip()
+    limit, cursor = page_args(request.args, PAGE_SIZE)
+    next_cursor = None
     
-    if search_query or search_date:
+    if search_text:
+        # Best full-text matches first, optionally narrowed by name / date
+        if search_query or search_date:
+            allowed = {a['id'] for a in clinic.search_appointments(query=search_query, date=search_date)}
+            ranked = [aid for aid, _ in text_search.search_appointments(search_text, limit=None) if aid in allowed]
+        else:
+            ranked = [aid for aid, _ in text_search.search_appointments(search_text, limit=limit)]
+        appointments = clinic.get_appointments_by_ids(ranked[:limit], with_patient_names=True)
+    elif search_query or search_date:
         # Use search if filters provided
         appointments = clinic.search_appointments(query=search_query, date=search_date)
     else:
-        # Return all appointments
-        appointments = clinic.get_appointments_with_patient_names()
+        # Return one page of appointments
+        appointments, next_cursor = clinic.get_appointments_page(limit, cursor, with_patient_names=True)
     
     return render_template('appointments.html', 
                           appointments=appointments,
                           search_query=search_query,
-                          search_date=search_date)
+                          search_date=search_date,
+                          search_text=search_text,
+                          total=clinic.count_appointments(),
+                          limit=limit,
+                          cursor=cursor,
+                          next_cursor=next_cursor)
 
 
 @app.route('/appointments/create', methods=['GET', 'POST'])
@@ -133,33 +314,35 @@ def appointment_create():
         patient_id = request.form.get('patient_id', '').strip()
         date = request.form.get('date', '').strip()
         description = request.form.get('description', '').strip()
+        start_time = request.form.get('start_time', '').strip()
+        duration = request.form.get('duration', '').strip()
+        provider = request.form.get('provider', '').strip()
+        form = dict(selected_patient=patient_id, date=date, description=description,
+                    start_time=start_time, duration=duration, provider=provider)
         
         # Validation
-        errors = []
-        if not patient_id:
-            errors.append('Please select a patient')
-        if not date:
-            errors.append('Date is required')
-        if not description:
-            errors.append('Description is required')
+        errors = validate_appointment(patient_id, date, description) + validate_schedule(start_time, duration)
         
         if errors:
             for error in errors:
                 flash(error, 'error')
             return render_template('appointment_create.html', 
                                   patients=clinic.get_all_patients(),
-                                  selected_patient=patient_id,
-                                  date=date,
-                                  description=description)
+                                  **form)
         
         pid = int(patient_id)
-        patient = clinic.find_patient(pid)
-        if not patient:
+        try:
+            clinic.add_appointment(pid, date, description, start_time, duration, provider)
+        except PatientNotFound:
             flash('Patient not found', 'error')
             return render_template('appointment_create.html', 
                                   patients=clinic.get_all_patients())
-        
-        clinic.add_appointment(pid, date, description)
+        except SchedulingConflict as e:
+            flash(str(e), 'error')
+            return render_template('appointment_create.html',
+                                  patients=clinic.get_all_patients(),
+                                  free_slots=clinic.free_slots(provider, date, int(duration or DEFAULT_DURATION)),
+                                  **form)
         flash('Appointment created successfully!', 'success')
         return redirect(url_for('list_appointments'))
     return render_template('appointment_create.html', patients=clinic.get_all_patients())
@@ -169,16 +352,279 @@ def appointment_create():
 # API Routes
 # ========================================
 
+def _paged_json(items, next_cursor, limit, total):
+    """JSON list response with X-Total-Count, and Link / X-Next-Cursor when more pages exist."""
+    response = jsonify(items)
+    response.headers['X-Total-Count'] = str(total)
+    if next_cursor is not None:
+        next_url = url_for(request.endpoint, limit=limit, cursor=next_cursor, _external=True)
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def _patients_json(patient_ids):
+    """Patient dicts for the ids that exist, embedding appointments with ?include=appointments."""
+    include = request.args.get('include', '')
+    if include not in ('', 'appointments'):
+        return None
+    if include:
+        return clinic.get_patients_with_appointments(patient_ids)
+    return clinic.get_patients_by_ids(patient_ids)
+
+
 @app.route('/api/patients', methods=['GET'])
+@cached_view
 def api_get_patients():
-    """API endpoint: Get all patients."""
-    return jsonify(clinic.get_all_patients())
+    """
+    API endpoint: Get all patients, one page with ?limit=&cursor=, or the patients
+    listed in ?ids=1,2,3 (in that order; ?include=appointments adds their appointments).
+    """
+    if 'ids' in request.args:
+        patient_ids = id_list(request.args['ids'])
+        if patient_ids is None:
+            return jsonify({'error': f'ids must be at most {MAX_PAGE_SIZE} comma-separated integers'}), 400
+        patients = _patients_json(patient_ids)
+        if patients is None:
+            return jsonify({'error': 'include must be appointments'}), 400
+        return jsonify(patients)
+    limit, cursor = page_args(request.args)
+    if limit is None:
+        return jsonify(clinic.get_all_patients())
+    patients, next_cursor = clinic.get_patients_page(limit, cursor)
+    return _paged_json(patients, next_cursor, limit, clinic.count_patients())
+
+
+@app.route('/api/patients/<int:pid>', methods=['GET'])
+@cached_view
+def api_get_patient(pid):
+    """API endpoint: One patient; ?include=appointments adds their appointments."""
+    patients = _patients_json([pid])
+    if patients is None:
+        return jsonify({'error': 'include must be appointments'}), 400
+    if not patients:
+        return jsonify({'error': 'patient not found'}), 404
+    return jsonify(patients[0])
+
+
+@app.route('/api/patients/<int:pid>/appointments', methods=['GET'])
+@cached_view
+def api_get_patient_appointments(pid):
+    """API endpoint: A patient's appointments, by id."""
+    patients = clinic.get_patients_with_appointments([pid])
+    if not patients:
+        return jsonify({'error': 'patient not found'}), 404
+    return jsonify(patients[0]['appointments'])
 
 
 @app.route('/api/appointments', methods=['GET'])
+@cached_view
 def api_get_appointments():
-    """API endpoint: Get all appointments."""
-    return jsonify(clinic.get_appointments_as_api_format())
+    """API endpoint: Get all appointments, or one page with ?limit=&cursor=."""
+    limit, cursor = page_args(request.args)
+    if limit is None:
+        return jsonify(clinic.get_appointments_as_api_format())
+    appointments, next_cursor = clinic.get_appointments_page(limit, cursor)
+    return _paged_json(appointments, next_cursor, limit, clinic.count_appointments())
+
+
+@app.route('/api/search', methods=['GET'])
+@cached_view
+def api_search():
+    """
+    API endpoint: Ranked full-text search.
+    ?q= is required; ?type=appointments (default) or patients; ?limit= (default 50).
+    Each result is the record dict plus its relevance score.
+    """
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'appointments')
+    limit, _ = page_args(request.args, PAGE_SIZE)
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if kind == 'patients':
+        ranked = text_search.search_patients(query, limit)
+        records = clinic.get_patients_by_ids([pid for pid, _ in ranked])
+    elif kind == 'appointments':
+        ranked = text_search.search_appointments(query, limit)
+        records = clinic.get_appointments_by_ids([aid for aid, _ in ranked], with_patient_names=True)
+    else:
+        return jsonify({'error': 'type must be appointments or patients'}), 400
+    scores = dict(ranked)
+    return jsonify([dict(record, score=round(scores[record['id']], 4)) for record in records])
+
+
+@app.route('/api/patients/search', methods=['GET'])
+@cached_view
+def api_search_patients():
+    """
+    API endpoint: Find patients by approximate name and/or phone number.
+    ?q= name (a query with no letters is taken as a phone number), ?phone=,
+    ?limit= (default 10) and ?min_score= (0..1, default 0.5).
+    Each result is the patient dict plus its similarity score.
+    """
+    name = request.args.get('q', '').strip()
+    phone = request.args.get('phone', '').strip()
+    limit, _ = page_args(request.args, 10)
+    min_score = request.args.get('min_score', 0.5, type=float)
+    if name and not any(c.isalpha() for c in name) and not phone:
+        name, phone = '', name
+    if not name and not phone:
+        return jsonify({'error': 'q or phone is required'}), 400
+    ranked = patient_matcher.search(name, phone, limit, min_score)
+    scores = dict(ranked)
+    patients = clinic.get_patients_by_ids([pid for pid, _ in ranked])
+    return jsonify([dict(patient, score=round(scores[patient['id']], 4)) for patient in patients])
+
+
+@app.route('/api/free-slots', methods=['GET'])
+@cached_view
+def api_free_slots():
+    """
+    API endpoint: Free periods of a provider's day.
+    ?date= is required; ?provider=, ?duration= (minutes), ?open= and ?close= (HH:MM) are optional.
+    """
+    date = request.args.get('date', '').strip()
+    provider = request.args.get('provider', '').strip()
+    duration = request.args.get('duration', DEFAULT_DURATION, type=int)
+    open_time = request.args.get('open', '09:00')
+    close_time = request.args.get('close', '17:00')
+    if not date:
+        return jsonify({'error': 'date is required'}), 400
+    if duration is None or duration < 1:
+        return jsonify({'error': 'duration must be a positive number of minutes'}), 400
+    try:
+        slots = clinic.free_slots(provider, date, duration, open_time, close_time)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'provider': provider, 'date': date, 'duration': duration, 'slots': slots})
+
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    """API endpoint: Dashboard statistics (totals, per-day, per-week and age counts)."""
+    return jsonify(stats.snapshot())
+
+
+@app.route('/api/changes', methods=['GET'])
+def api_changes():
+    """
+    API endpoint: Patient and appointment changes after sequence number ?since= (see changes.py).
+    ?limit= caps the changes returned; ?wait= (seconds, at most MAX_CHANGES_WAIT) holds the
+    request open until a change arrives. Without ?since= the response asks for a full resync.
+    """
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', MAX_PAGE_SIZE, type=int)
+    wait = request.args.get('wait', 0, type=float)
+    if since is None and request.args.get('since'):
+        return jsonify({'error': 'since must be an integer'}), 400
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    if wait is None or not 0 <= wait <= MAX_CHANGES_WAIT:
+        return jsonify({'error': f'wait must be between 0 and {MAX_CHANGES_WAIT} seconds'}), 400
+    return jsonify(clinic.get_changes(since, min(limit, MAX_PAGE_SIZE), wait))
+
+
+@app.route('/api/reports', methods=['GET'])
+@cached_view
+def api_reports():
+    """
+    API endpoint: Appointment or patient counts per group.
+    ?report=appointments|patients (default appointments), ?by= (default month; see reports.REPORTS),
+    ?from= and ?to= (YYYY-MM-DD, inclusive).
+    """
+    if reports is None:
+        return jsonify({'error': 'reports need NumPy (pip install numpy)'}), 501
+    try:
+        result = reports.run(request.args.get('report', 'appointments'), request.args.get('by', 'month'),
+                             request.args.get('from') or None, request.args.get('to') or None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint: request, repository, template, JSON and cache metrics."""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    """API endpoint: Hit/miss counters for the response cache."""
+    return jsonify(response_cache.stats())
+
+
+@app.route('/api/import', methods=['POST'])
+def api_import():
+    """
+    API endpoint: Bulk import ?type=patients|appointments from the request body.
+    The body is NDJSON by default, or CSV when sent as text/csv; it is read as a
+    stream and written in validated batches. When a batch is rejected, the
+    batches before it stay written; the 400 response says how many records
+    that is ('imported').
+    """
+    kind = request.args.get('type', '')
+    if kind not in KINDS:
+        return jsonify({'error': 'type must be one of: ' + ', '.join(KINDS)}), 400
+    fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    lines = (line.decode('utf-8') for line in request.stream)
+    try:
+        count = import_records(clinic, kind, read_records(lines, fmt))
+    except ImportStopped as error:
+        return jsonify({'error': 'validation failed', 'imported': error.imported, 'type': kind,
+                        'errors': [{'record': i, 'message': m} for i, m in error.errors[:100]]}), 400
+    except ValueError as error:
+        return jsonify({'error': f'malformed input: {error}'}), 400
+    return jsonify({'imported': count, 'type': kind}), 201
+
+
+# ========================================
+# Streaming Export Routes
+# ========================================
+
+EXPORT_CHUNK_ROWS = 500  # Records serialized per response chunk
+
+
+def _stream_records(records, fmt):
+    """
+    Stream records as NDJSON (one object per line) or as a single JSON array.
+    Memory use is bounded by one chunk, whatever the dataset size.
+    """
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    
+    def ndjson():
+        while True:
+            chunk = list(islice(records, EXPORT_CHUNK_ROWS))
+            if not chunk:
+                return
+            yield ''.join(dumps(r) + '\n' for r in chunk)
+    
+    def json_array():
+        yield '['
+        separator = ''
+        while True:
+            chunk = list(islice(records, EXPORT_CHUNK_ROWS))
+            if not chunk:
+                break
+            yield separator + ','.join(dumps(r) for r in chunk)
+            separator = ','
+        yield ']'
+    
+    if fmt == 'json':
+        return Response(stream_with_context(json_array()), mimetype='application/json')
+    return Response(stream_with_context(ndjson()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/patients/export', methods=['GET'])
+def api_export_patients():
+    """API endpoint: Stream every patient (?format=ndjson, the default, or ?format=json)."""
+    return _stream_records(clinic.iter_patients(), request.args.get('format', 'ndjson'))
+
+
+@app.route('/api/appointments/export', methods=['GET'])
+def api_export_appointments():
+    """API endpoint: Stream every appointment (?format=ndjson, the default, or ?format=json)."""
+    return _stream_records(clinic.iter_appointments(), request.args.get('format', 'ndjson'))
 
 
 # ========================================
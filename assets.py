@@ -0,0 +1,196 @@
+"""
+Static asset pipeline and response compression for the Clinic application.
+
+At startup (or ahead of time with `python assets.py [output_dir]`) every .css
+and .js file under static/ is minified, renamed after a hash of its content
+(css/style.css -> css/style.1a2b3c4d5e.css) and stored with .gz (and, when
+the brotli package is installed, .br) copies. Templates link to assets with
+asset_url('css/style.css'); the /assets/ route serves the precompressed copy
+the browser accepts, marked immutable, since any edit changes the file name.
+
+compress_responses() gzips (or brotli-compresses) HTML and JSON responses
+for clients that accept it. Streamed and file responses, non-200 responses
+and small bodies are sent as they are.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # Optional dependency; without it only gzip is offered
+    brotli = None
+
+HASH_LENGTH = 10  # Hex digits of the content hash in fingerprinted file names
+IMMUTABLE = 'public, max-age=31536000, immutable'
+MIN_COMPRESS_BYTES = 512  # Smaller bodies are not worth the encoding overhead
+COMPRESSIBLE_TYPES = frozenset(('text/html', 'application/json'))
+# Content-Encoding -> file suffix of the precompressed copy, most preferred first
+ENCODINGS = {'br': '.br', 'gzip': '.gz'} if brotli is not None else {'gzip': '.gz'}
+MANIFEST = 'manifest.json'
+
+_STRING = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+_CSS_TOKENS = re.compile(rf'({_STRING})|(?:\s|/\*[\s\S]*?\*/)+')  # Strings, or runs of space and comments
+_JS_COMMENTS = re.compile(rf'({_STRING}|`(?:\\.|[^`\\])*`)|/\*[\s\S]*?\*/|^[ \t]*//[^\n]*', re.M)
+_JS_LINE_BREAKS = re.compile(rf'({_STRING}|`(?:\\.|[^`\\])*`)|\s*\n\s*')
+
+
+def minify_css(source):
+    """Drop comments and collapse whitespace, removing it next to { } ; : , > (strings are kept)."""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        text = match.string
+        before = text[match.start() - 1] if match.start() else '{'
+        after = text[match.end()] if match.end() < len(text) else '}'
+        if before in '{};:,>' or after in '{};,>':
+            return ''
+        return ' '
+    return _CSS_TOKENS.sub(replace, source).strip()
+
+
+def minify_js(source):
+    """
+    Drop block comments and whole-line // comments, and indentation and blank
+    lines. Line breaks are kept, so automatic semicolon insertion is unaffected.
+    """
+    source = _JS_COMMENTS.sub(lambda match: match.group(1) or '', source)
+    return _JS_LINE_BREAKS.sub(lambda match: match.group(1) or '\n', source).strip()
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _compress(data, encoding, level):
+    """Internal: data compressed with encoding ('gzip' or 'br') at level (1-9; br maps it to quality)."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(11, level + 2))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _write(path, data):
+    """Internal: Write a file atomically, so concurrent builds never expose a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def build_assets(source_dir, output_dir):
+    """
+    Minify, fingerprint and precompress every .css / .js file under source_dir.
+    Files already built (same content hash) are left alone.
+    
+    Returns:
+        Manifest {path relative to source_dir: fingerprinted path relative to output_dir},
+        also written to output_dir/manifest.json
+    """
+    manifest = {}
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != os.path.abspath(output_dir)]
+        for name in sorted(files):
+            stem, extension = os.path.splitext(name)
+            minify = MINIFIERS.get(extension)
+            if minify is None:
+                continue
+            source = os.path.join(root, name)
+            with open(source, encoding='utf-8') as f:
+                data = minify(f.read()).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+            directory = os.path.relpath(root, source_dir)
+            built = os.path.normpath(os.path.join(directory, f'{stem}.{digest}{extension}')).replace(os.sep, '/')
+            manifest[os.path.relpath(source, source_dir).replace(os.sep, '/')] = built
+            target = os.path.join(output_dir, built)
+            if os.path.exists(target):
+                continue
+            for encoding, suffix in ENCODINGS.items():
+                _write(target + suffix, _compress(data, encoding, 9))
+            _write(target, data)  # Last: its presence marks a complete build
+    _write(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class AssetPipeline:
+    """Builds an app's static assets at startup and serves them from /assets/."""
+    
+    def __init__(self, app, output_dir=None):
+        """
+        Args:
+            app: The Flask app; its static folder is the source
+            output_dir: Where built assets go (default: a directory in the system temp dir)
+        """
+        self.output_dir = output_dir or os.path.join(tempfile.gettempdir(), 'clinic-assets')
+        self.manifest = build_assets(app.static_folder, self.output_dir)
+        self._built = frozenset(self.manifest.values())
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+    
+    def url(self, filename):
+        """URL of the built copy of a static file (its plain static URL if it is not built)."""
+        built = self.manifest.get(filename)
+        if built is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=built)
+    
+    def serve(self, filename):
+        """View: A built asset, precompressed in the best encoding the client accepts."""
+        if filename not in self._built:
+            abort(404)
+        encoding = request.accept_encodings.best_match(list(ENCODINGS))
+        response = send_from_directory(self.output_dir, filename + ENCODINGS.get(encoding, ''),
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+def compress_responses(app, min_size=MIN_COMPRESS_BYTES, cache=None, level=6):
+    """
+    Compress HTML and JSON responses in the best encoding the client accepts.
+    
+    Args:
+        min_size: Smallest body worth compressing, in bytes
+        cache: Optional cache.LRUCache of compressed bodies. Responses with an
+               ETag (see app.cached_view) are compressed once per ETag and encoding.
+        level: Compression level, 1-9
+    """
+    @app.after_request
+    def compress(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(list(ENCODINGS))
+        if encoding is None or (response.content_length or 0) < min_size:
+            return response
+        etag = response.headers.get('ETag') if cache is not None else None
+        key = (request.url, encoding)
+        body = cache.get(key, etag) if etag else None
+        if body is None:
+            body = _compress(response.get_data(), encoding, level)
+            if etag:
+                cache.set(key, etag, body, size=len(body) + 64)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag and not etag.startswith('W/'):
+            # The encoded body is another representation of the same resource
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+
+if __name__ == '__main__':
+    static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    built = build_assets(static_dir, sys.argv[1] if len(sys.argv) > 1 else
+                         os.path.join(tempfile.gettempdir(), 'clinic-assets'))
+    for source, target in sorted(built.items()):
+        print(f'{source} -> {target}')
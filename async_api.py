@@ -0,0 +1,137 @@
+"""
+Asyncio (ASGI) JSON API for the Clinic application.
+Serves the same /api/patients and /api/appointments responses as app.py,
+including ?limit=&cursor= pagination, ?ids= batches, the Link / X-Next-Cursor /
+X-Total-Count headers and ETag / 304 revalidation, from a single event loop.
+One process can then hold thousands of concurrent keep-alive client
+connections. It has no framework dependency; run it with any ASGI server, e.g.
+
+    uvicorn async_api:app --port 5001
+
+Both servers share the repository configured in repository.py, so with
+CLINIC_DB set they can run side by side against the same data.
+"""
+import json
+from urllib.parse import parse_qs, urlencode
+
+from async_repository import AsyncClinicRepository
+from repository import get_default
+from validators import MAX_PAGE_SIZE, id_list, page_args
+INLINE_ENCODE_ROWS = 200  # Longer JSON lists are encoded in the thread pool
+
+_encode = json.JSONEncoder(separators=(',', ':'), sort_keys=True).encode
+
+
+class ClinicAPI:
+    """Minimal ASGI application exposing the read API routes."""
+    
+    def __init__(self, repository):
+        self.repo = repository
+        self.routes = {
+            '/api/patients': self.patients,
+            '/api/appointments': self.appointments,
+        }
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        handler = self.routes.get(scope['path'].rstrip('/') or '/')
+        if handler is None:
+            await self._send_json(send, 404, {'error': 'not found'})
+            return
+        if scope['method'] != 'GET':
+            await self._send_json(send, 405, {'error': 'method not allowed'})
+            return
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+        version = await self.repo.version_tag()
+        etag = f'"{version}"'
+        if _etag_matches(headers.get('if-none-match', ''), version):
+            await self._send(send, 304, b'', [('etag', etag)])
+            return
+        query = {k: v[-1] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+        status, body, extra_headers = await handler(query, scope, headers)
+        await self._send_json(send, status, body, extra_headers + [('etag', etag), ('cache-control', 'no-cache')])
+    
+    # ========================================
+    # Routes
+    # ========================================
+    
+    async def patients(self, query, scope, headers):
+        if 'ids' in query:
+            patient_ids = id_list(query['ids'])
+            if patient_ids is None:
+                return 400, {'error': f'ids must be at most {MAX_PAGE_SIZE} comma-separated integers'}, []
+            include = query.get('include', '')
+            if include not in ('', 'appointments'):
+                return 400, {'error': 'include must be appointments'}, []
+            if include:
+                return 200, await self.repo.get_patients_with_appointments(patient_ids), []
+            return 200, await self.repo.get_patients_by_ids(patient_ids), []
+        limit, cursor = page_args(query)
+        if limit is None:
+            return 200, await self.repo.get_all_patients(), []
+        page, next_cursor = await self.repo.get_patients_page(limit, cursor)
+        total = await self.repo.count_patients()
+        return 200, page, _page_headers(scope, headers, limit, next_cursor, total)
+    
+    async def appointments(self, query, scope, headers):
+        limit, cursor = page_args(query)
+        if limit is None:
+            return 200, await self.repo.get_appointments_as_api_format(), []
+        page, next_cursor = await self.repo.get_appointments_page(limit, cursor)
+        total = await self.repo.count_appointments()
+        return 200, page, _page_headers(scope, headers, limit, next_cursor, total)
+    
+    # ========================================
+    # ASGI plumbing
+    # ========================================
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def _send_json(self, send, status, payload, headers=()):
+        if isinstance(payload, list) and len(payload) > INLINE_ENCODE_ROWS:
+            body = await self.repo.run(_json_bytes, payload)
+        else:
+            body = _json_bytes(payload)
+        await self._send(send, status, body, [('content-type', 'application/json'), *headers])
+    
+    @staticmethod
+    async def _send(send, status, body, headers):
+        raw_headers = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def _json_bytes(payload):
+    return _encode(payload).encode('utf-8')
+
+
+def _etag_matches(if_none_match, version):
+    """Whether an If-None-Match header names the version, weakly compared (W/ tags, lists, *) like app.py."""
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any((tag[2:] if tag.startswith('W/') else tag) == f'"{version}"' for tag in tags)
+
+
+def _page_headers(scope, headers, limit, next_cursor, total):
+    result = [('x-total-count', str(total))]
+    if next_cursor is not None:
+        host = headers.get('host', 'localhost')
+        next_url = f"{scope.get('scheme', 'http')}://{host}{scope['path']}?" + urlencode(
+            {'limit': limit, 'cursor': next_cursor})
+        result.append(('x-next-cursor', str(next_cursor)))
+        result.append(('link', f'<{next_url}>; rel="next"'))
+    return result
+
+
+app = ClinicAPI(AsyncClinicRepository(get_default()))
@@ -0,0 +1,86 @@
+"""
+Async facade over ClinicRepository for asyncio-based servers.
+Each coroutine runs the matching synchronous method without blocking the event
+loop. Writes, reads on storages that do I/O (SQLite) and reads whose cost
+grows with the whole data set (full lists, searches) run in a thread pool.
+Bounded reads on MemoryStorage (a page, a few ids, a count) are pure CPU work
+lasting microseconds, so by default they run inline, where a thread hop would
+only add latency - unless a write holds or awaits the repository lock, in
+which case they too go to the pool instead of stalling the loop behind it.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from storage import MemoryStorage
+
+
+class AsyncClinicRepository:
+    """Awaitable versions of the ClinicRepository read and write methods."""
+    
+    READS = (
+        'find_patient', 'get_patients_by_ids', 'get_patients_with_appointments', 'get_all_patients',
+        'get_patients_page', 'count_patients', 'get_appointments_for_patients',
+        'get_all_appointments', 'get_appointments_by_ids', 'get_appointments_page', 'count_appointments',
+        'get_appointments_with_patient_names', 'search_appointments',
+        'get_appointments_as_api_format', 'free_slots',
+    )
+    # Reads of every record (or every match); never run inline
+    FULL_READS = (
+        'get_all_patients', 'get_all_appointments', 'get_appointments_with_patient_names',
+        'search_appointments', 'get_appointments_as_api_format',
+    )
+    WRITES = (
+        'add_patient', 'bulk_add_patients', 'update_patient', 'delete_patient',
+        'delete_patients', 'add_appointment', 'bulk_add_appointments',
+    )
+    
+    def __init__(self, repository, executor=None, offload_reads=None):
+        """
+        Args:
+            repository: The ClinicRepository to wrap
+            executor: Thread pool for blocking calls (a 32-thread pool by default)
+            offload_reads: Run bounded reads in the pool too; defaults to True unless
+                           the repository uses MemoryStorage
+        """
+        self.repository = repository
+        self._executor = executor or ThreadPoolExecutor(max_workers=32, thread_name_prefix='clinic-async')
+        if offload_reads is None:
+            offload_reads = not isinstance(repository._storage, MemoryStorage)
+        self._offload_reads = offload_reads
+    
+    def __getattr__(self, name):
+        if name in self.READS:
+            method = getattr(self.repository, name)
+            if self._offload_reads or name in self.FULL_READS:
+                return partial(self._offload, method)
+            return partial(self._read, method)
+        if name in self.WRITES:
+            return partial(self._offload, getattr(self.repository, name))
+        raise AttributeError(name)
+    
+    async def _read(self, method, *args, **kwargs):
+        lock = self.repository._lock
+        if not lock.try_acquire_read():  # A write is running or queued
+            return await self._offload(method, *args, **kwargs)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            lock.release_read()
+    
+    async def _offload(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(method, *args, **kwargs))
+    
+    async def run(self, function, *args):
+        """Run any blocking callable in the pool (e.g. encoding a large response)."""
+        return await self._offload(function, *args)
+    
+    async def version_tag(self):
+        """The repository's version_tag, read in the pool when that is a database query."""
+        if self._offload_reads:
+            return await self._offload(getattr, self.repository, 'version_tag')
+        return self.repository.version_tag
+    
+    def close(self):
+        self._executor.shutdown(wait=True)
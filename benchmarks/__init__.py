@@ -0,0 +1 @@
+"""Performance benchmarks for the Clinic application (run with `python -m benchmarks.<name>`)."""
@@ -0,0 +1,124 @@
+"""
+Load test: requests/second and latency percentiles of the sync Flask API
+(app.py on its threaded server) against the asyncio API (async_api.py on uvicorn).
+
+Both servers run as subprocesses against the same temporary SQLite database,
+seeded with --patients rows. The client opens --connections concurrent
+keep-alive connections (reconnecting when a server closes them) and sends
+--requests requests on each.
+
+Usage:
+    python -m benchmarks.bench_async [--connections 500] [--requests 20]
+                                     [--path /api/patients?limit=50] [--patients 10000]
+Requires uvicorn for the async side (pip install uvicorn).
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HOST = '127.0.0.1'
+SERVERS = {
+    'sync (flask threaded)': [sys.executable, '-c',
+                              'import sys; from app import app; '
+                              'app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True)'],
+    'async (uvicorn)': [sys.executable, '-m', 'uvicorn', 'async_api:app', '--host', HOST,
+                        '--log-level', 'warning', '--no-access-log', '--port'],
+}
+
+
+def seed(db_path, patients):
+    """Create and fill the shared database."""
+    from repository import ClinicRepository
+    from storage import SQLiteStorage
+    repo = ClinicRepository(SQLiteStorage(db_path))
+    repo.bulk_add_patients({'name': f'Patient {i}', 'age': 20 + i % 60, 'phone': f'091-{i:07d}'}
+                           for i in range(patients))
+    repo.close()
+
+
+async def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def client(port, path, requests, latencies, failures):
+    request = f'GET {path} HTTP/1.1\r\nHost: {HOST}:{port}\r\n\r\n'.encode()
+    reader = writer = None
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(HOST, port)
+            writer.write(request)
+            await writer.drain()
+            head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').lower()
+            length = int(head.split('content-length:')[1].split('\r\n')[0])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if head.startswith('http/1.0') or 'connection: close' in head:
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError, IndexError):
+            failures.append(1)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, path, connections, requests):
+    latencies = []
+    failures = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, path, requests, latencies, failures) for _ in range(connections)))
+    return latencies, len(failures), time.perf_counter() - start
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--path', default='/api/patients?limit=50')
+    parser.add_argument('--patients', type=int, default=10_000)
+    args = parser.parse_args()
+    
+    directory = tempfile.mkdtemp(prefix='clinic-async-')
+    db_path = os.path.join(directory, 'clinic.db')
+    seed(db_path, args.patients)
+    env = dict(os.environ, CLINIC_DB=db_path)
+    env.pop('CLINIC_JOURNAL_DIR', None)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    
+    for port, (label, command) in enumerate(SERVERS.items(), start=5601):
+        server = subprocess.Popen(command + [str(port)], cwd=root, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            asyncio.run(wait_for_port(port))
+            latencies, failures, elapsed = asyncio.run(load(port, args.path, args.connections, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f'{label:>22}: {len(latencies) / elapsed:8.0f} req/s  '
+              f'p50 {percentile(latencies, 50) * 1e3:7.1f} ms  '
+              f'p99 {percentile(latencies, 99) * 1e3:7.1f} ms  failures {failures}')
+
+
+if __name__ == '__main__':
+    main()
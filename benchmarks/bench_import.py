@@ -0,0 +1,69 @@
+"""
+Benchmark: import throughput (records/second), one-at-a-time adds vs bulk import.
+
+Usage:
+    python -m benchmarks.bench_import [--records 200000] [--backend memory|sqlite]
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from importer import import_records, read_records
+from repository import ClinicRepository
+from storage import SQLiteStorage
+
+
+def make_repo(backend, directory):
+    if backend == 'sqlite':
+        return ClinicRepository(SQLiteStorage(os.path.join(directory, f'bench-{time.time_ns()}.db')))
+    return ClinicRepository()
+
+
+def patient_csv(count):
+    lines = ['name,age,phone'] + [f'Patient {i},{20 + i % 60},091-{i:07d}' for i in range(count)]
+    return '\n'.join(lines) + '\n'
+
+
+def rate(count, seconds):
+    return f'{count / seconds:>10,.0f} records/s ({seconds:.2f} s)'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=200_000)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    args = parser.parse_args()
+    n = args.records
+    directory = tempfile.mkdtemp(prefix='clinic-import-')
+    
+    repo = make_repo(args.backend, directory)
+    start = time.perf_counter()
+    for i in range(n):
+        repo.add_patient(f'Patient {i}', str(20 + i % 60), f'091-{i:07d}')
+    print(f'add_patient loop      : {rate(n, time.perf_counter() - start)}')
+    repo.close()
+    
+    repo = make_repo(args.backend, directory)
+    records = [{'name': f'Patient {i}', 'age': 20 + i % 60, 'phone': f'091-{i:07d}'} for i in range(n)]
+    start = time.perf_counter()
+    repo.bulk_add_patients(records)
+    print(f'bulk_add_patients     : {rate(n, time.perf_counter() - start)}')
+    
+    start = time.perf_counter()
+    repo.bulk_add_appointments({'patient_id': 1 + i % n, 'date': '2025-12-25', 'description': 'Checkup'}
+                               for i in range(n))
+    print(f'bulk_add_appointments : {rate(n, time.perf_counter() - start)}')
+    repo.close()
+    
+    repo = make_repo(args.backend, directory)
+    text = io.StringIO(patient_csv(n))
+    start = time.perf_counter()
+    import_records(repo, 'patients', read_records(text, 'csv'))
+    print(f'CSV import (streamed) : {rate(n, time.perf_counter() - start)}')
+    repo.close()
+
+
+if __name__ == '__main__':
+    main()
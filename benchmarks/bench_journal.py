@@ -0,0 +1,72 @@
+"""
+Benchmark: write latency and recovery time of the journaled in-memory repository.
+
+Usage:
+    python -m benchmarks.bench_journal [--records 1000000] [--dir /tmp/clinic-journal]
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from journal import Journal
+from repository import ClinicRepository
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def write_records(repo, count):
+    """Add count records (half patients, half appointments); return per-call latencies."""
+    latencies = []
+    patients = count // 2
+    for i in range(patients):
+        start = time.perf_counter()
+        repo.add_patient(f'Patient {i}', str(20 + i % 60), f'091-{i:07d}')
+        latencies.append(time.perf_counter() - start)
+    for i in range(count - patients):
+        start = time.perf_counter()
+        repo.add_appointment(1 + i % patients, f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}', 'Checkup')
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--dir', default=None, help='Journal directory (default: a temp dir)')
+    args = parser.parse_args()
+    directory = args.dir or tempfile.mkdtemp(prefix='clinic-journal-')
+    
+    baseline = write_records(ClinicRepository(), args.records)
+    
+    repo = ClinicRepository(journal=Journal(directory))
+    journaled = write_records(repo, args.records)
+    repo.close()
+    
+    for label, samples in (('in-memory', baseline), ('journaled', journaled)):
+        print(f'{label:>10} write: p50 {percentile(samples, 50) * 1e6:7.1f} us  '
+              f'p99 {percentile(samples, 99) * 1e6:7.1f} us  '
+              f'max {max(samples) * 1e3:7.2f} ms')
+    
+    start = time.perf_counter()
+    recovered = ClinicRepository(journal=Journal(directory))
+    print(f'recover {args.records} log records: {time.perf_counter() - start:.2f} s')
+    
+    start = time.perf_counter()
+    recovered._journal.snapshot(recovered._storage)
+    print(f'snapshot: {time.perf_counter() - start:.2f} s')
+    recovered.close()
+    
+    start = time.perf_counter()
+    ClinicRepository(journal=Journal(directory)).close()
+    print(f'recover {args.records} records from snapshot: {time.perf_counter() - start:.2f} s')
+    
+    if args.dir is None:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
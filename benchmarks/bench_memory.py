@@ -0,0 +1,79 @@
+"""
+Benchmark: bytes per record for appointments and patients.
+
+Compares the previous model layout (plain classes with a per-instance __dict__,
+age kept as a string, a fresh description string per record as it arrives from
+a form) with the current slotted models in models.py.
+
+Usage:
+    python -m benchmarks.bench_memory [--records 1000000]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from models import Patient, Appointment
+
+DESCRIPTIONS = ['General Checkup', 'Follow-up', 'Vaccination', 'Blood Test', 'Consultation']
+
+
+class LegacyPatient:
+    """The pre-slots Patient layout, kept here only as the baseline."""
+    
+    def __init__(self, id, name, age, phone, notes=''):
+        self.id = id
+        self.name = name
+        self.age = age
+        self.phone = phone
+        self.notes = notes
+
+
+class LegacyAppointment:
+    """The pre-slots Appointment layout, kept here only as the baseline."""
+    
+    def __init__(self, id, patient_id, date, description):
+        self.id = id
+        self.patient_id = patient_id
+        self.date = date
+        self.description = description
+
+
+def fresh(text):
+    """Return an equal but distinct string object, as request parsing would."""
+    return ''.join(list(text))
+
+
+def measure(build, count):
+    """Return bytes per record allocated by build(i) for count records."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.records
+    
+    def date(i):
+        return fresh(f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}')
+    
+    rows = [
+        ('appointment', 'legacy', lambda i: LegacyAppointment(i, i % 1000, date(i), fresh(DESCRIPTIONS[i % 5]))),
+        ('appointment', 'slotted', lambda i: Appointment(i, i % 1000, date(i), fresh(DESCRIPTIONS[i % 5]))),
+        ('patient', 'legacy', lambda i: LegacyPatient(i, f'Patient {i}', fresh(str(20 + i % 60)), '091-111-222')),
+        ('patient', 'slotted', lambda i: Patient(i, f'Patient {i}', fresh(str(20 + i % 60)), '091-111-222')),
+    ]
+    print(f'{n} records each (includes the list slot, 8 bytes/record)')
+    for kind, layout, build in rows:
+        print(f'{kind:>12} {layout:>8}: {measure(build, n):7.1f} bytes/record')
+
+
+if __name__ == '__main__':
+    main()
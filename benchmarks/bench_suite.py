@@ -0,0 +1,350 @@
+"""
+Benchmark suite: every ClinicRepository method and every app.py route.
+
+Fills a repository with synthetic data (see datagen.py), then times each case
+and reports throughput, latency percentiles and the peak memory allocated by
+one call (tracemalloc, measured in a separate untimed run). Routes go through
+the Flask test client with the response caches cleared before each request,
+so they measure rendering (and compression), not cache hits.
+
+Results can be saved as a baseline and later runs compared against it; the
+comparison exits with status 1 if any case's p50 latency regressed by more
+than --threshold percent (and by at least --min-delta-ms, to ignore timer noise
+on microsecond-scale cases).
+
+Usage:
+    python -m benchmarks.bench_suite [--size small|medium|large] [--backend memory|sqlite]
+                                     [--patients N] [--appointments N] [--filter TEXT]
+                                     [--save baseline.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from itertools import islice
+from urllib.parse import urlencode
+
+from benchmarks.datagen import PROVIDERS, appointment_records, patient_records, populate
+from repository import ClinicRepository
+from storage import SQLiteStorage
+
+SIZES = {  # patients, appointments
+    'small': (10_000, 20_000),
+    'medium': (100_000, 200_000),
+    'large': (1_000_000, 1_000_000),
+}
+TEXT_QUERIES = ('diabetic follow-up', 'blood test', 'allergic penicillin', 'eye exams')
+NOTE_QUERIES = ('diabetic', 'allergic to penicillin', 'hypertension', 'asthma')  # Patient notes only
+FUZZY_QUERIES = ('Ahmad Ali', 'Mohammad Alwerfali', 'Yusuf Gadafi', 'Aicha Ben Ali')  # Plus one phone, see route_cases
+
+# run(i) performs one operation; repeat is scaled down for full scans
+Case = namedtuple('Case', 'name run repeat')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# ========================================
+# Cases
+# ========================================
+
+def repository_cases(repo, patients, appointments, repeat):
+    """One or more cases per public ClinicRepository method."""
+    scan = max(3, repeat // 50)  # Whole-dataset calls are slow at 1M rows
+    new_patients = iter(patient_records(10 ** 9, seed=99))
+    new_appointments = iter(appointment_records(10 ** 9, patients // 2, seed=99, scheduled=0))
+    victims = iter(range(patients, 0, -1))  # delete_patient removes ids from the top
+    
+    def page(method):
+        return lambda i: method(100, (i * 100) % max(1, patients - 100))
+    
+    return [
+        Case('repo.add_patient', lambda i: repo.add_patient(**{k: str(v) for k, v in next(new_patients).items()
+                                                              if k != 'notes'}), repeat),
+        Case('repo.bulk_add_patients[1000]', lambda i: repo.bulk_add_patients(
+            [next(new_patients) for _ in range(1000)]), max(3, repeat // 100)),
+        Case('repo.find_patient', lambda i: repo.find_patient(1 + i * 7919 % patients), repeat),
+        Case('repo.get_patients_with_appointments[20]', lambda i: repo.get_patients_with_appointments(
+            [1 + (i + k) * 7919 % patients for k in range(20)]), repeat),
+        Case('repo.get_all_patients', lambda i: repo.get_all_patients(), scan),
+        Case('repo.get_patients_page[100]', page(repo.get_patients_page), repeat),
+        Case('repo.count_patients', lambda i: repo.count_patients(), repeat),
+        Case('repo.iter_patients', lambda i: sum(1 for _ in repo.iter_patients()), scan),
+        Case('repo.update_patient', lambda i: repo.update_patient(
+            1 + i * 7919 % (patients // 2), f'Updated {i}', str(i % 90), '091-0000000'), repeat),
+        Case('repo.delete_patient', lambda i: repo.delete_patient(next(victims)), min(repeat, patients // 4)),
+        Case('repo.delete_patients[100]', lambda i: repo.delete_patients(
+            [next(victims) for _ in range(100)]), min(repeat // 10 or 1, patients // 400 or 1)),
+        Case('repo.add_appointment', lambda i: repo.add_appointment(
+            int(next(new_appointments)['patient_id'] or 1), '2026-01-15', 'Checkup'), repeat),
+        Case('repo.add_appointment[scheduled]', lambda i: repo.add_appointment(
+            1, f'2027-{1 + i // 28 // 24 % 12:02d}-{1 + i // 24 % 28:02d}', 'Checkup',
+            f'{i % 24:02d}:00', '60', PROVIDERS[0]), repeat),
+        Case('repo.bulk_add_appointments[1000]', lambda i: repo.bulk_add_appointments(
+            [next(new_appointments) for _ in range(1000)]), max(3, repeat // 100)),
+        Case('repo.get_all_appointments', lambda i: repo.get_all_appointments(), scan),
+        Case('repo.get_appointments_for_patients[20]', lambda i: repo.get_appointments_for_patients(
+            [1 + (i + k) * 7919 % patients for k in range(20)]), repeat),
+        Case('repo.get_appointments_page[100]', page(repo.get_appointments_page), repeat),
+        Case('repo.get_appointments_page[100,names]', lambda i: repo.get_appointments_page(
+            100, (i * 100) % max(1, appointments - 100), with_patient_names=True), repeat),
+        Case('repo.count_appointments', lambda i: repo.count_appointments(), repeat),
+        Case('repo.iter_appointments', lambda i: sum(1 for _ in repo.iter_appointments()), scan),
+        Case('repo.get_appointments_with_patient_names', lambda i: repo.get_appointments_with_patient_names(), scan),
+        Case('repo.search_appointments[name]', lambda i: repo.search_appointments(
+            query=('ahmed', 'sara omar', 'khal', 'ali')[i % 4] + ' ' * (i % 7)), repeat),
+        Case('repo.search_appointments[date]', lambda i: repo.search_appointments(
+            date=f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}'), repeat),
+        Case('repo.search_appointments[range+name]', lambda i: repo.search_appointments(
+            query='mariam', date_from=f'2025-{1 + i % 12:02d}-01', date_to=f'2025-{1 + i % 12:02d}-14'), repeat),
+        Case('repo.get_appointments_as_api_format', lambda i: repo.get_appointments_as_api_format(), scan),
+        Case('repo.free_slots', lambda i: repo.free_slots(
+            PROVIDERS[i % len(PROVIDERS)], f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}'), repeat),
+    ]
+
+
+def route_cases(client, patients, appointments, repeat):
+    """One or more cases per app.py route, through the Flask test client."""
+    scan = max(3, repeat // 50)
+    victims = iter(range(patients // 2, 0, -1))
+    new_patients = iter(patient_records(10 ** 9, seed=77))
+    
+    def get(url, found=False):
+        return lambda i: _ok(client.get(url(i) if callable(url) else url), found=found)
+    
+    def export(path):
+        return lambda i: _ok(client.get(path), stream=True)
+    
+    import_body = '\n'.join(json.dumps(r) for r in patient_records(1000, seed=55))
+    phone = next(islice(patient_records(patients), min(patients, 1234) - 1, None))['phone']  # populate()'s data
+    fuzzy = FUZZY_QUERIES + ('+218 ' + phone,)
+    changes_since = client.get('/api/changes').get_json()['last_seq']  # Later cases' writes are the delta
+    with client.application.test_request_context():
+        asset_url = client.application.jinja_env.globals['asset_url']
+        asset_urls = [asset_url('css/style.css'), asset_url('js/app.js')]
+    gzip = {'Accept-Encoding': 'gzip'}
+    return [
+        Case('GET /', get('/'), repeat),
+        Case('GET /patients', get(lambda i: f'/patients?cursor={(i * 50) % patients}'), repeat),
+        Case('GET /patients[gzip]', lambda i: _ok(client.get(f'/patients?cursor={(i * 50) % patients}', headers=gzip)),
+             repeat),
+        Case('GET /patients/add', get('/patients/add'), repeat),
+        Case('POST /patients/add', lambda i: _ok(client.post('/patients/add', data={
+            k: str(v) for k, v in next(new_patients).items() if k != 'notes'}), 302), repeat),
+        Case('GET /patients/<pid>/edit', get(lambda i: f'/patients/{1 + i * 7919 % patients}/edit'), repeat),
+        Case('POST /patients/<pid>/edit', lambda i: _ok(client.post(
+            f'/patients/{1 + i * 7919 % (patients // 2)}/edit',
+            data={'name': f'Edited {i}', 'age': '40', 'phone': '091-0000000'}), 302), repeat),
+        Case('GET /del_patient/<pid>', lambda i: _ok(client.get(f'/del_patient/{next(victims)}'), 302),
+             min(repeat, patients // 4)),
+        Case('GET /appointments', get(lambda i: f'/appointments?cursor={(i * 50) % appointments}'), repeat),
+        Case('GET /appointments?q=', get(lambda i: '/appointments?q=' + ('ahmed', 'sara', 'ali')[i % 3]),
+             max(3, repeat // 10)),
+        Case('GET /appointments?text=', get(lambda i: '/appointments?text=' + TEXT_QUERIES[i % len(TEXT_QUERIES)]),
+             repeat),
+        Case('GET /appointments/create', get('/appointments/create'), scan),
+        Case('POST /appointments/create', lambda i: _ok(client.post('/appointments/create', data={
+            'patient_id': '1', 'date': '2026-02-01', 'description': 'Checkup'}), 302), repeat),
+        Case('GET /api/patients?limit=100', get(lambda i: f'/api/patients?limit=100&cursor={(i * 100) % patients}'),
+             repeat),
+        Case('GET /api/patients', get('/api/patients'), scan),
+        Case('GET /api/patients?ids=[20]', get(lambda i: '/api/patients?ids=' + ','.join(
+            str(1 + (i + k) * 7919 % patients) for k in range(20)) + ('&include=appointments' if i % 2 else '')),
+             repeat),
+        Case('GET /api/patients/<pid>', get(lambda i: f'/api/patients/{1 + i * 7919 % (patients // 4)}'
+                                                     '?include=appointments'), repeat),
+        Case('GET /api/patients/<pid>/appointments',
+             get(lambda i: f'/api/patients/{1 + i * 7919 % (patients // 4)}/appointments'), repeat),
+        Case('GET /api/appointments?limit=100',
+             get(lambda i: f'/api/appointments?limit=100&cursor={(i * 100) % appointments}'), repeat),
+        Case('GET /api/appointments', get('/api/appointments'), scan),
+        Case('GET /api/free-slots', get(lambda i: f'/api/free-slots?provider={PROVIDERS[i % len(PROVIDERS)]}'
+                                                  f'&date=2025-{1 + i % 12:02d}-{1 + i % 28:02d}'), repeat),
+        Case('GET /api/search', get(lambda i: '/api/search?q=' + (NOTE_QUERIES[i // 2 % len(NOTE_QUERIES)] + '&type=patients'
+                                                                  if i % 2 else TEXT_QUERIES[i // 2 % len(TEXT_QUERIES)]),
+                                    found=True), repeat),
+        Case('GET /api/patients/search', get(lambda i: '/api/patients/search?' + urlencode({'q': fuzzy[i % len(fuzzy)]}),
+                                             found=True), repeat),
+        Case('GET /api/changes', get(lambda i: f'/api/changes?since={changes_since}&limit=100'), repeat),
+        Case('GET /api/stats', get('/api/stats'), repeat),
+        Case('GET /api/reports', get(lambda i: '/api/reports?by=' + ('month', 'week', 'provider', 'age')[i % 4]
+                                          + f'&from=2025-{1 + i % 12:02d}-01', found=True), repeat),
+        Case('GET /api/cache/stats', get('/api/cache/stats'), repeat),
+        Case('GET /metrics', get('/metrics'), repeat),
+        Case('GET /assets/<path:filename>', lambda i: _ok(client.get(asset_urls[i % 2], headers=gzip), stream=True),
+             repeat),
+        Case('POST /api/import[1000]', lambda i: _ok(client.post(
+            '/api/import?type=patients', data=import_body, content_type='application/x-ndjson'), 201),
+            max(3, repeat // 100)),
+        Case('GET /api/patients/export', export('/api/patients/export'), scan),
+        Case('GET /api/appointments/export', export('/api/appointments/export'), scan),
+    ]
+
+
+def _ok(response, status=200, stream=False, found=False):
+    """
+    Fail loudly if a route misbehaves, so a broken route cannot look fast.
+    found=True also fails on an empty JSON result (a list, or a report's total),
+    which means the route searched data other than the generated set.
+    """
+    if stream:
+        for _ in response.response:  # Drain the streamed body
+            pass
+    if response.status_code != status:
+        raise RuntimeError(f'{response.request.path}: HTTP {response.status_code}')
+    if found:
+        result = response.get_json()
+        if not (result.get('total') if isinstance(result, dict) else result):
+            raise RuntimeError(f'{response.request.full_path}: empty result')
+    return response
+
+
+def uncovered_routes(app, cases):
+    """Routes in app.url_map that no route case exercises."""
+    covered = {case.name.split()[1].split('?')[0].split('[')[0] for case in cases}
+    rules = {str(rule.rule).replace('<int:pid>', '<pid>') for rule in app.url_map.iter_rules()
+             if rule.endpoint != 'static'}
+    return sorted(rules - covered)
+
+
+# ========================================
+# Measurement
+# ========================================
+
+def measure(case, before_each=None):
+    """Time case.repeat calls, then one more under tracemalloc for peak memory."""
+    latencies = []
+    for i in range(case.repeat):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        case.run(i)
+        latencies.append(time.perf_counter() - start)
+    if before_each:
+        before_each()
+    tracemalloc.start()
+    case.run(case.repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'calls': len(latencies),
+        'ops_per_s': len(latencies) / sum(latencies),
+        'p50_ms': percentile(latencies, 50) * 1e3,
+        'p95_ms': percentile(latencies, 95) * 1e3,
+        'p99_ms': percentile(latencies, 99) * 1e3,
+        'max_ms': max(latencies) * 1e3,
+        'peak_kib': peak / 1024,
+    }
+
+
+def _phase(name):
+    """Internal: 0 for reads, 1 for writes, 2 for deletes (run order)."""
+    if 'delete' in name or 'del_' in name:
+        return 2
+    return 1 if 'add' in name or 'update' in name or 'POST' in name else 0
+
+
+def report(results, baseline, threshold, min_delta_ms):
+    """Print one line per case; return the names of cases that regressed."""
+    regressions = []
+    print(f'{"case":<44} {"ops/s":>10} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"peak KiB":>10}'
+          + ('   vs baseline p50' if baseline else ''))
+    for name, r in results.items():
+        line = (f'{name:<44} {r["ops_per_s"]:>10,.0f} {r["p50_ms"]:>9.3f} {r["p95_ms"]:>9.3f} '
+                f'{r["p99_ms"]:>9.3f} {r["peak_kib"]:>10,.0f}')
+        old = baseline.get(name) if baseline else None
+        if old:
+            change = (r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0.0
+            line += f'   {change:+7.1f}%'
+            if change > threshold and r['p50_ms'] - old['p50_ms'] >= min_delta_ms:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', choices=SIZES, default='small')
+    parser.add_argument('--patients', type=int, help='Override the patient count of --size')
+    parser.add_argument('--appointments', type=int, help='Override the appointment count of --size')
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--repeat', type=int, default=500, help='Calls per (non-scan) case')
+    parser.add_argument('--filter', default='', help='Only run cases whose name contains this text')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='Write the results to this JSON baseline file')
+    parser.add_argument('--compare', help='Compare against this JSON baseline file')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='p50 slowdown (percent) reported as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help='Ignore p50 slowdowns smaller than this many milliseconds')
+    args = parser.parse_args()
+    patients, appointments = SIZES[args.size]
+    patients = args.patients or patients
+    appointments = args.appointments or appointments
+    
+    if args.backend == 'sqlite':
+        storage = SQLiteStorage(os.path.join(tempfile.mkdtemp(prefix='clinic-bench-'), 'bench.db'))
+    else:
+        storage = None
+    start = time.perf_counter()
+    repo = populate(ClinicRepository(storage), patients, appointments, seed=args.seed)
+    print(f'{args.backend}: {patients:,} patients, {appointments:,} appointments '
+          f'generated in {time.perf_counter() - start:.1f} s')
+    
+    # Point the Flask app, and every read model it keeps, at the generated data
+    import app as app_module
+    app_module.use_repository(repo)
+    client = app_module.app.test_client()
+    
+    routes = route_cases(client, patients, appointments, args.repeat)
+    missing = uncovered_routes(app_module.app, routes)
+    if missing:
+        print(f'warning: no benchmark case for {", ".join(missing)}', file=sys.stderr)
+    
+    # Reads first, then writes, then deletes, so the data shifts as little as possible
+    cases = [(case, None) for case in repository_cases(repo, patients, appointments, args.repeat)]
+    
+    def clear_caches():
+        app_module.response_cache.clear()
+        app_module.compressed_cache.clear()
+    
+    cases += [(case, clear_caches) for case in routes]
+    cases.sort(key=lambda item: _phase(item[0].name))
+    results = {}
+    for case, before_each in cases:
+        if args.filter in case.name:
+            results[case.name] = measure(case, before_each)
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    regressions = report(results, baseline, args.threshold, args.min_delta_ms)
+    print(f'peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MiB')
+    
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {'backend': args.backend, 'patients': patients, 'appointments': appointments,
+                         'repeat': args.repeat, 'seed': args.seed, 'python': platform.python_version(),
+                         'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+        print(f'saved baseline to {args.save}')
+    repo.close()
+    if regressions:
+        print(f'{len(regressions)} case(s) regressed by more than {args.threshold:g}%', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: HTML render time of the patients / appointments tables and template cold start.
+
+Renders patients.html and appointments.html with --rows rows each:
+- cold rows: the row fragment cache is empty (first render, or after a restart)
+- warm rows: every row is cached
+- one update: one patient was edited since the last render
+
+and compiles every template with and without the on-disk bytecode cache.
+
+Usage:
+    python -m benchmarks.bench_templates [--rows 10000]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from flask import render_template
+from jinja2 import Environment, FileSystemBytecodeCache
+
+from app import app, row_cache
+from benchmarks.datagen import populate
+from repository import ClinicRepository
+
+
+def timed(run, repeat):
+    """Median wall time of run() in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def compile_all(bytecode_cache=None):
+    """Load every template into a fresh environment; return milliseconds."""
+    env = Environment(loader=app.jinja_loader, autoescape=True, bytecode_cache=bytecode_cache)
+    start = time.perf_counter()
+    for name in env.list_templates():
+        env.get_template(name)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+    
+    repo = populate(ClinicRepository(), args.rows, args.rows)
+    patients, _ = repo.get_patients_page(args.rows)
+    appointments, _ = repo.get_appointments_page(args.rows, with_patient_names=True)
+    page = dict(total=args.rows, limit=args.rows, cursor=None, next_cursor=None)
+    pages = {
+        'patients.html': dict(page, patients=patients),
+        'appointments.html': dict(page, appointments=appointments, search_query='', search_date='', search_text=''),
+    }
+    
+    print(f'{args.rows:,} rows per page; median of {args.repeat} renders')
+    print(f'{"template":<20} {"cold rows ms":>13} {"warm rows ms":>13} {"one update ms":>14}')
+    with app.test_request_context('/'):
+        for name, context in pages.items():
+            def cold():
+                row_cache.clear()
+                render_template(name, **context)
+            
+            def one_update():
+                patients[0] = dict(patients[0], version=patients[0]['version'] + 1)
+                render_template(name, **context)
+            
+            cold_ms = timed(cold, args.repeat)
+            warm_ms = timed(lambda: render_template(name, **context), args.repeat)
+            update_ms = timed(one_update, args.repeat)
+            print(f'{name:<20} {cold_ms:>13.1f} {warm_ms:>13.1f} {update_ms:>14.1f}')
+    
+    with tempfile.TemporaryDirectory() as directory:
+        no_cache = compile_all()
+        first = compile_all(FileSystemBytecodeCache(directory))
+        cached = compile_all(FileSystemBytecodeCache(directory))
+    print(f'compile all templates: {no_cache:.1f} ms uncached, {first:.1f} ms filling the bytecode cache, '
+          f'{cached:.1f} ms from the bytecode cache')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Synthetic, reproducible clinic data for benchmarks.
+
+The same seed always yields the same records, so runs on different machines or
+commits measure the same workload. Names, phones, dates and descriptions are
+drawn from small pools with realistic repetition (many patients share a first
+name, most appointments share a handful of descriptions).
+"""
+import random
+
+FIRST_NAMES = (
+    'Ahmed', 'Mohamed', 'Ali', 'Omar', 'Khaled', 'Youssef', 'Ibrahim', 'Mustafa', 'Hassan', 'Salem',
+    'Fatima', 'Aisha', 'Mariam', 'Sara', 'Huda', 'Noura', 'Amina', 'Khadija', 'Layla', 'Salma',
+)
+LAST_NAMES = (
+    'Ali', 'Omar', 'Alwerfalli', 'Al Tarhoni', 'Agela', 'Ben Ali', 'El Sharif', 'Mansour',
+    'Abdullah', 'Saleh', 'Khalifa', 'Zidan', 'Haddad', 'Othman', 'Gaddafi', 'Bashir',
+)
+DESCRIPTIONS = (
+    'General Checkup', 'Follow-up', 'Blood Test', 'Vaccination', 'Dental Cleaning',
+    'X-Ray', 'Consultation', 'Physiotherapy', 'Eye Exam', 'Prescription Renewal',
+)
+NOTES = ('', '', '', 'Allergic to penicillin', 'Diabetic', 'Hypertension', 'Asthma')
+PROVIDERS = ('Dr. Hassan', 'Dr. Mona', 'Dr. Salem', 'Dr. Aisha')
+SLOT_MINUTES = 30
+FIRST_SLOT = 8 * 60  # 08:00
+
+
+def patient_records(count, seed=0):
+    """Yield count patient import records (dicts with name, age, phone, notes)."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'age': rng.randint(0, 95),
+            'phone': f'09{rng.randint(1, 4)}-{i:07d}',
+            'notes': rng.choice(NOTES),
+        }
+
+
+def appointment_records(count, patients, seed=0, days=365, scheduled=0.5):
+    """
+    Yield count appointment import records for patient ids 1..patients.
+    
+    A scheduled fraction gets a start time, duration and provider; bookings are
+    laid out per (provider, day) in consecutive 30-minute slots, so they never
+    conflict.
+    """
+    rng = random.Random(seed + 1)
+    next_slot = {}  # (provider, date) -> next free slot number
+    for i in range(count):
+        day = i % days
+        date = f'{2025 + day // 336}-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}'
+        record = {
+            'patient_id': rng.randint(1, patients),
+            'date': date,
+            'description': rng.choice(DESCRIPTIONS),
+        }
+        if rng.random() < scheduled:
+            provider = rng.choice(PROVIDERS)
+            slot = next_slot.get((provider, date), 0)
+            start = FIRST_SLOT + slot * SLOT_MINUTES
+            if start + SLOT_MINUTES <= 24 * 60:
+                next_slot[provider, date] = slot + 1
+                record.update(start_time=f'{start // 60:02d}:{start % 60:02d}',
+                              duration=SLOT_MINUTES, provider=provider)
+        yield record
+
+
+def populate(repo, patients, appointments, seed=0, batch_size=50_000):
+    """Fill repo through its bulk-import methods; returns repo."""
+    _in_batches(repo.bulk_add_patients, patient_records(patients, seed), batch_size)
+    _in_batches(repo.bulk_add_appointments, appointment_records(appointments, patients, seed), batch_size)
+    return repo
+
+
+def _in_batches(add, records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            add(batch)
+            batch = []
+    if batch:
+        add(batch)
@@ -0,0 +1,181 @@
+"""
+Change feed for delta sync of API clients.
+ChangeLog keeps the most recent mutations of a repository, each with a
+sequence number, so a client that has synced up to seq N fetches only the
+changes after N (/api/changes?since=N) instead of the whole dataset:
+
+    {'seq': 7, 'op': 'upsert', 'type': 'patient', 'id': 3, 'record': {...}}
+    {'seq': 8, 'op': 'delete', 'type': 'appointment', 'id': 12}
+
+A cascade delete logs the patient's appointments, then the patient. When a
+client's since is older than the oldest change kept (or from before a
+restart), the response asks it to resync: download the full dataset again,
+then follow the feed from the returned last_seq.
+
+Sequence numbers start at the current time in microseconds, so they keep
+increasing across restarts and a stale since is always recognized.
+
+ChangeLog lives in the process; a storage that several processes share logs
+changes in its own write transactions instead (SQLiteStorage's changes table),
+served by StoredChangeLog, so every worker answers a since the same way.
+"""
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+MAX_CHANGES = 100_000  # Default number of changes kept
+POLL_INTERVAL = 0.5  # Seconds between checks for other processes' changes during a long poll
+
+
+class ChangeLog:
+    """Bounded, sequence-numbered log of repository mutations; a repository listener."""
+    
+    def __init__(self, generation=None, max_changes=MAX_CHANGES, first_seq=None):
+        """
+        Args:
+            generation: Callable returning the repository generation. If it changes
+                        without an event (another process wrote to a shared
+                        database), every client is sent to resync.
+            max_changes: Number of changes kept
+            first_seq: Sequence number before the first change (default: now in microseconds)
+        """
+        self._generation = generation
+        self._seen_generation = generation() if generation else None
+        self._entries = deque(maxlen=max_changes)  # (seq, op, type, id, record dict or None)
+        self._seq = time.time_ns() // 1000 if first_seq is None else first_seq  # Last sequence number used
+        self._condition = threading.Condition()
+    
+    @property
+    def last_seq(self):
+        """Sequence number of the latest change."""
+        return self._seq
+    
+    def handle(self, event, payload, generation=None):
+        """Repository listener: log one mutation event (see ClinicRepository.subscribe)."""
+        if event == 'patient_added':
+            changes = [('upsert', 'patient', payload)]
+        elif event == 'appointment_added':
+            changes = [('upsert', 'appointment', payload)]
+        elif event == 'patient_updated':
+            changes = [('upsert', 'patient', payload[1])]
+        elif event == 'patients_deleted':
+            patients, appointments = payload
+            changes = [('delete', 'appointment', appointment) for appointment in appointments]
+            changes.extend(('delete', 'patient', patient) for patient in patients)
+        else:
+            return
+        with self._condition:
+            for op, kind, record in changes:
+                self._seq += 1
+                self._entries.append((self._seq, op, kind, record.id, record.to_dict() if op == 'upsert' else None))
+            if self._generation:
+                self._seen_generation = self._generation()
+            self._condition.notify_all()
+    
+    def _check_generation(self):
+        """Internal: Start over if the data changed without events (call with the condition held)."""
+        if self._generation and self._generation() != self._seen_generation:
+            self._seen_generation = self._generation()
+            self._entries.clear()
+            self._seq += 1
+    
+    def since(self, seq, limit=1000, timeout=0):
+        """
+        Changes after sequence number seq.
+        
+        Args:
+            seq: Last sequence number the client has applied (None if it has none)
+            limit: Maximum number of changes to return
+            timeout: Seconds to wait for a change if there is none yet (long poll)
+        
+        Returns:
+            Dict with changes (oldest first), last_seq (the since to send next
+            time), more (further changes are waiting) and resync (the changes
+            after seq are no longer known: reload everything, then continue
+            from last_seq)
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._check_generation()
+            while seq is not None and seq == self._seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    break
+                self._check_generation()
+            floor = self._entries[0][0] - 1 if self._entries else self._seq  # Oldest since still served
+            if seq is None or seq < floor or seq > self._seq:
+                return _resync(self._seq)
+            entries = _slice(self._entries, len(self._entries) - (self._seq - seq), limit)
+            newest = self._seq
+        return _page(entries, seq, newest)
+
+
+class StoredChangeLog:
+    """
+    Change feed read from a storage that logs its own changes (logs_changes, e.g.
+    SQLiteStorage), so writes from every process sharing it are included. A
+    repository listener only to end this process's long polls early; changes
+    from other processes are noticed within POLL_INTERVAL.
+    """
+    
+    def __init__(self, storage, poll_interval=POLL_INTERVAL):
+        self._storage = storage
+        self._poll_interval = poll_interval
+        self._writes = 0  # Local write events seen, to wake long polls
+        self._condition = threading.Condition()
+    
+    @property
+    def last_seq(self):
+        """Sequence number of the latest change."""
+        return self._storage.change_bounds()[1]
+    
+    def handle(self, event, payload, generation=None):
+        """Repository listener: wake waiting long polls (the storage has logged the change)."""
+        with self._condition:
+            self._writes += 1
+            self._condition.notify_all()
+    
+    def since(self, seq, limit=1000, timeout=0):
+        """Changes after sequence number seq; same arguments and result as ChangeLog.since."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                writes = self._writes
+            # Read the changes before the bounds: changes pruned in between turn into a resync, not a gap
+            entries = self._storage.changes_since(seq, limit) if seq is not None else []
+            floor, newest = self._storage.change_bounds()
+            if seq is None or seq < floor or seq > newest:
+                return _resync(newest)
+            remaining = deadline - time.monotonic()
+            if entries or remaining <= 0:
+                return _page(entries, seq, newest)
+            if seq == newest:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._writes != writes, min(remaining, self._poll_interval))
+
+
+def _resync(last_seq):
+    """Internal: Response sending the client to reload everything, then continue from last_seq."""
+    return {'changes': [], 'last_seq': last_seq, 'more': False, 'resync': True}
+
+
+def _page(entries, seq, newest):
+    """Internal: Response with (seq, op, type, id, record) entries after seq, newest being the last seq."""
+    changes = []
+    for entry_seq, op, kind, record_id, record in entries:
+        change = {'seq': entry_seq, 'op': op, 'type': kind, 'id': record_id}
+        if record is not None:
+            change['record'] = record
+        changes.append(change)
+    last_seq = entries[-1][0] if entries else seq
+    return {'changes': changes, 'last_seq': last_seq, 'more': last_seq < newest, 'resync': False}
+
+
+def _slice(entries, start, limit):
+    """Internal: entries[start:start + limit] of a deque, walking from its nearer end."""
+    if start < len(entries) // 2:
+        return list(islice(entries, start, start + limit))
+    tail = list(islice(reversed(entries), len(entries) - start))
+    tail.reverse()
+    return tail[:limit]
@@ -0,0 +1,80 @@
+"""
+Read models fed by ClinicRepository mutation events.
+A Follower subscribes to a repository (replaying the stored records first)
+and applies each event to its own in-memory structures, noting the storage
+generation it is up to date with.
+
+Writes made by another process sharing a SQLite database send no events here.
+The follower applies them from the database's change log instead: sync()
+catches up before reads, and a local event that finds other writes before
+its own catches up first. Only when the log no longer holds those writes is
+the follower rebuilt from the stored records.
+"""
+import threading
+
+
+class Follower:
+    """Base class: subclasses implement reset() and apply(event, payload)."""
+    
+    def __init__(self, repository):
+        self._repo = repository
+        self._generation = None  # Storage generation the follower is up to date with (None: must rebuild)
+        self._replaying = False
+        self._sync_lock = threading.Lock()
+        self.reset()
+        self._subscribe()
+    
+    def reset(self):
+        """Clear all derived state."""
+        raise NotImplementedError
+    
+    def apply(self, event, payload):
+        """Apply one mutation event (see ClinicRepository.subscribe)."""
+        raise NotImplementedError
+    
+    def handle(self, event, payload, generation):
+        """Repository listener."""
+        if self._replaying:
+            self.apply(event, payload)
+            return
+        if self._generation is None:
+            return  # Out of step until sync() rebuilds
+        # Each write bumps the generation by one: a bigger step means writes made elsewhere came first
+        if self._generation < generation - 1 and not self._catch_up(until=generation):
+            self._generation = None
+            return
+        self.apply(event, payload)
+        self._generation = generation
+    
+    def _catch_up(self, until=None):
+        """Apply the logged writes after self._generation (before until); False if they are not logged."""
+        events = self._repo.events_since(self._generation, until)
+        if events is None:
+            return False
+        for generation, event, payload in events:
+            self.apply(event, payload)
+            self._generation = generation
+        return True
+    
+    def _subscribe(self):
+        """Load the stored records and follow new events from then on."""
+        self._replaying = True
+        try:
+            self._generation = self._repo.subscribe(self.handle, replay=True)
+        finally:
+            self._replaying = False
+    
+    def sync(self):
+        """Apply writes made elsewhere (rebuilding if they are no longer logged); call before reads."""
+        if self._repo.generation == self._generation:
+            return
+        with self._sync_lock:
+            # Under the read lock no local write is half done, and none can interleave with the catch-up
+            with self._repo.reading():
+                if self._repo.generation == self._generation:
+                    return
+                if self._generation is not None and self._catch_up():
+                    return
+            self._repo.unsubscribe(self.handle)
+            self.reset()
+            self._subscribe()
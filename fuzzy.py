@@ -0,0 +1,284 @@
+"""
+Typo-tolerant patient lookup for the Clinic application.
+Finds likely matches for a name and/or phone number, so receptionists can
+spot an existing record before creating a duplicate:
+
+- Names are split into tokens; each query token is compared with the
+  vocabulary of distinct name tokens by trigram (Dice) similarity and by a
+  phonetic key that folds common variants of Arabic transliteration
+  ("Ahmad" / "Ahmed", "Mohamed" / "Muhammad", "Gaddafi" / "Qadhafi").
+- Phone numbers are reduced to their last PHONE_DIGITS digits, so
+  "091-2345678", "+218 91 234 5678" and "00218912345678" compare equal.
+
+PatientMatcher keeps the index current from repository events. The
+vocabulary of distinct tokens stays small (names repeat), so a query costs
+a vocabulary lookup plus one pass over the patients sharing a similar token.
+"""
+import heapq
+import re
+import unicodedata
+from itertools import chain
+
+from events import Follower
+from locks import RWLock, read_locked, write_locked
+
+PHONE_DIGITS = 9  # National significant number length (Libya: 9X XXXXXXX)
+MIN_PHONE_DIGITS = 6  # Shorter inputs are not treated as phone numbers
+PHONETIC_SIMILARITY = 0.85  # Similarity of two different tokens with the same phonetic key
+MIN_TOKEN_SIMILARITY = 0.5
+ARTICLES = frozenset(('al', 'el', 'ul'))
+
+_LETTERS = re.compile(r'[^\W\d_]+')
+_NON_DIGITS = re.compile(r'\D')
+# Applied in order; digraphs before the single letters they contain
+_PHONETIC_RULES = (
+    ('ph', 'f'), ('kh', 'X'), ('ch', 'S'), ('sh', 'S'), ('dh', 'd'), ('th', 't'), ('gh', 'g'),
+    ('ck', 'k'), ('q', 'k'), ('g', 'k'), ('c', 'k'), ('x', 'ks'), ('p', 'b'), ('v', 'f'),
+)
+_VOWELS = frozenset('aeiou')
+
+
+def name_tokens(name):
+    """Return the accent-folded, case-folded word tokens of a name, without articles."""
+    folded = unicodedata.normalize('NFKD', name.casefold())
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return tuple(token for token in _LETTERS.findall(folded) if token not in ARTICLES)
+
+
+def phonetic_key(token):
+    """
+    Consonant skeleton of a transliterated name token.
+    
+    Digraphs and interchangeable letters are mapped to one symbol, vowels and
+    'w' / 'y' after the first letter and a final 'h' are dropped, and doubled
+    letters collapse; a leading vowel becomes 'A', and a final one adds 'A'.
+    """
+    for source, target in _PHONETIC_RULES:
+        token = token.replace(source, target)
+    if token.endswith('h') and len(token) > 2:
+        token = token[:-1]
+    if not token:
+        return ''
+    key = ['A' if token[0] in _VOWELS else token[0]]
+    for c in token[1:]:
+        if c in _VOWELS or c in 'wy':
+            continue
+        if c != key[-1]:
+            key.append(c)
+    if len(token) > 1 and token[-1] in 'aeiouy':
+        key.append('A')  # "Omar" / "Amira", "Salem" / "Salma"
+    return ''.join(key)
+
+
+def phone_key(phone):
+    """Last PHONE_DIGITS digits of a phone number, or None if it has fewer than MIN_PHONE_DIGITS."""
+    digits = _NON_DIGITS.sub('', str(phone))
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return digits[-PHONE_DIGITS:]
+
+
+def _grams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PatientMatcher(Follower):
+    """Fuzzy name / phone index over a repository's patients."""
+    
+    def __init__(self, repository):
+        self._lock = RWLock()
+        super().__init__(repository)
+    
+    @write_locked
+    def reset(self):
+        # A name score depends only on the name's tokens, so names are scored
+        # once per distinct token tuple (numbered, as ints hash cheaply)
+        # rather than once per patient
+        self._name_ids = {}  # name tokens -> name id
+        self._names = {}  # name id -> name tokens
+        self._next_name_id = 0
+        self._name_of = {}  # patient_id -> name id
+        self._patients_named = {}  # name id -> set of patient_ids
+        self._names_with = {}  # token -> set of ids of names containing it
+        self._names_of_length = {}  # token count -> set of name ids
+        self._grams_of = {}  # token -> its trigrams
+        self._by_gram = {}  # trigram -> set of tokens
+        self._by_sound = {}  # phonetic key -> set of tokens
+        self._phone_of = {}  # patient_id -> phone key
+        self._by_phone = {}  # phone key -> set of patient_ids
+    
+    @write_locked
+    def apply(self, event, payload):
+        if event == 'patient_added':
+            self._add(payload)
+        elif event == 'patient_updated':
+            before, after = payload
+            if before is None or (before.name, before.phone) != (after.name, after.phone):
+                self._remove(after.id)
+                self._add(after)
+        elif event == 'patients_deleted':
+            for patient in payload[0]:
+                self._remove(patient.id)
+    
+    def _add(self, patient):
+        tokens = name_tokens(patient.name)
+        name = self._name_ids.get(tokens)
+        if name is None:
+            name = self._name_ids[tokens] = self._next_name_id
+            self._next_name_id += 1
+            self._names[name] = tokens
+            self._patients_named[name] = set()
+            self._names_of_length.setdefault(len(tokens), set()).add(name)
+            for token in set(tokens):
+                names = self._names_with.get(token)
+                if names is None:
+                    names = self._names_with[token] = set()
+                    grams = self._grams_of[token] = _grams(token)
+                    for gram in grams:
+                        self._by_gram.setdefault(gram, set()).add(token)
+                    self._by_sound.setdefault(phonetic_key(token), set()).add(token)
+                names.add(name)
+        self._name_of[patient.id] = name
+        self._patients_named[name].add(patient.id)
+        key = phone_key(patient.phone)
+        if key is not None:
+            self._phone_of[patient.id] = key
+            self._by_phone.setdefault(key, set()).add(patient.id)
+    
+    def _remove(self, patient_id):
+        name = self._name_of.pop(patient_id, None)
+        if name is not None:
+            patients = self._patients_named[name]
+            patients.discard(patient_id)
+            if not patients:
+                del self._patients_named[name]
+                tokens = self._names.pop(name)
+                del self._name_ids[tokens]
+                _discard(self._names_of_length, len(tokens), name)
+                for token in set(tokens):
+                    names = self._names_with[token]
+                    names.discard(name)
+                    if names:
+                        continue
+                    del self._names_with[token]
+                    for gram in self._grams_of.pop(token):
+                        _discard(self._by_gram, gram, token)
+                    _discard(self._by_sound, phonetic_key(token), token)
+        key = self._phone_of.pop(patient_id, None)
+        if key is not None:
+            _discard(self._by_phone, key, patient_id)
+    
+    def search(self, name='', phone='', limit=10, min_score=0.5):
+        """
+        Rank patients by similarity to a name and/or phone number.
+        
+        The score is the mean over the given criteria: for the name, the Dice
+        coefficient of the query and patient token lists with each query token
+        credited its best token similarity; for the phone, 1 on a normalized
+        match and 0 otherwise.
+        
+        Returns:
+            List of (patient_id, score), best first (ties go to the lower id)
+        """
+        self.sync()
+        return self._search(name_tokens(name or ''), phone_key(phone) if phone else None, limit, min_score)
+    
+    @read_locked
+    def _search(self, tokens, phone, limit, min_score):
+        criteria = (1 if tokens else 0) + (1 if phone else 0)
+        if not criteria:
+            return []
+        threshold = min_score * criteria
+        phone_matches = self._by_phone.get(phone, ()) if phone else ()
+        name_scores = {}
+        if tokens:
+            name_scores = self._name_scores(tokens, limit + len(phone_matches), threshold,
+                                            {self._name_of[pid] for pid in phone_matches})
+        
+        candidates = [(-(name_scores.get(self._name_of[pid], 0) + 1), pid) for pid in phone_matches]
+        # The best `limit` names, plus any tied with the last of them, cover the best `limit` patients
+        best = heapq.nlargest(limit, ((score, name) for name, score in name_scores.items() if score >= threshold))
+        if best:
+            cutoff = best[-1][0]
+            groups = [(score, [self._patients_named[name]]) for score, name in best if score > cutoff]
+            groups.append((cutoff, [self._patients_named[name] for name, score in name_scores.items()
+                                    if score == cutoff]))
+            for score, patient_sets in groups:
+                pids = heapq.nsmallest(limit + len(phone_matches), chain.from_iterable(patient_sets))
+                candidates.extend((-score, pid) for pid in pids if pid not in phone_matches)
+        ranked = heapq.nsmallest(limit, (item for item in candidates if -item[0] >= threshold))
+        return [(pid, -score / criteria) for score, pid in ranked]
+    
+    def _name_scores(self, tokens, keep, threshold, also=()):
+        """
+        Internal: {name id: Dice score against the query tokens}, covering
+        every name that can rank among the best `keep` names scoring >= threshold
+        and the names in `also`.
+        
+        The score of a name with L tokens matching m query tokens is at most
+        2m / (count + L). Names matching every query token are scored first;
+        the k-th best of them then bounds the length of the names matching
+        fewer tokens that can still rank, so only those short names are scored.
+        """
+        per_token = []  # per query token: {name id: best similarity of one of its tokens}
+        for token in tokens:
+            best = {}
+            for similar, similarity in sorted(self._similar_tokens(token).items(), key=lambda item: -item[1]):
+                best.update(dict.fromkeys(self._names_with[similar].difference(best), similarity))
+            per_token.append(best)
+        count = len(tokens)
+        lengths = self._names
+        
+        def score(names):
+            return {name: 2 * sum(best.get(name, 0) for best in per_token) / (count + len(lengths[name]))
+                    for name in names}
+        
+        def of_length_at_most(longest):
+            return set().union(*(names for length, names in self._names_of_length.items() if length <= longest))
+        
+        complete = set(per_token[0]).intersection(*per_token[1:])
+        if threshold > 0 and max(self._names_of_length, default=0) > 2 * count / threshold - count:
+            complete &= of_length_at_most(2 * count / threshold - count)
+        scores = score(complete)
+        floor = threshold
+        if len(scores) >= keep:
+            floor = max(floor, heapq.nlargest(keep, scores.values())[-1])
+        if count > 1 and floor > 0:
+            longest = 2 * (count - 1) / floor - count
+        else:
+            longest = float('inf') if count > 1 else 0
+        if longest >= 1:
+            short = of_length_at_most(longest)
+            partial = set()
+            for best in per_token:
+                partial |= short.intersection(best)
+            scores.update(score(partial - complete))
+        scores.update(score(also))
+        return scores
+    
+    def _similar_tokens(self, token):
+        """Internal: {vocabulary token: similarity} for tokens resembling token."""
+        grams = _grams(token)
+        shared = {}
+        for gram in grams:
+            for other in self._by_gram.get(gram, ()):
+                shared[other] = shared.get(other, 0) + 1
+        similar = {}
+        for other, n in shared.items():
+            similarity = 2 * n / (len(grams) + len(self._grams_of[other]))
+            if similarity >= MIN_TOKEN_SIMILARITY:
+                similar[other] = similarity
+        for other in self._by_sound.get(phonetic_key(token), ()):
+            if similar.get(other, 0) < PHONETIC_SIMILARITY:
+                similar[other] = 1.0 if other == token else PHONETIC_SIMILARITY
+        return similar
+
+
+def _discard(index, key, value):
+    """Internal: Remove value from the set index[key], dropping the key when empty."""
+    values = index.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del index[key]
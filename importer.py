@@ -0,0 +1,149 @@
+"""
+Bulk import for the Clinic application.
+Streams patients or appointments from CSV or NDJSON into ClinicRepository's
+bulk_add_* methods in fixed-size batches, so memory stays flat however large
+the input is. Used by the /api/import endpoint and as a command-line tool:
+
+    python importer.py patients patients.csv
+    python importer.py appointments appointments.ndjson --format ndjson
+    python importer.py patients export.csv --id-map ids.csv
+
+The command line writes to the repository configured by CLINIC_DB or
+CLINIC_JOURNAL_DIR (see repository.py); with neither set the data would only
+live in the importing process. --id-map writes each record's new id next to
+its input position and its own id field (if any), so references to the old
+ids can be rewritten, e.g. before importing appointments for the patients.
+
+CSV files need a header row: name,age,phone[,notes] for patients and
+patient_id,date,description[,start_time,duration,provider] for appointments.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from validators import ValidationError
+
+KINDS = ('patients', 'appointments')
+FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 5000
+
+
+class ImportStopped(ValidationError):
+    """
+    Raised when an import stops at a batch with an invalid or malformed record.
+    The batches before it stay written: `imported` records.
+    """
+    
+    def __init__(self, errors, imported):
+        self.imported = imported
+        super().__init__(errors)
+    
+    def __reduce__(self):
+        return type(self), (self.errors, self.imported)
+
+
+def read_records(lines, fmt):
+    """Yield record dicts from an iterable of text lines in CSV or NDJSON format."""
+    if fmt == 'csv':
+        yield from csv.DictReader(lines)
+    elif fmt == 'ndjson':
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f'Unsupported import format: {fmt!r}')
+
+
+def import_records(repo, kind, records, batch_size=BATCH_SIZE, on_batch=None):
+    """
+    Import records into repo in batches.
+    
+    Each batch is validated and written atomically. An invalid record, or one
+    that cannot be parsed, stops the import and leaves earlier batches in place.
+    on_batch, if given, is called after each written batch with the input
+    position of its first record, its records and their new ids.
+    
+    Returns:
+        Number of records imported
+    
+    Raises:
+        ImportStopped: with the errors of the failing batch (record indexes are
+                       positions in the whole input) and the number of records
+                       imported before it
+    """
+    add = repo.bulk_add_patients if kind == 'patients' else repo.bulk_add_appointments
+    records = iter(records)
+    imported = 0
+    while True:
+        batch = []
+        try:
+            batch.extend(islice(records, batch_size))
+        except ValueError as error:  # Malformed JSON line, or bytes that are not UTF-8
+            raise ImportStopped([(imported + len(batch), f'Malformed record: {error}')], imported)
+        if not batch:
+            return imported
+        try:
+            ids = add(batch)
+        except ValidationError as error:
+            raise ImportStopped([(imported + index, message) for index, message in error.errors], imported)
+        if on_batch is not None:
+            on_batch(imported, batch, ids)
+        imported += len(batch)
+
+
+def _id_map_writer(out):
+    """on_batch callback writing record,source_id,id CSV rows to out (source_id: the record's own id field)."""
+    writer = csv.writer(out)
+    writer.writerow(('record', 'source_id', 'id'))
+    
+    def write(start, batch, ids):
+        writer.writerows((start + offset, record.get('id', '') if isinstance(record, dict) else '', new_id)
+                         for offset, (record, new_id) in enumerate(zip(batch, ids)))
+    return write
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import patients or appointments.')
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('path', help="Input file ('-' for stdin)")
+    parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--id-map', metavar='PATH',
+                        help="Write a CSV of record,source_id,id for the imported records ('-' for stdout)")
+    args = parser.parse_args(argv)
+    fmt = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    
+    # Not get_default(): that would add the demo data to a new store
+    from repository import default_repository
+    clinic = default_repository()
+    
+    start = time.perf_counter()
+    stream = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+    id_map = None
+    if args.id_map:
+        id_map = sys.stdout if args.id_map == '-' else open(args.id_map, 'w', newline='', encoding='utf-8')
+    try:
+        on_batch = _id_map_writer(id_map) if id_map is not None else None
+        count = import_records(clinic, args.kind, read_records(stream, fmt), args.batch_size, on_batch)
+    except ImportStopped as error:
+        for index, message in error.errors[:20]:
+            print(f'record {index}: {message}', file=sys.stderr)
+        print(f'Stopped after importing {error.imported} {args.kind}', file=sys.stderr)
+        return 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if id_map is not None and id_map is not sys.stdout:
+            id_map.close()
+        clinic.close()
+    elapsed = time.perf_counter() - start
+    print(f'Imported {count} {args.kind} in {elapsed:.2f} s '
+          f'({count / elapsed if elapsed else 0:,.0f} records/s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
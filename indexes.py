@@ -0,0 +1,159 @@
+"""
+Secondary indexes for the Clinic application.
+Used by ClinicRepository so search_appointments does not have to walk every
+appointment: a sorted date index for exact and range lookups, and a trigram
+index over patient names that keeps the original substring semantics.
+"""
+from bisect import bisect_left, bisect_right, insort
+
+
+class DateIndex:
+    """
+    Sorted index of appointments by date string (YYYY-MM-DD).
+    
+    Dates sort lexicographically in that format, so a sorted list of the
+    distinct dates supports exact lookups and inclusive ranges via bisect.
+    """
+    
+    def __init__(self):
+        self._by_date = {}  # date -> {appointment_id: Appointment}
+        self._dates = []  # Sorted list of distinct dates
+    
+    def add(self, appointment):
+        """Index an appointment under its date."""
+        bucket = self._by_date.get(appointment.date)
+        if bucket is None:
+            bucket = self._by_date[appointment.date] = {}
+            insort(self._dates, appointment.date)
+        bucket[appointment.id] = appointment
+    
+    def remove(self, appointment):
+        """Drop an appointment from the index."""
+        bucket = self._by_date.get(appointment.date)
+        if bucket is None:
+            return
+        bucket.pop(appointment.id, None)
+        if not bucket:
+            del self._by_date[appointment.date]
+            del self._dates[bisect_left(self._dates, appointment.date)]
+    
+    def count(self, date):
+        """Number of appointments on an exact date."""
+        return len(self._by_date.get(date, ()))
+    
+    def exact(self, date):
+        """Return {appointment_id: Appointment} for an exact date (do not mutate)."""
+        return self._by_date.get(date, {})
+    
+    def between(self, start=None, end=None):
+        """
+        Yield appointments whose date falls in [start, end] (inclusive).
+        Either bound may be None for an open range.
+        """
+        lo = bisect_left(self._dates, start) if start else 0
+        hi = bisect_right(self._dates, end) if end else len(self._dates)
+        for date in self._dates[lo:hi]:
+            yield from self._by_date[date].values()
+
+
+class NameIndex:
+    """
+    Trigram index over lower-cased patient names.
+    
+    A name contains a query only if it contains every trigram of the query,
+    so intersecting the posting sets yields a small candidate set which is
+    then confirmed with the same `query in name` check as before. Queries
+    shorter than three characters fall back to scanning the cached names.
+    """
+    
+    GRAM = 3
+    
+    def __init__(self):
+        self._names = {}  # patient_id -> lower-cased name
+        self._postings = {}  # trigram -> set of patient_ids
+    
+    @classmethod
+    def _grams(cls, text):
+        n = cls.GRAM
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+    
+    def add(self, patient_id, name):
+        """Index a patient's name."""
+        name = name.lower()
+        self._names[patient_id] = name
+        postings = self._postings
+        for gram in self._grams(name):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = {patient_id}
+            else:
+                ids.add(patient_id)
+    
+    def remove(self, patient_id):
+        """Remove a patient from the index."""
+        name = self._names.pop(patient_id, None)
+        if name is None:
+            return
+        for gram in self._grams(name):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(patient_id)
+                if not ids:
+                    del self._postings[gram]
+    
+    def search(self, query):
+        """Return the set of patient ids whose name contains query (case-insensitive)."""
+        query = query.lower()
+        names = self._names
+        if len(query) < self.GRAM:
+            return {pid for pid, name in names.items() if query in name}
+        postings = []
+        for gram in self._grams(query):
+            ids = self._postings.get(gram)
+            if not ids:
+                return set()
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return {pid for pid in candidates if query in names[pid]}
+
+
+class KeyOrder:
+    """
+    Sorted list of record ids for keyset pagination.
+    
+    Deletes are lazy: removed ids stay in the list and are skipped while
+    paging (the caller passes the live id->record dict), and the list is
+    compacted once dead entries outnumber live ones.
+    """
+    
+    def __init__(self):
+        self._ids = []
+        self._dead = 0
+    
+    def add(self, record_id):
+        """Add a new id (normally larger than every existing one)."""
+        if not self._ids or record_id > self._ids[-1]:
+            self._ids.append(record_id)
+        else:
+            insort(self._ids, record_id)
+    
+    def discard(self, live):
+        """Note that one id was deleted from `live`; compact if worthwhile."""
+        self._dead += 1
+        if self._dead > len(live):
+            self._ids = [i for i in self._ids if i in live]
+            self._dead = 0
+    
+    def after(self, after_id, live, limit):
+        """Return up to limit records from live with id > after_id, in id order."""
+        ids = self._ids
+        start = bisect_right(ids, after_id) if after_id is not None else 0
+        page = []
+        for i in range(start, len(ids)):
+            record = live.get(ids[i])
+            if record is not None:
+                page.append(record)
+                if len(page) >= limit:
+                    break
+        return page
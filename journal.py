@@ -0,0 +1,284 @@
+"""
+Write-ahead journal for the Clinic application.
+Gives the in-memory storage durability without a database: every mutation is
+appended to a log segment as one compact JSON line, fsync is batched, and a
+periodic snapshot compacts the log. On startup the snapshot and the remaining
+segments are replayed into an empty storage.
+
+Layout of the journal directory:
+    snapshot.jsonl        header ["S", epoch] then "P"/"A" records
+    journal-<epoch>.log   one record per line, replayed if epoch > snapshot epoch
+
+Records:
+    ["P", id, name, age, phone, notes(, created(, version))]
+                                                 patient added (version only in snapshots)
+    ["U", id, name, age, phone(, notes)]         patient updated
+    ["D", [patient_id, ...]]                     patients deleted (cascade)
+    ["A", id, patient_id, date, description]     appointment added
+    ["A", id, patient_id, date, description, start, duration, provider]
+                                                 scheduled appointment added
+    ["I"]                                        initial data claimed (see claim_seed)
+"""
+import gc
+import glob
+import json
+import os
+import threading
+
+from models import Patient, Appointment
+from validators import PatientNotFound
+
+SNAPSHOT_FILE = 'snapshot.jsonl'
+SEGMENT_PATTERN = 'journal-*.log'
+
+_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+class Journal:
+    """
+    Append-only operation log with batched fsync and snapshot compaction.
+    
+    Durability window: a record is on disk once `fsync_every` more records
+    have been appended or `fsync_interval` seconds have passed, whichever
+    comes first. Call sync() to force it.
+    
+    With freeze_gc=True, replay() ends with gc.freeze(), so later collections
+    skip the recovered records. That affects the whole process; it is meant
+    for a server's one repository, not for libraries or tests.
+    """
+    
+    def __init__(self, directory, fsync_every=256, fsync_interval=0.05, snapshot_every=1_000_000,
+                 freeze_gc=False):
+        self.directory = directory
+        self.freeze_gc = freeze_gc
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        self._epoch = 0
+        self._pending = 0  # Records written but not yet fsynced
+        self._since_snapshot = 0
+        self._stop = threading.Event()
+        self._flusher = None
+        self._snapshotting = None  # Background snapshot thread, if any
+    
+    # ========================================
+    # Recovery
+    # ========================================
+    
+    def replay(self, storage):
+        """
+        Load the snapshot and newer log segments into an empty storage, then
+        open a fresh segment for new writes.
+        
+        Returns:
+            Number of records applied
+        """
+        # Recovery allocates millions of long-lived objects; cyclic GC passes over
+        # them only cost time, so pause it (and optionally freeze the result).
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            applied = self._replay(storage)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        if self.freeze_gc and applied:
+            gc.freeze()
+        return applied
+    
+    def _replay(self, storage):
+        applied = 0
+        covered = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                covered = header[1]
+                applied += self._apply_lines(f, storage)
+        segments = self._segments()
+        for epoch, path in segments:
+            if epoch > covered:
+                with open(path, encoding='utf-8') as f:
+                    replayed = self._apply_lines(f, storage)
+                applied += replayed
+                self._since_snapshot += replayed
+        last = segments[-1][0] if segments else 0
+        self._open_segment(max(covered, last) + 1)
+        return applied
+    
+    def _apply_lines(self, lines, storage):
+        count = 0
+        decode = json.JSONDecoder().decode
+        for line in lines:
+            try:
+                record = decode(line)
+            except ValueError:
+                break  # Torn write at the tail of a segment after a crash
+            apply_record(storage, record)
+            count += 1
+        return count
+    
+    def _segments(self):
+        """Return [(epoch, path)] for existing log segments, oldest first."""
+        segments = []
+        for path in glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)):
+            epoch = int(os.path.basename(path)[len('journal-'):-len('.log')])
+            segments.append((epoch, path))
+        return sorted(segments)
+    
+    def _open_segment(self, epoch):
+        self._epoch = epoch
+        path = os.path.join(self.directory, f'journal-{epoch:08d}.log')
+        self._file = open(path, 'a', encoding='utf-8', buffering=1 << 16)
+        if self._flusher is None and self.fsync_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+    
+    # ========================================
+    # Writing
+    # ========================================
+    
+    def append(self, record):
+        """Append one record; fsync if the batch is full."""
+        line = _encode(record)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._pending += 1
+            self._since_snapshot += 1
+            if self._pending >= self.fsync_every:
+                self._sync_locked()
+    
+    def snapshot_due(self):
+        if self._snapshotting is not None and self._snapshotting.is_alive():
+            return False
+        return self._since_snapshot >= self.snapshot_every
+    
+    def sync(self):
+        """Force every appended record to disk."""
+        with self._lock:
+            self._sync_locked()
+    
+    def _sync_locked(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            if self._pending:
+                self.sync()
+    
+    def snapshot(self, storage, background=False):
+        """
+        Write a snapshot of storage and drop the log segments it covers.
+        
+        The records are captured as plain lists while holding the journal lock
+        (the caller holds the repository's write lock, so no mutation runs
+        meanwhile) and serialized afterwards, in a thread if background=True.
+        MemoryStorage updates patients in place, so capturing the objects
+        themselves would let a later update leak into the snapshot and then be
+        replayed a second time from the new segment.
+        """
+        if self._snapshotting is not None and self._snapshotting.is_alive():
+            return
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
+            covered = self._epoch
+            records = [patient_record(p) for p in storage.iter_patients()]
+            records.extend(appointment_record(a) for a in storage.iter_appointments())
+            if storage.seeded:
+                records.append(seed_record())
+            self._since_snapshot = 0
+            self._open_segment(covered + 1)
+        if background:
+            self._snapshotting = threading.Thread(
+                target=self._write_snapshot, args=(covered, records), daemon=True)
+            self._snapshotting.start()
+        else:
+            self._write_snapshot(covered, records)
+    
+    def _write_snapshot(self, covered, records):
+        tmp_path = os.path.join(self.directory, SNAPSHOT_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            f.write(_encode(['S', covered]) + '\n')
+            for record in records:
+                f.write(_encode(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, SNAPSHOT_FILE))
+        for epoch, path in self._segments():
+            if epoch <= covered:
+                os.remove(path)
+    
+    def close(self):
+        """Flush, fsync and close the current segment."""
+        self._stop.set()
+        if self._snapshotting is not None:
+            self._snapshotting.join()
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+
+
+# ========================================
+# Record encoding
+# ========================================
+
+def patient_record(patient):
+    record = ['P', patient.id, patient.name, patient.age, patient.phone, patient.notes]
+    if patient.created or patient.version != 1:
+        record.append(patient.created)
+    if patient.version != 1:
+        record.append(patient.version)  # Only in snapshots; the journal replays updates instead
+    return record
+
+
+def update_record(patient, notes_changed=False):
+    record = ['U', patient.id, patient.name, patient.age, patient.phone]
+    if notes_changed:
+        record.append(patient.notes)
+    return record
+
+
+def delete_record(patient_ids):
+    return ['D', list(patient_ids)]
+
+
+def appointment_record(appointment):
+    record = ['A', appointment.id, appointment.patient_id, appointment.date, appointment.description]
+    if appointment.start is not None:
+        record += [appointment.start, appointment.duration, appointment.provider]
+    return record
+
+
+def seed_record():
+    return ['I']
+
+
+def apply_record(storage, record):
+    """Replay one journal record against a storage backend."""
+    kind = record[0]
+    if kind == 'P':
+        storage.insert_patient(Patient(*record[1:]))
+    elif kind == 'A':
+        try:
+            storage.insert_appointment(Appointment(*record[1:]))
+        except PatientNotFound:
+            pass  # Orphan an older version let through (booked after its patient was deleted)
+    elif kind == 'U':
+        storage.update_patient(*record[1:])
+    elif kind == 'D':
+        storage.delete_patients(record[1])
+    elif kind == 'I':
+        storage.seeded = True
+    else:
+        raise ValueError(f'Unknown journal record type: {kind!r}')
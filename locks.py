@@ -0,0 +1,113 @@
+"""
+Locking helpers for the Clinic application.
+ClinicRepository guards its storage and indexes with a reader-writer lock so
+many request threads can read at once while writes stay exclusive.
+"""
+import threading
+from functools import wraps
+
+
+class RWLock:
+    """
+    Writer-preferring reader-writer lock.
+    
+    Reentrant: a thread holding the read lock may read again, and the writer
+    may take either lock again. Upgrading from read to write is not allowed
+    (two upgrading readers would deadlock) and raises RuntimeError.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # Ident of the thread holding the write lock
+        self._waiting_writers = 0
+        self._local = threading.local()  # Per-thread stack of held modes
+    
+    def _held(self):
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = []
+        return held
+    
+    def acquire_read(self):
+        held = self._held()
+        if self._writer == threading.get_ident():
+            held.append('w')  # Nested inside our own write lock
+            return
+        with self._cond:
+            if not held:
+                # New readers queue behind waiting writers; nested reads must not
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+        held.append('r')
+    
+    def try_acquire_read(self):
+        """Take the read lock only if that needs no waiting; returns whether it was taken."""
+        held = self._held()
+        if self._writer == threading.get_ident():
+            held.append('w')
+            return True
+        with self._cond:
+            if not held and (self._writer is not None or self._waiting_writers):
+                return False
+            self._readers += 1
+        held.append('r')
+        return True
+    
+    def release_read(self):
+        if self._held().pop() == 'w':
+            return
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+    
+    def acquire_write(self):
+        held = self._held()
+        me = threading.get_ident()
+        if self._writer == me:
+            held.append('w')
+            return
+        if held:
+            raise RuntimeError('Cannot upgrade a read lock to a write lock')
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+        held.append('W')  # Outermost write acquisition
+    
+    def release_write(self):
+        if self._held().pop() == 'w':
+            return
+        with self._cond:
+            self._writer = None
+            self._cond.notify_all()
+
+
+def read_locked(method):
+    """Run a method while holding self._lock for reading."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._lock.acquire_read()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._lock.release_read()
+    return wrapper
+
+
+def write_locked(method):
+    """Run a method while holding self._lock for writing."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._lock.acquire_write()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._lock.release_write()
+    return wrapper
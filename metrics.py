@@ -0,0 +1,347 @@
+"""
+Instrumentation for the Clinic application.
+Collects request, repository, template and JSON timings in a small
+dependency-free registry and renders them in the Prometheus text format
+(served at /metrics by app.py):
+
+- clinic_http_request_duration_seconds{endpoint, method, status}
+- clinic_repository_call_duration_seconds{method}
+- clinic_template_render_duration_seconds{template}
+- clinic_json_serialize_duration_seconds
+- cache counters, read from the caches on every scrape
+
+SlowRequestProfiler is an opt-in hook that runs cProfile on a sample of
+requests and keeps the profile of any request slower than a threshold.
+"""
+import cProfile
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import g, request, before_render_template, template_rendered
+from flask.json.provider import DefaultJSONProvider
+
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CALL_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with a fixed set of label names."""
+    
+    def __init__(self, name, help, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts (non-cumulative) + overflow, sum]
+        self._lock = threading.Lock()
+    
+    def observe(self, value, labels=()):
+        """Record one value (in seconds) for the given label values."""
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+    
+    def time(self, labels=()):
+        """Decorator timing every call of a function."""
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, labels)
+            return wrapper
+        return decorate
+    
+    def count(self, labels=()):
+        """Number of observations for the given label values."""
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), labels + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total!r}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class CallbackMetric:
+    """Counter or gauge whose values are read from a callback at scrape time."""
+    
+    def __init__(self, name, help, type, labelnames, callback):
+        """
+        Args:
+            type: 'counter' or 'gauge'
+            callback: Returns {label values tuple: number}
+        """
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self._callback = callback
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for labels, value in sorted(self._callback().items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Registry:
+    """Named metrics rendered together in registration order."""
+    
+    def __init__(self):
+        self._metrics = {}
+    
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Duplicate metric: {metric.name}')
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def get(self, name):
+        return self._metrics[name]
+    
+    def render(self):
+        """Return every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels(names, values):
+    """Internal: Format a {name="value",...} label set ('' when there are no labels)."""
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    """Internal: Escape a label value as the exposition format requires."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# ========================================
+# Repository instrumentation
+# ========================================
+
+def instrument_repository(repository, registry):
+    """
+    Time every public method of a ClinicRepository instance.
+    
+    Wrappers are set on the instance, so internal calls between methods
+    (e.g. delete_patient -> delete_patients) are counted as well. Methods
+    already wrapped (the repository was instrumented before) are left alone.
+    """
+    try:  # Repositories instrumented one after another share the histogram
+        histogram = registry.get('clinic_repository_call_duration_seconds')
+    except KeyError:
+        histogram = registry.register(Histogram(
+            'clinic_repository_call_duration_seconds', 'ClinicRepository method call duration.',
+            ('method',), CALL_BUCKETS))
+    for name in dir(type(repository)):
+        # Not timed: lifecycle calls, follower catch-up, and get_changes, whose long polls
+        # would swamp the buckets
+        if name.startswith('_') or name in ('subscribe', 'unsubscribe', 'reading', 'events_since', 'close',
+                                            'get_changes') or name in vars(repository):
+            continue
+        attribute = getattr(type(repository), name)
+        if callable(attribute):
+            setattr(repository, name, histogram.time((name,))(getattr(repository, name)))
+    return histogram
+
+
+def cache_metrics(registry, caches):
+    """
+    Export hit / miss / eviction counters and entry / byte gauges.
+    
+    Args:
+        caches: {cache name: cache.LRUCache}
+    """
+    def events():
+        return {(name, event): cache.stats()[event]
+                for name, cache in caches.items() for event in ('hits', 'misses', 'evictions')}
+    
+    def gauge(key):
+        return lambda: {(name,): cache.stats()[key] for name, cache in caches.items()}
+    
+    registry.register(CallbackMetric('clinic_cache_events_total', 'Cache lookups and evictions.',
+                                     'counter', ('cache', 'event'), events))
+    registry.register(CallbackMetric('clinic_cache_entries', 'Entries currently cached.',
+                                     'gauge', ('cache',), gauge('entries')))
+    registry.register(CallbackMetric('clinic_cache_bytes', 'Approximate bytes currently cached.',
+                                     'gauge', ('cache',), gauge('bytes')))
+
+
+# ========================================
+# Flask instrumentation
+# ========================================
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that records how long each dumps() takes."""
+    
+    histogram = None  # Set by instrument_app
+    
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if self.histogram is not None:
+                self.histogram.observe(time.perf_counter() - start)
+
+
+def instrument_app(app, registry, profiler=None):
+    """
+    Record per-route latency, template render time and JSON serialization time.
+    
+    Request latency is measured until the request context is torn down, so
+    streamed responses include the time spent producing their body.
+    
+    Args:
+        profiler: Optional SlowRequestProfiler run around each request
+    """
+    requests = registry.register(Histogram(
+        'clinic_http_request_duration_seconds', 'HTTP request latency by route.',
+        ('endpoint', 'method', 'status')))
+    templates = registry.register(Histogram(
+        'clinic_template_render_duration_seconds', 'Jinja template render time.', ('template',)))
+    json_dumps = registry.register(Histogram(
+        'clinic_json_serialize_duration_seconds', 'JSON serialization time.', (), CALL_BUCKETS))
+    
+    provider = TimedJSONProvider(app)
+    provider.histogram = json_dumps
+    app.json = provider
+    
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        if profiler is not None:
+            profiler.start()
+    
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+    
+    @app.teardown_request
+    def observe_request(error=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        status = g.pop('metrics_status', 500)
+        requests.observe(elapsed, (request.endpoint or 'unmatched', request.method, str(status)))
+        if profiler is not None:
+            profiler.stop(elapsed, f'{request.method} {request.path}')
+    
+    def render_started(sender, template, context, **extra):
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+    
+    def render_finished(sender, template, context, **extra):
+        started = g.get('metrics_templates')
+        if started:
+            templates.observe(time.perf_counter() - started.pop(), (template.name,))
+    
+    # Signals hold receivers weakly; these closures must outlive this call
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+    return requests
+
+
+# ========================================
+# Slow-request profiling
+# ========================================
+
+class SlowRequestProfiler:
+    """
+    Profile a sample of requests with cProfile; save those slower than a threshold.
+    
+    Only one request is profiled at a time (the interpreter allows one active
+    profiler), so concurrent requests are skipped rather than delayed. Saved
+    .prof files open with `python -m pstats`, snakeviz, or flameprof for a
+    flamegraph.
+    """
+    
+    def __init__(self, threshold_ms, directory=None, sample_rate=1.0):
+        """
+        Args:
+            threshold_ms: Keep the profile of requests taking at least this long
+            directory: Where to write .prof files (default: <tmp>/clinic-profiles)
+            sample_rate: Fraction of requests to profile (0..1)
+        """
+        self.threshold = threshold_ms / 1000
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'clinic-profiles')
+        self.sample_rate = sample_rate
+        self.saved = 0
+        self._busy = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(self.directory, exist_ok=True)
+    
+    @classmethod
+    def from_environ(cls, environ=os.environ):
+        """
+        Build from CLINIC_PROFILE_SLOW_MS (required to enable profiling),
+        CLINIC_PROFILE_DIR and CLINIC_PROFILE_SAMPLE; None when disabled.
+        """
+        threshold = environ.get('CLINIC_PROFILE_SLOW_MS')
+        if not threshold:
+            return None
+        return cls(float(threshold), environ.get('CLINIC_PROFILE_DIR'),
+                   float(environ.get('CLINIC_PROFILE_SAMPLE', '1')))
+    
+    def start(self):
+        """Begin profiling the current request if it is sampled and no other one is."""
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler (e.g. a debugger) is active
+            self._busy.release()
+            return
+        self._local.profile = profile
+    
+    def stop(self, elapsed, label):
+        """Finish the current request's profile; save it if elapsed >= threshold. Returns the path or None."""
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return None
+        self._local.profile = None
+        profile.disable()
+        try:
+            if elapsed < self.threshold:
+                return None
+            name = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')[:80]
+            self.saved += 1
+            path = os.path.join(self.directory,
+                                f'{time.strftime("%Y%m%d-%H%M%S")}-{self.saved}-{elapsed * 1000:.0f}ms-{name}.prof')
+            profile.dump_stats(path)
+            return path
+        finally:
+            self._busy.release()
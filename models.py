@@ -1,27 +1,42 @@
 """
 Domain models for the Clinic application.
 Created to fix Primitive Obsession code smell - replacing dictionaries with proper classes.
+Models use __slots__ (no per-instance __dict__), store age as an int and intern
+the highly repeated appointment date/description strings to keep large datasets compact.
+Patients record the date they were registered ('' for records that predate it) and
+a version that every update bumps, so caches can key on (id, version).
+Appointments may carry a start (minutes after midnight), a duration in minutes
+and a provider; unscheduled appointments keep start and duration as None.
 """
+import sys
+
+from scheduling import format_time
 
 
 class Patient:
     """Represents a patient in the clinic system."""
     
-    def __init__(self, id, name, age, phone, notes=''):
+    __slots__ = ('id', 'name', 'age', 'phone', 'notes', 'created', 'version')
+    
+    def __init__(self, id, name, age, phone, notes='', created='', version=1):
         self.id = id
         self.name = name
-        self.age = age
+        self.age = int(age)
         self.phone = phone
         self.notes = notes
+        self.created = sys.intern(created)  # ISO date (YYYY-MM-DD) the patient was added
+        self.version = version  # 1 when added, +1 per update
     
     def to_dict(self):
         """Convert patient to dictionary for JSON serialization."""
         return {
             'id': self.id,
             'name': self.name,
-            'age': self.age,
+            'age': str(self.age),  # Kept as a string in the public dict format
             'phone': self.phone,
-            'notes': self.notes
+            'notes': self.notes,
+            'created': self.created,
+            'version': self.version
         }
     
     def __repr__(self):
@@ -31,11 +46,21 @@ class Patient:
 class Appointment:
     """Represents an appointment in the clinic system."""
     
-    def __init__(self, id, patient_id, date, description):
+    __slots__ = ('id', 'patient_id', 'date', 'description', 'start', 'duration', 'provider')
+    
+    def __init__(self, id, patient_id, date, description, start=None, duration=None, provider=''):
         self.id = id
         self.patient_id = patient_id  # Store only ID, not full patient object
-        self.date = date
-        self.description = description
+        self.date = sys.intern(date)  # Few distinct values; share one string each
+        self.description = sys.intern(description)
+        self.start = start
+        self.duration = duration
+        self.provider = sys.intern(provider)
+    
+    @property
+    def end(self):
+        """End of the booking in minutes after midnight (None if unscheduled)."""
+        return None if self.start is None else self.start + self.duration
     
     def to_dict(self):
         """Convert appointment to dictionary for JSON serialization."""
@@ -43,7 +68,10 @@ class Appointment:
             'id': self.id,
             'patient_id': self.patient_id,
             'date': self.date,
-            'description': self.description
+            'description': self.description,
+            'start_time': format_time(self.start),
+            'duration': self.duration,
+            'provider': self.provider
         }
     
     def __repr__(self):
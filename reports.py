@@ -0,0 +1,303 @@
+"""
+Columnar reporting for the Clinic application.
+ClinicReports keeps NumPy column arrays of the appointments (date, patient id,
+booked minutes, provider) and patients (age, registration date), fed by
+repository events. A report is then a few vectorized passes over the
+columns instead of a loop over record dicts:
+
+    reports.run('appointments', by='month', date_from='2024-01-01')
+
+New rows collect in Python lists and move into the arrays in one step on the
+next report. A delete only clears the row's live flag; a table is compacted
+once half of its rows are dead.
+
+NumPy is optional: without it HAVE_NUMPY is False and /api/reports answers 501.
+"""
+import threading
+from datetime import date as Date
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency; reports are unavailable without it
+    np = None
+
+from events import Follower
+from stats import AGE_BUCKET, MAX_AGE_BUCKET, age_bucket
+
+HAVE_NUMPY = np is not None
+NO_DAY = -2 ** 31  # Day number stored for a missing or malformed date
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+DATE_GROUPS = ('day', 'week', 'month', 'year', 'weekday')
+# Report -> groupings it supports
+REPORTS = {
+    'appointments': DATE_GROUPS + ('provider', 'age'),  # By appointment date, provider or patient age
+    'patients': DATE_GROUPS + ('age',),  # By registration date or age
+}
+_EPOCH = Date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=65536)
+def day_number(text):
+    """Days since 1970-01-01 of a YYYY-MM-DD date string, or NO_DAY if it is not one."""
+    try:
+        return Date.fromisoformat(text).toordinal() - _EPOCH
+    except (TypeError, ValueError):
+        return NO_DAY
+
+
+class _Table:
+    """Internal: Column arrays of one record type, with a live flag per row and rows located by record id."""
+    
+    def __init__(self, **dtypes):
+        """dtypes: column name -> NumPy dtype, the record id column ('id') first."""
+        self._dtypes = dtypes
+        self.columns = {name: np.empty(0, dtype) for name, dtype in dtypes.items()}
+        self.live = np.empty(0, bool)
+        self._pending = {name: [] for name in dtypes}  # Rows not yet in the arrays
+        self._pending_columns = list(self._pending.values())
+        self._size = 0  # Rows in the arrays plus pending rows
+        self._row_of = {}  # record id -> row, for live rows
+        self._dead_pending = []  # Pending rows deleted before reaching the arrays
+    
+    def append(self, values):
+        """Add a row: values in column order."""
+        self._row_of[values[0]] = self._size
+        self._size += 1
+        for column, value in zip(self._pending_columns, values):
+            column.append(value)
+    
+    def set(self, record_id, name, value):
+        """Change one value of a live row (no-op for unknown ids)."""
+        row = self._row_of.get(record_id)
+        if row is None:
+            return
+        stored = len(self.live)
+        if row < stored:
+            self.columns[name][row] = value
+        else:
+            self._pending[name][row - stored] = value
+    
+    def delete(self, record_id):
+        """Mark a row dead (no-op for unknown ids)."""
+        row = self._row_of.pop(record_id, None)
+        if row is None:
+            return
+        if row < len(self.live):
+            self.live[row] = False
+        else:
+            self._dead_pending.append(row)
+    
+    def flush(self):
+        """
+        Move pending rows into the arrays, compacting the table if half its rows are dead.
+        
+        Returns:
+            Boolean mask of the live rows, or None if every row is live
+        """
+        added = len(self._pending_columns[0])
+        if added:
+            for name, dtype in self._dtypes.items():
+                self.columns[name] = np.concatenate((self.columns[name], np.array(self._pending[name], dtype)))
+                self._pending[name].clear()
+            self.live = np.concatenate((self.live, np.ones(added, bool)))
+            self.live[self._dead_pending] = False
+            self._dead_pending = []
+        if len(self._row_of) * 2 < len(self.live):
+            self.columns = {name: column[self.live] for name, column in self.columns.items()}
+            self.live = np.ones(len(self._row_of), bool)
+            self._row_of = dict(zip(self.columns['id'].tolist(), range(len(self._row_of))))
+            self._size = len(self._row_of)
+        return None if len(self._row_of) == len(self.live) else self.live
+
+
+class ClinicReports(Follower):
+    """Column store over a repository's patients and appointments, answering group-by reports."""
+    
+    def __init__(self, repository):
+        self._lock = threading.Lock()
+        super().__init__(repository)
+    
+    def reset(self):
+        with self._lock:
+            self._patients = _Table(id=np.int64, age=np.int16, created=np.int32)
+            self._appointments = _Table(id=np.int64, patient_id=np.int64, day=np.int32, minutes=np.int32,
+                                        provider=np.int32)
+            self._providers = []  # provider code -> provider name
+            self._provider_codes = {}  # provider name -> code
+    
+    def apply(self, event, payload):
+        """Apply one mutation event to the columns."""
+        with self._lock:
+            if event == 'appointment_added':
+                self._appointments.append((payload.id, payload.patient_id, day_number(payload.date),
+                                           payload.duration or 0, self._provider_code(payload.provider)))
+            elif event == 'patient_added':
+                self._patients.append((payload.id, payload.age, day_number(payload.created)))
+            elif event == 'patient_updated':
+                after = payload[1]
+                self._patients.set(after.id, 'age', after.age)
+            elif event == 'patients_deleted':
+                patients, appointments = payload
+                for patient in patients:
+                    self._patients.delete(patient.id)
+                for appointment in appointments:
+                    self._appointments.delete(appointment.id)
+    
+    def _provider_code(self, provider):
+        code = self._provider_codes.get(provider)
+        if code is None:
+            code = self._provider_codes[provider] = len(self._providers)
+            self._providers.append(provider)
+        return code
+    
+    def run(self, report, by='month', date_from=None, date_to=None):
+        """
+        Count records per group.
+        
+        Args:
+            report: 'appointments' or 'patients'
+            by: Grouping, one of REPORTS[report]: a period of the appointment
+                (or registration) date, the weekday, the provider, or the
+                patient's age bucket
+            date_from, date_to: Optional inclusive YYYY-MM-DD bounds on the
+                appointment (or registration) date
+        
+        Returns:
+            Dict with report, by, from, to, total and groups: a list of
+            {'key', 'count'} sorted by key (appointment groups also sum the
+            booked 'minutes'). Records without a valid date are left out of
+            date groupings and date-bounded reports.
+        
+        Raises:
+            ValueError: For an unknown report or grouping, or a malformed date bound
+        """
+        if report not in REPORTS:
+            raise ValueError('report must be one of: ' + ', '.join(REPORTS))
+        if by not in REPORTS[report]:
+            raise ValueError(f'{report} reports group by one of: ' + ', '.join(REPORTS[report]))
+        bounds = []
+        for bound in (date_from, date_to):
+            day = NO_DAY if bound is None else day_number(bound)
+            if bound is not None and day == NO_DAY:
+                raise ValueError(f'{bound!r} is not a YYYY-MM-DD date')
+            bounds.append(day)
+        
+        self.sync()
+        with self._lock:
+            appointments = report == 'appointments'
+            table = self._appointments if appointments else self._patients
+            select = table.flush()
+            days = table.columns['day' if appointments else 'created']
+            if by in DATE_GROUPS or date_from or date_to:
+                select = _both(select, days != NO_DAY)
+            if date_from:
+                select = _both(select, days >= bounds[0])
+            if date_to:
+                select = _both(select, days <= bounds[1])
+            
+            def column(name):
+                values = table.columns[name]
+                return values if select is None else values[select]
+            
+            minutes = column('minutes') if appointments else None
+            if by in DATE_GROUPS:
+                # Count per day, then fold the few distinct days into periods
+                codes, counts, sums = _group(column('day' if appointments else 'created'), minutes)
+                if by != 'day':
+                    codes, counts, sums = _group(_date_keys(codes, by), sums, rows=counts)
+            else:
+                if by == 'provider':
+                    keys = column('provider')
+                elif appointments:
+                    keys = self._patient_age_keys(column('patient_id'))
+                    known = keys >= 0  # Rows whose patient exists
+                    keys, minutes = keys[known], minutes[known]
+                else:
+                    keys = _age_keys(column('age'))
+                codes, counts, sums = _group(keys, minutes)
+            labels = [self._label(by, code) for code in codes.tolist()]
+        
+        groups = [{'key': label, 'count': count} for label, count in zip(labels, counts.tolist())]
+        if sums is not None:
+            for group, total in zip(groups, sums.tolist()):
+                group['minutes'] = int(total)
+        if by == 'provider':
+            groups.sort(key=lambda group: group['key'])
+        return {'report': report, 'by': by, 'from': date_from, 'to': date_to,
+                'total': int(counts.sum()), 'groups': groups}
+    
+    def _patient_age_keys(self, patient_ids):
+        """Internal: Age bucket number of each id's patient (-1 for unknown ids), looked up in a table indexed by id."""
+        select = self._patients.flush()
+        ids, ages = self._patients.columns['id'], self._patients.columns['age']
+        if select is not None:
+            ids, ages = ids[select], ages[select]
+        buckets = np.full(max(ids.max(initial=-1), patient_ids.max(initial=-1)) + 1, -1, np.int64)
+        buckets[ids] = _age_keys(ages)
+        return buckets[patient_ids]
+    
+    def _label(self, by, code):
+        if by == 'day':
+            return str(np.datetime64(code, 'D'))
+        if by == 'week':
+            return f'{code // 100}-W{code % 100:02d}'
+        if by == 'month':
+            return str(np.datetime64(code, 'M'))
+        if by == 'year':
+            return str(np.datetime64(code, 'Y'))
+        if by == 'weekday':
+            return WEEKDAYS[code]
+        if by == 'provider':
+            return self._providers[code]
+        return age_bucket(code * AGE_BUCKET)
+
+
+def _both(mask, condition):
+    """Internal: mask & condition, where a None mask selects every row."""
+    return condition if mask is None else mask & condition
+
+
+def _date_keys(days, by):
+    """Internal: Integer group keys of day numbers: days, ISO year * 100 + week, months or years since 1970, or weekdays (Monday = 0)."""
+    days = days.astype(np.int64)
+    if by == 'day':
+        return days
+    weekdays = (days + 3) % 7  # 1970-01-01 was a Thursday
+    if by == 'weekday':
+        return weekdays
+    if by == 'week':
+        thursdays = days - weekdays + 3  # The ISO week belongs to the year of its Thursday
+        years = thursdays.astype('datetime64[D]').astype('datetime64[Y]')
+        weeks = (thursdays - years.astype('datetime64[D]').astype(np.int64)) // 7 + 1
+        return (years.astype(np.int64) + 1970) * 100 + weeks
+    unit = 'M' if by == 'month' else 'Y'
+    return days.astype('datetime64[D]').astype(f'datetime64[{unit}]').astype(np.int64)
+
+
+def _age_keys(ages):
+    """Internal: Age bucket numbers (age // AGE_BUCKET, capped at the MAX_AGE_BUCKET bucket)."""
+    return np.minimum(ages.astype(np.int64) // AGE_BUCKET, MAX_AGE_BUCKET // AGE_BUCKET)
+
+
+def _group(keys, weights=None, rows=None):
+    """
+    Internal: (distinct keys ascending, rows per key, weight sum per key or None).
+    rows gives the number of rows each entry of keys stands for (default 1 each).
+    Counts with bincount over the key range when it is compact, else sorts.
+    """
+    if not len(keys):
+        empty = np.empty(0, np.int64)
+        return empty, empty, (None if weights is None else empty)
+    low, high = int(keys.min()), int(keys.max())
+    if high - low <= 4 * len(keys) + 1024:
+        index = keys - low
+        counts = np.bincount(index, weights=rows)
+        present = np.flatnonzero(counts)
+        codes = present + low
+    else:
+        codes, index = np.unique(keys, return_inverse=True)
+        counts = np.bincount(index, weights=rows)
+        present = slice(None)
+    sums = None if weights is None else np.bincount(index, weights=weights)[present]
+    return codes, counts[present].astype(np.int64), sums
@@ -3,149 +3,657 @@ Repository module for the Clinic application.
 Created to fix God Object/Low Cohesion code smell - extracting data management from routes.
 Phase 4: Normalized appointments to store patient_id instead of full patient object.
 Phase 7: Now uses domain model classes (Patient, Appointment) instead of raw dictionaries.
+Phase 8: Records are stored in id-keyed dicts with a patient_id -> appointments index,
+so lookups and name enrichment are O(1) per row instead of linear scans.
+Phase 9: search_appointments is served from a sorted date index and a trigram name index.
+Phase 10: Cascade deletes touch only the patient's own appointments; bulk delete_patients().
+Phase 11: Persistence is delegated to a pluggable storage backend (see storage.py).
+Phase 12: Optional write-ahead journal with snapshots for the in-memory storage (see journal.py).
+Phase 13: Keyset pagination (limit + cursor) and count methods for listings.
+Phase 14: Generators for streaming exports without materializing every record.
+Phase 15: Generation counter for cache invalidation; search results cached per generation.
+Phase 16: Validated bulk inserts for onboarding imports (see importer.py).
+Phase 17: Thread-safe: reads share a reader-writer lock, writes (and id allocation) are exclusive.
+Phase 18: Appointments can be scheduled (start time, duration, provider) with conflict
+detection and free-slot lookup (see scheduling.py).
+Phase 19: Mutation events for subscribers such as the dashboard statistics (see stats.py).
+Phase 20: Patient notes can be set on add and update (they are full-text indexed, see search.py).
+Phase 21: Optional id allocator, so shards of one data set never reuse an id (see sharding.py).
+Phase 22: Bounded change log of every mutation for delta sync of API clients (see changes.py).
+Phase 23: Batched reads of several patients with their appointments in one pass.
 """
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date as Date
+
+import journal as wal
+from cache import LRUCache
+from changes import ChangeLog, StoredChangeLog
+from locks import RWLock, read_locked, write_locked
 from models import Patient, Appointment
+from scheduling import DEFAULT_DURATION, ScheduleIndex, find_gaps, format_time, parse_time
+from storage import MemoryStorage, SQLiteStorage
+from validators import ValidationError, validate_appointment, validate_patient, validate_schedule
+
+NOT_A_RECORD = 'Record must be an object of field values'
 
 
 class ClinicRepository:
     """
     Centralized repository for managing clinic data.
     Replaces global lists and provides encapsulated data operations.
-    Internally uses Patient and Appointment model objects for type safety.
+    Internally uses Patient and Appointment model objects for type safety,
+    and stores them in a storage backend (in-memory by default).
+    
+    Safe for concurrent use: public reads run under a shared lock and public
+    writes under an exclusive one, so ids are allocated atomically and the
+    storage indexes are never seen half-updated.
     """
     
-    def __init__(self):
-        self._patients = []  # List of Patient objects
-        self._appointments = []  # List of Appointment objects
-        self._next_patient_id = 1
-        self._next_appointment_id = 1
+    def __init__(self, storage=None, journal=None, id_allocator=None, change_log=True):
+        """
+        Args:
+            storage: Storage backend; defaults to a new MemoryStorage
+            journal: Optional journal.Journal. Its snapshot and log are replayed
+                     into the (empty) storage, and every mutation is appended to it.
+            id_allocator: Optional allocator of new record ids (e.g. sharding.StridedIds),
+                          seeded with the highest stored ids; by default the storage
+                          assigns consecutive ids
+            change_log: Serve the change feed (see get_changes): the storage's own
+                        log if it keeps one (logs_changes), else a ChangeLog of the
+                        mutations made from now on; False saves the latter's work
+                        on every write
+        """
+        self._storage = storage if storage is not None else MemoryStorage()
+        self._journal = journal
+        self._lock = RWLock()
+        self._query_cache = LRUCache(max_entries=256, max_bytes=16 * 1024 * 1024)
+        self._listeners = []
+        if journal is not None:
+            journal.replay(self._storage)
+        self._ids = id_allocator
+        if id_allocator is not None:
+            for table in ('patients', 'appointments'):
+                id_allocator.seed(table, self._storage.last_id(table))
+        self._changes = None
+        if change_log:
+            if self._storage.logs_changes:
+                self._changes = StoredChangeLog(self._storage)
+            else:
+                # No other process writes to this storage, and the generation runs ahead of
+                # events during a write, so it must not send readers to resync
+                self._changes = ChangeLog()
+            self._listeners.append(self._changes.handle)
+    
+    @property
+    def generation(self):
+        """Counter that changes on every mutation; cached reads are valid while it is unchanged."""
+        return self._storage.generation()
+    
+    @contextmanager
+    def reading(self):
+        """Hold the read lock over several calls: no write (and so no event) happens meanwhile."""
+        self._lock.acquire_read()
+        try:
+            yield
+        finally:
+            self._lock.release_read()
+    
+    @property
+    def version_tag(self):
+        """String identifying this exact version of the data (e.g. for ETags)."""
+        return f'{self._storage.instance_id}-{self._storage.generation()}'
+    
+    def _log(self, record):
+        """Internal: Append a mutation to the journal, compacting when due."""
+        if self._journal is None:
+            return
+        self._journal.append(record)
+        if self._journal.snapshot_due():
+            self._journal.snapshot(self._storage, background=True)
+    
+    def _assign_ids(self, table, records):
+        """Internal: Give new records ids from the allocator (if any; else the storage assigns them)."""
+        if self._ids is not None:
+            for record, record_id in zip(records, self._ids.allocate(table, len(records))):
+                record.id = record_id
+    
+    def _notify(self, event, payload):
+        """Internal: Pass a mutation event, with the generation its write produced, to every subscriber."""
+        generation = self._storage.written_generation()
+        for listener in self._listeners:
+            listener(event, payload, generation)
+    
+    @write_locked
+    def subscribe(self, listener, replay=False):
+        """
+        Call listener(event, payload, generation) after every mutation, under
+        the write lock; generation is the one the mutation's write produced
+        (each write bumps it by one and may send several events).
+        
+        Events and payloads (model objects; treat them as read-only):
+            'patient_added'       Patient
+            'patient_updated'     (Patient before, Patient after)
+            'patients_deleted'    (list of deleted Patients, list of their Appointments)
+            'appointment_added'   Appointment
+        
+        Args:
+            listener: Callable taking (event, payload); it must not call write methods
+            replay: First send 'patient_added' / 'appointment_added' for every
+                    stored record, atomically with subscribing
+        
+        Returns:
+            The generation of the data replayed (or of the storage, without replay)
+        """
+        with self._storage.snapshot():
+            generation = self._storage.generation()
+            if replay:
+                for patient in self._storage.iter_patients():
+                    listener('patient_added', patient, generation)
+                for appointment in self._storage.iter_appointments():
+                    listener('appointment_added', appointment, generation)
+        self._listeners.append(listener)
+        return generation
+    
+    @write_locked
+    def unsubscribe(self, listener):
+        """Stop sending events to listener."""
+        self._listeners.remove(listener)
+    
+    @read_locked
+    def events_since(self, generation, until=None):
+        """
+        Events of the writes after generation (and before generation until) that
+        were not sent to this repository's listeners: those of other processes
+        sharing the storage, read back from its change log.
+        
+        Call it inside reading() (or a listener) and apply the events before
+        letting go of the lock, so no local event can come in between.
+        
+        Returns:
+            List of (generation, event, payload), as subscribe sends them; None if
+            the storage keeps no change log, or no longer holds all those writes
+        """
+        if not self._storage.logs_changes:
+            return None
+        return self._storage.events_since(generation, until)
+    
+    def get_changes(self, since, limit=1000, timeout=0):
+        """
+        Mutations after change sequence number since (see ChangeLog.since).
+        Takes no lock, so a long poll (timeout > 0) never holds up writers.
+        
+        Raises:
+            RuntimeError: if the repository keeps no change log
+        """
+        if self._changes is None:
+            raise RuntimeError('This repository keeps no change log')
+        return self._changes.since(since, limit, timeout)
+    
+    @write_locked
+    def claim_seed(self):
+        """True if this data store is new and the caller should add the initial data (once per store)."""
+        claimed = self._storage.claim_seed()
+        if claimed:
+            self._log(wal.seed_record())  # Replayed, so emptying the store later does not bring the data back
+        return claimed
+    
+    @write_locked
+    def close(self):
+        """Flush the journal (if any) and release the storage backend."""
+        if self._journal is not None:
+            self._journal.close()
+        self._storage.close()
     
     # ========================================
     # Patient Operations
     # ========================================
     
-    def add_patient(self, name, age, phone):
+    @write_locked
+    def add_patient(self, name, age, phone, notes=''):
         """Add a new patient and return the patient dict."""
         patient = Patient(
-            id=self._next_patient_id,
+            id=None,
             name=name,
             age=age,
-            phone=phone
+            phone=phone,
+            notes=notes,
+            created=Date.today().isoformat()
         )
-        self._patients.append(patient)
-        self._next_patient_id += 1
+        self._assign_ids('patients', [patient])
+        patient = self._storage.insert_patient(patient)
+        self._log(wal.patient_record(patient))
+        self._notify('patient_added', patient)
         return patient.to_dict()
     
+    @write_locked
+    def bulk_add_patients(self, records):
+        """
+        Validate and add many patients in one step (all or nothing).
+        
+        Args:
+            records: Iterable of dicts with name, age, phone and optional notes
+        
+        Returns:
+            List of the new patient IDs, in input order
+        
+        Raises:
+            ValidationError: listing (index, message) for every invalid record
+        """
+        patients = []
+        errors = []
+        created = Date.today().isoformat()
+        for index, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors.append((index, NOT_A_RECORD))
+                continue
+            name, age, phone = _field(record, 'name'), _field(record, 'age'), _field(record, 'phone')
+            problems = validate_patient(name, age, phone)
+            if problems:
+                errors.extend((index, message) for message in problems)
+            elif not errors:
+                patients.append(Patient(id=None, name=name, age=age, phone=phone,
+                                        notes=_field(record, 'notes'), created=created))
+        if errors:
+            raise ValidationError(errors)
+        self._assign_ids('patients', patients)
+        self._storage.insert_patients(patients)
+        for patient in patients:
+            self._log(wal.patient_record(patient))
+            self._notify('patient_added', patient)
+        return [p.id for p in patients]
+    
+    @read_locked
     def find_patient(self, patient_id):
         """Find a patient by ID. Returns dict or None if not found."""
-        for p in self._patients:
-            if p.id == patient_id:
-                return p.to_dict()
-        return None
+        patient = self._storage.get_patient(patient_id)
+        return patient.to_dict() if patient else None
     
+    @read_locked
     def _find_patient_obj(self, patient_id):
         """Internal: Find patient object by ID."""
-        for p in self._patients:
-            if p.id == patient_id:
-                return p
-        return None
+        return self._storage.get_patient(patient_id)
     
+    @read_locked
+    def get_patients_by_ids(self, patient_ids):
+        """Return patient dicts for the ids that exist, in the order given."""
+        found = {p.id: p for p in self._storage.get_patients(set(patient_ids))}
+        return [found[pid].to_dict() for pid in patient_ids if pid in found]
+    
+    @read_locked
+    def get_patients_with_appointments(self, patient_ids):
+        """
+        Return patient dicts for the ids that exist, in the order given, each
+        with its appointments (by id) under 'appointments'. All ids are
+        resolved with one storage call for the patients and one for the appointments.
+        """
+        found = {p.id: p for p in self._storage.get_patients(set(patient_ids))}
+        appointments = self._appointments_by_patient(found)
+        return [dict(found[pid].to_dict(), appointments=appointments[pid]) for pid in patient_ids if pid in found]
+    
+    def _appointments_by_patient(self, patient_ids):
+        """Internal: {patient_id: [appointment dicts, by id]} for every given id (call under the lock)."""
+        by_patient = {pid: [] for pid in patient_ids}
+        for appointment in sorted(self._storage.appointments_for_patients(by_patient), key=_record_id):
+            by_patient[appointment.patient_id].append(appointment.to_dict())
+        return by_patient
+    
+    @read_locked
     def get_all_patients(self):
         """Return all patients as list of dicts."""
-        return [p.to_dict() for p in self._patients]
-    
-    def update_patient(self, patient_id, name, age, phone):
-        """Update patient details."""
-        patient = self._find_patient_obj(patient_id)
-        if patient:
-            patient.name = name
-            patient.age = age
-            patient.phone = phone
-            return patient.to_dict()
-        return None
+        return [p.to_dict() for p in self._storage.iter_patients()]
+    
+    @read_locked
+    def get_patients_page(self, limit, cursor=None):
+        """
+        Return one page of patients using keyset pagination.
+        
+        Args:
+            limit: Maximum number of patients to return
+            cursor: Opaque cursor from a previous page (None for the first page)
+        
+        Returns:
+            (list of patient dicts, next cursor or None if this is the last page)
+        """
+        page = self._storage.page_patients(cursor, limit + 1)
+        return [p.to_dict() for p in page[:limit]], _next_cursor(page, limit)
+    
+    @read_locked
+    def count_patients(self):
+        """Return the number of patients without materializing them."""
+        return self._storage.count_patients()
+    
+    def iter_patients(self, batch_size=1000):
+        """Yield every patient dict, fetching batch_size rows per storage call."""
+        cursor = None
+        while True:
+            page, cursor = self.get_patients_page(batch_size, cursor)
+            yield from page
+            if cursor is None:
+                return
+    
+    @write_locked
+    def update_patient(self, patient_id, name, age, phone, notes=None):
+        """Update patient details; notes=None leaves the notes unchanged."""
+        before = None
+        if self._listeners:
+            before = self._storage.get_patient(patient_id)
+            if before is not None:
+                # MemoryStorage updates in place, so keep a copy of the old values
+                before = Patient(before.id, before.name, before.age, before.phone, before.notes, before.created,
+                                 before.version)
+        patient = self._storage.update_patient(patient_id, name, age, phone, notes)
+        if patient is None:
+            return None
+        self._log(wal.update_record(patient, notes_changed=notes is not None))
+        self._notify('patient_updated', (before, patient))
+        return patient.to_dict()
     
     def delete_patient(self, patient_id):
         """Delete a patient and their appointments (cascade delete)."""
-        self._patients = [p for p in self._patients if p.id != patient_id]
-        self._appointments = [a for a in self._appointments if a.patient_id != patient_id]
+        self.delete_patients([patient_id])
+    
+    @write_locked
+    def delete_patients(self, patient_ids):
+        """
+        Delete several patients and their appointments in one pass.
+        
+        Args:
+            patient_ids: Iterable of patient IDs; unknown IDs are ignored
+        
+        Returns:
+            Number of patients actually deleted
+        """
+        patient_ids = set(patient_ids)
+        patients = appointments = ()
+        if self._listeners:
+            patients = self._storage.get_patients(patient_ids)
+            appointments = self._storage.appointments_for_patients(patient_ids)
+        deleted = self._storage.delete_patients(patient_ids)
+        if deleted:
+            self._log(wal.delete_record(patient_ids))
+            self._notify('patients_deleted', (patients, appointments))
+        return deleted
     
     # ========================================
     # Appointment Operations
     # ========================================
     
-    def add_appointment(self, patient_id, date, description):
-        """Add a new appointment storing only patient_id (normalized)."""
+    @write_locked
+    def add_appointment(self, patient_id, date, description, start_time=None, duration=None, provider=''):
+        """
+        Add a new appointment storing only patient_id (normalized).
+        
+        Args:
+            start_time: Optional 'HH:MM' start; makes this a scheduled booking
+            duration: Length in minutes (DEFAULT_DURATION when a start time is given)
+            provider: Who the booking is with; conflicts are checked per provider
+        
+        Raises:
+            PatientNotFound: if there is no patient patient_id (checked atomically with the insert)
+            SchedulingConflict: if the booking overlaps another one of the provider
+        """
+        start, duration, provider = _schedule_fields(start_time, duration, provider)
         appointment = Appointment(
-            id=self._next_appointment_id,
+            id=None,
             patient_id=patient_id,
             date=date,
-            description=description
+            description=description,
+            start=start,
+            duration=duration,
+            provider=provider
         )
-        self._appointments.append(appointment)
-        self._next_appointment_id += 1
+        self._assign_ids('appointments', [appointment])
+        appointment = self._storage.insert_appointment(appointment)
+        self._log(wal.appointment_record(appointment))
+        self._notify('appointment_added', appointment)
         return appointment.to_dict()
     
+    @write_locked
+    def bulk_add_appointments(self, records):
+        """
+        Validate and add many appointments in one step (all or nothing).
+        
+        Args:
+            records: Iterable of dicts with patient_id, date and description, and
+                     optionally start_time, duration and provider
+        
+        Returns:
+            List of the new appointment IDs, in input order
+        
+        Raises:
+            ValidationError: listing (index, message) for every invalid record,
+                             including references to patients that do not exist
+                             and bookings that overlap stored or earlier ones
+        """
+        appointments = []
+        positions = []  # Record index of each appointment
+        errors = []
+        batch = ScheduleIndex()
+        for index, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors.append((index, NOT_A_RECORD))
+                continue
+            patient_id = _field(record, 'patient_id')
+            date, description = _field(record, 'date'), _field(record, 'description')
+            start_time, duration = _field(record, 'start_time'), _field(record, 'duration')
+            problems = (validate_appointment(patient_id, date, description)
+                        + validate_schedule(start_time, duration))
+            if problems:
+                errors.extend((index, message) for message in problems)
+                continue
+            start, minutes, provider = _schedule_fields(start_time, duration, _field(record, 'provider'))
+            appointment = Appointment(id=None, patient_id=int(patient_id), date=date, description=description,
+                                      start=start, duration=minutes, provider=provider)
+            if appointment.start is not None:
+                args = (appointment.provider, appointment.date, appointment.start, appointment.end)
+                conflict = self._storage.find_conflict(*args)
+                if conflict is not None:
+                    errors.append((index, f'Overlaps appointment #{conflict}'))
+                    continue
+                conflict = batch.find_conflict(*args)
+                if conflict is not None:
+                    errors.append((index, f'Overlaps record {conflict}'))
+                    continue
+                batch.add_interval(*args, index)
+            appointments.append(appointment)
+            positions.append(index)
+        known = self._storage.patient_names({a.patient_id for a in appointments})
+        missing = [(index, 'Patient not found')
+                   for index, appointment in zip(positions, appointments) if appointment.patient_id not in known]
+        if missing:
+            errors = sorted(errors + missing, key=lambda error: error[0])
+        if errors:
+            raise ValidationError(errors)
+        self._assign_ids('appointments', appointments)
+        self._storage.insert_appointments(appointments)
+        for appointment in appointments:
+            self._log(wal.appointment_record(appointment))
+            self._notify('appointment_added', appointment)
+        return [a.id for a in appointments]
+    
+    @read_locked
+    def get_appointments_by_ids(self, appointment_ids, with_patient_names=False):
+        """Return appointment dicts for the ids that exist, in the order given."""
+        found = {a.id: a for a in self._storage.get_appointments(set(appointment_ids))}
+        appointments = [found[aid] for aid in appointment_ids if aid in found]
+        if with_patient_names:
+            return self.get_appointments_with_patient_names(appointments)
+        return [a.to_dict() for a in appointments]
+    
+    @read_locked
+    def get_appointments_for_patients(self, patient_ids):
+        """
+        Return {patient_id: [appointment dicts, by id]} for the given patient ids
+        (an unknown id maps to []), with one storage call for all of them.
+        """
+        return self._appointments_by_patient(patient_ids)
+    
+    @read_locked
     def get_all_appointments(self):
         """Return all appointments as list of dicts."""
-        return [a.to_dict() for a in self._appointments]
+        return [a.to_dict() for a in self._storage.iter_appointments()]
+    
+    @read_locked
+    def get_appointments_page(self, limit, cursor=None, with_patient_names=False):
+        """
+        Return one page of appointments using keyset pagination.
+        
+        Args:
+            limit: Maximum number of appointments to return
+            cursor: Opaque cursor from a previous page (None for the first page)
+            with_patient_names: Enrich rows like get_appointments_with_patient_names()
+        
+        Returns:
+            (list of appointment dicts, next cursor or None if this is the last page)
+        """
+        page = self._storage.page_appointments(cursor, limit + 1)
+        next_cursor = _next_cursor(page, limit)
+        page = page[:limit]
+        if with_patient_names:
+            return self.get_appointments_with_patient_names(page), next_cursor
+        return [a.to_dict() for a in page], next_cursor
+    
+    @read_locked
+    def count_appointments(self):
+        """Return the number of appointments without materializing them."""
+        return self._storage.count_appointments()
     
+    def iter_appointments(self, batch_size=1000):
+        """Yield every appointment dict, fetching batch_size rows per storage call."""
+        cursor = None
+        while True:
+            page, cursor = self.get_appointments_page(batch_size, cursor)
+            yield from page
+            if cursor is None:
+                return
+    
+    @read_locked
     def get_appointments_with_patient_names(self, appointments=None):
         """Return appointments enriched with patient names for display."""
         if appointments is None:
-            appointments = self._appointments
-        enriched = []
-        for a in appointments:
-            patient = self._find_patient_obj(a.patient_id)
-            enriched.append({
-                'id': a.id,
-                'patient_id': a.patient_id,
-                'patient_name': patient.name if patient else 'Unknown',
-                'date': a.date,
-                'description': a.description
-            })
-        return enriched
+            appointments = self._storage.iter_appointments()
+        appointments = list(appointments)
+        names = self._storage.patient_names({a.patient_id for a in appointments})
+        return [{
+            'id': a.id,
+            'patient_id': a.patient_id,
+            'patient_name': names.get(a.patient_id, 'Unknown'),
+            'date': a.date,
+            'description': a.description,
+            'start_time': format_time(a.start),
+            'duration': a.duration,
+            'provider': a.provider
+        } for a in appointments]
     
-    def search_appointments(self, query=None, date=None):
+    @read_locked
+    def search_appointments(self, query=None, date=None, date_from=None, date_to=None):
         """
         Search appointments by patient name and/or date.
         
         Args:
             query: Search string to match against patient name (case-insensitive)
             date: Date string to match exactly (YYYY-MM-DD format)
+            date_from: Inclusive lower date bound, used when date is not given
+            date_to: Inclusive upper date bound, used when date is not given
         
         Returns:
-            List of matching appointments enriched with patient names
+            List of matching appointments enriched with patient names.
+            Results are cached until the next mutation; treat them as read-only.
         """
-        results = self._appointments
-        
-        # Filter by date if provided
-        if date:
-            results = [a for a in results if a.date == date]
-        
-        # Filter by patient name if provided
-        if query:
-            query_lower = query.lower()
-            filtered = []
-            for a in results:
-                patient = self._find_patient_obj(a.patient_id)
-                if patient and query_lower in patient.name.lower():
-                    filtered.append(a)
-            results = filtered
-        
-        # Return enriched results
-        return self.get_appointments_with_patient_names(results)
+        key = (query, date, date_from, date_to)
+        generation = self._storage.generation()
+        enriched = self._query_cache.get(key, generation)
+        if enriched is None:
+            results = self._storage.search_appointments(query, date, date_from, date_to)
+            enriched = self.get_appointments_with_patient_names(results)
+            # Rough size: about 200 bytes per enriched row
+            self._query_cache.set(key, generation, enriched, size=200 * len(enriched) + 64)
+        return enriched
     
+    @read_locked
     def get_appointments_as_api_format(self):
         """Return appointments formatted for API response."""
-        return [a.to_dict() for a in self._appointments]
+        return [a.to_dict() for a in self._storage.iter_appointments()]
+    
+    @read_locked
+    def free_slots(self, provider, date, duration=DEFAULT_DURATION, open_time='09:00', close_time='17:00'):
+        """
+        Return the free periods of a provider's day that fit a booking.
+        
+        Args:
+            provider: Provider name ('' for the clinic-wide schedule)
+            date: Date string (YYYY-MM-DD format)
+            duration: Minimum length of a free period, in minutes
+            open_time: Start of the working day ('HH:MM')
+            close_time: End of the working day ('HH:MM')
+        
+        Returns:
+            List of {'start': 'HH:MM', 'end': 'HH:MM'} dicts in time order
+        """
+        booked = self._storage.booked_intervals(provider, date)
+        gaps = find_gaps(booked, int(duration), parse_time(open_time), parse_time(close_time))
+        return [{'start': format_time(start), 'end': format_time(end)} for start, end in gaps]
 
 
-# Global repository instance
-clinic = ClinicRepository()
+def _field(record, key):
+    """Internal: Read an imported field as a stripped string ('' when missing)."""
+    value = record.get(key)
+    return '' if value is None else str(value).strip()
 
-# Seed initial data
-patient1 = clinic.add_patient('Ahmed Ali', '30', '091-111-222')
-patient2 = clinic.add_patient('Sara Omar', '25', '092-222-333')
 
-# Add initial appointment using patient_id
-clinic.add_appointment(patient1['id'], '2025-10-22', 'General Checkup')
+def _schedule_fields(start_time, duration, provider):
+    """Internal: Convert optional 'HH:MM' / minutes values to (start, duration, provider)."""
+    provider = (provider or '').strip()
+    if not start_time:
+        return None, None, provider
+    return parse_time(start_time), int(duration) if duration else DEFAULT_DURATION, provider
+
+
+def _record_id(record):
+    return record.id
+
+
+def _next_cursor(page, limit):
+    """Internal: Cursor after the last row of a page fetched with limit + 1 rows."""
+    return page[limit - 1].id if 0 < limit < len(page) else None
+
+
+def default_repository():
+    """
+    A new repository over the configured store, without the initial data.
+    Uses SQLite when CLINIC_DB points at a database file; otherwise keeps data
+    in memory, journaled to CLINIC_JOURNAL_DIR when that is set.
+    """
+    db_path = os.environ.get('CLINIC_DB')
+    if db_path:
+        return ClinicRepository(SQLiteStorage(db_path))
+    journal_dir = os.environ.get('CLINIC_JOURNAL_DIR')
+    if not journal_dir:
+        return ClinicRepository()
+    journal = wal.Journal(journal_dir, freeze_gc=True)
+    atexit.register(journal.close)
+    return ClinicRepository(journal=journal)
+
+
+_default = None  # The process's repository, see get_default
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """
+    The repository the application serves, opened on first use (so importing
+    this module, e.g. in a shard worker process, touches no store).
+    A new store gets the initial data, from one worker process only.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = default_repository()
+            if _default.claim_seed():
+                patient1 = _default.add_patient('Ahmed Ali', '30', '091-111-222')
+                _default.add_patient('Sara Omar', '25', '092-222-333')
+                _default.add_appointment(patient1['id'], '2025-10-22', 'General Checkup')
+        return _default
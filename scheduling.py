@@ -0,0 +1,118 @@
+"""
+Appointment scheduling for the Clinic application.
+Appointments may carry a start time, a duration and a provider. Booked
+intervals are kept per (provider, date) in sorted order; because accepted
+bookings never overlap, their end times are sorted too, so a conflict check
+only has to look at the one booking that starts last before the new one ends:
+O(log n) with bisect instead of a scan over every appointment.
+"""
+from bisect import bisect_left, bisect_right
+
+MINUTES_PER_DAY = 24 * 60
+DEFAULT_DURATION = 30
+
+
+class SchedulingConflict(ValueError):
+    """Raised when a booking overlaps an existing one for the same provider and date."""
+    
+    def __init__(self, conflicting_id, provider, date):
+        self.conflicting_id = conflicting_id
+        self.provider = provider
+        self.date = date
+        who = f'{provider} is' if provider else 'The clinic is'
+        super().__init__(f'{who} already booked at that time on {date} (appointment #{conflicting_id})')
+    
+    def __reduce__(self):
+        # Rebuild from the constructor arguments (e.g. when raised in a shard worker process)
+        return type(self), (self.conflicting_id, self.provider, self.date)
+
+
+def parse_time(value):
+    """Parse 'HH:MM' into minutes after midnight. Raises ValueError if malformed."""
+    hours, _, minutes = value.partition(':')
+    if not (hours.isdigit() and minutes.isdigit() and len(minutes) == 2):
+        raise ValueError(f'Invalid time: {value!r}')
+    total = int(hours) * 60 + int(minutes)
+    if int(minutes) >= 60 or total >= MINUTES_PER_DAY:
+        raise ValueError(f'Invalid time: {value!r}')
+    return total
+
+
+def format_time(minutes):
+    """Format minutes after midnight as 'HH:MM' (None stays None)."""
+    if minutes is None:
+        return None
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def find_gaps(booked, duration, open_at, close_at):
+    """
+    Return free (start, end) intervals of at least duration minutes within
+    [open_at, close_at), given booked (start, end) intervals sorted by start.
+    """
+    gaps = []
+    cursor = open_at
+    for start, end in booked:
+        if end <= cursor:
+            continue
+        if start >= close_at:
+            break
+        if start - cursor >= duration:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if close_at - cursor >= duration:
+        gaps.append((cursor, close_at))
+    return gaps
+
+
+class ScheduleIndex:
+    """Sorted, non-overlapping booked intervals per (provider, date)."""
+    
+    def __init__(self):
+        self._days = {}  # (provider, date) -> ([starts], [(start, end, appointment_id)])
+    
+    def find_conflict(self, provider, date, start, end):
+        """Return the key of a booking overlapping [start, end), or None."""
+        day = self._days.get((provider, date))
+        if day is None:
+            return None
+        starts, bookings = day
+        i = bisect_left(starts, end)  # Bookings before i start before the new one ends
+        if i and bookings[i - 1][1] > start:
+            return bookings[i - 1][2]
+        return None
+    
+    def add(self, appointment):
+        if appointment.start is not None:
+            self.add_interval(appointment.provider, appointment.date,
+                              appointment.start, appointment.end, appointment.id)
+    
+    def add_interval(self, provider, date, start, end, key):
+        """Book [start, end) under key (an appointment id); the caller checks conflicts first."""
+        starts, bookings = self._days.setdefault((provider, date), ([], []))
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        bookings.insert(i, (start, end, key))
+    
+    def remove(self, appointment):
+        if appointment.start is None:
+            return
+        key = (appointment.provider, appointment.date)
+        day = self._days.get(key)
+        if day is None:
+            return
+        starts, bookings = day
+        i = bisect_left(starts, appointment.start)
+        while i < len(bookings) and bookings[i][0] == appointment.start:
+            if bookings[i][2] == appointment.id:
+                del starts[i]
+                del bookings[i]
+                break
+            i += 1
+        if not starts:
+            del self._days[key]
+    
+    def booked(self, provider, date):
+        """Return the booked (start, end) intervals for a provider's day, sorted."""
+        day = self._days.get((provider, date))
+        return [(start, end) for start, end, _ in day[1]] if day else []
@@ -0,0 +1,198 @@
+"""
+Full-text search over patient notes and appointment descriptions.
+Text is tokenized on word characters, case- and accent-folded, stripped of a
+few stop words and lightly stemmed (so "Diabetic" matches "diabetes"), then
+kept in inverted indexes ranked with BM25. TextSearch maintains the indexes
+from repository mutation events, so no write ever rescans the data.
+
+An appointment's score is the BM25 score of its description plus that of its
+patient's notes, so "diabetes follow-up" ranks follow-ups of diabetic
+patients first.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from functools import lru_cache
+
+from events import Follower
+from locks import RWLock, read_locked, write_locked
+
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is',
+    'it', 'of', 'on', 'or', 'the', 'to', 'was', 'with',
+))
+# Longest first; a suffix is only removed if at least MIN_STEM characters remain
+SUFFIXES = ('ations', 'ation', 'ings', 'ing', 'ness', 'ment', 'ies', 'es', 'ed', 'ic', 'al', 'ly', 's')
+MIN_STEM = 4
+_WORD = re.compile(r'\w+')
+
+
+def stem(token):
+    """Strip one common English suffix (a light stemmer, not Porter)."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """Return the index terms of text, in order."""
+    folded = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return [stem(token) for token in _WORD.findall(folded) if token not in STOP_WORDS]
+
+
+@lru_cache(maxsize=65536)
+def _analyze(text):
+    """Internal: (term count, ((term, frequency), ...)) for text; shared by identical texts."""
+    terms = tokenize(text)
+    frequencies = {}
+    for term in terms:
+        frequencies[term] = frequencies.get(term, 0) + 1
+    return len(terms), tuple(frequencies.items())
+
+
+class FullTextIndex:
+    """
+    Inverted index with BM25 ranking over one text field.
+    
+    Adding, replacing or removing a document costs O(its distinct terms);
+    a query costs O(postings of its terms).
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self):
+        self._postings = {}  # term -> {doc_id: term frequency}
+        self._docs = {}  # doc_id -> _analyze() result
+        self._total_length = 0
+    
+    def __len__(self):
+        return len(self._docs)
+    
+    def add(self, doc_id, text):
+        """Index (or re-index) a document; empty texts are not indexed."""
+        self.remove(doc_id)
+        analyzed = _analyze(text)
+        length, frequencies = analyzed
+        if not length:
+            return
+        self._docs[doc_id] = analyzed
+        self._total_length += length
+        for term, tf in frequencies:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+            postings[doc_id] = tf
+    
+    def remove(self, doc_id):
+        """Drop a document from the index (no-op if absent)."""
+        analyzed = self._docs.pop(doc_id, None)
+        if analyzed is None:
+            return
+        length, frequencies = analyzed
+        self._total_length -= length
+        for term, _ in frequencies:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+    
+    def scores(self, terms):
+        """Return {doc_id: BM25 score} for documents containing any of terms."""
+        scores = {}
+        count = len(self._docs)
+        if not count:
+            return scores
+        average = self._total_length / count
+        k1, b = self.K1, self.B
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            weights = {}  # (tf, length) -> weight; texts repeat, so few distinct pairs
+            docs = self._docs
+            for doc_id, tf in postings.items():
+                key = (tf, docs[doc_id][0])
+                weight = weights.get(key)
+                if weight is None:
+                    weight = weights[key] = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * key[1] / average))
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        return scores
+
+
+def top(scores, limit=None):
+    """The limit best (doc_id, score) pairs (all if limit is None), best first; ties go to the lower id."""
+    def rank(item):
+        return -item[1], item[0]
+    if limit is None:
+        return sorted(scores.items(), key=rank)
+    return heapq.nsmallest(limit, scores.items(), key=rank)
+
+
+class TextSearch(Follower):
+    """Full-text indexes over a repository, kept current from its mutation events."""
+    
+    def __init__(self, repository):
+        self._lock = RWLock()
+        super().__init__(repository)
+    
+    @write_locked
+    def reset(self):
+        self._notes = FullTextIndex()  # patient_id -> notes
+        self._descriptions = FullTextIndex()  # appointment_id -> description
+        self._appointments_of = {}  # patient_id -> [appointment_id, ...]
+    
+    @write_locked
+    def apply(self, event, payload):
+        if event == 'appointment_added':
+            self._descriptions.add(payload.id, payload.description)
+            self._appointments_of.setdefault(payload.patient_id, []).append(payload.id)
+        elif event == 'patient_added':
+            self._notes.add(payload.id, payload.notes)
+        elif event == 'patient_updated':
+            before, after = payload
+            if before is None or before.notes != after.notes:
+                self._notes.add(after.id, after.notes)
+        elif event == 'patients_deleted':
+            patients, appointments = payload
+            for patient in patients:
+                self._notes.remove(patient.id)
+                self._appointments_of.pop(patient.id, None)
+            for appointment in appointments:
+                self._descriptions.remove(appointment.id)
+    
+    def search_appointments(self, query, limit=50):
+        """
+        Rank appointments by description and patient notes (limit=None for all matches).
+        
+        Returns:
+            List of (appointment_id, score), best first
+        """
+        self.sync()
+        return self._search_appointments(tokenize(query), limit)
+    
+    @read_locked
+    def _search_appointments(self, terms, limit):
+        scores = self._descriptions.scores(terms)
+        for patient_id, note_score in self._notes.scores(terms).items():
+            for appointment_id in self._appointments_of.get(patient_id, ()):
+                scores[appointment_id] = scores.get(appointment_id, 0.0) + note_score
+        return top(scores, limit)
+    
+    def search_patients(self, query, limit=50):
+        """
+        Rank patients by their notes (limit=None for all matches).
+        
+        Returns:
+            List of (patient_id, score), best first
+        """
+        self.sync()
+        return self._search_patients(tokenize(query), limit)
+    
+    @read_locked
+    def _search_patients(self, terms, limit):
+        return top(self._notes.scores(terms), limit)
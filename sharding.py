@@ -0,0 +1,340 @@
+"""
+Multi-clinic sharding for the Clinic application.
+Each clinic's patients and appointments live in their own ClinicRepository
+(a shard), either in this process or in a dedicated worker process.
+
+Ids stay globally unique without any coordination between shards: shard i
+only hands out ids with id % stride == i (see StridedIds). The same rule
+routes any patient or appointment id back to its shard, so lookups,
+updates, deletes and new appointments go to one shard only; an appointment
+always lives in its patient's shard. Listings, counts and searches scatter
+to every shard at once and merge the results in id order.
+
+Shards are numbered by their position in the clinic list, so clinics may be
+appended later (up to stride of them) but never reordered.
+"""
+import heapq
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from journal import Journal
+from repository import ClinicRepository
+from storage import SQLiteStorage
+
+MAX_SHARDS = 64  # Default id stride: the most clinics one id space can hold
+
+
+class StridedIds:
+    """
+    Id allocator for shard `offset` of `stride`: every id it returns is
+    congruent to offset modulo stride and larger than any id seen so far.
+    Used under the repository's write lock.
+    """
+    
+    def __init__(self, offset, stride=MAX_SHARDS):
+        if not 0 <= offset < stride:
+            raise ValueError(f'Shard offset must be in [0, {stride})')
+        self.offset = offset
+        self.stride = stride
+        self._next = {}  # table -> next id to hand out
+    
+    def seed(self, table, last_id):
+        """Continue after last_id, the highest id already stored in table."""
+        base = last_id + 1  # >= 1, so shard 0 starts at stride, never at id 0
+        self._next[table] = base + (self.offset - base) % self.stride
+    
+    def allocate(self, table, count=1):
+        """Return the next count ids of table."""
+        start = self._next.get(table)
+        if start is None:
+            self.seed(table, 0)
+            start = self._next[table]
+        self._next[table] = start + count * self.stride
+        return range(start, start + count * self.stride, self.stride)
+
+
+def open_shard(offset, stride=MAX_SHARDS, db_path=None, journal_dir=None):
+    """
+    Open the repository of shard `offset`: SQLite when db_path is given,
+    else in memory (journaled to journal_dir if given).
+    Module-level so worker processes can build their shard themselves.
+    """
+    storage = SQLiteStorage(db_path) if db_path else None
+    journal = Journal(journal_dir) if journal_dir and not db_path else None
+    return ClinicRepository(storage, journal=journal, id_allocator=StridedIds(offset, stride))
+
+
+class ProcessShard:
+    """
+    A shard served by its own worker process.
+    
+    Method calls (shard.find_patient(1), ...) are sent over a pipe and run
+    by the worker's ClinicRepository; results and exceptions come back
+    pickled. Calls from several threads are serialized per shard.
+    """
+    
+    def __init__(self, factory, *args, start_method='spawn'):
+        """
+        Args:
+            factory: Picklable callable returning the worker's repository (e.g. open_shard)
+            args: Arguments for factory
+            start_method: multiprocessing start method for the worker
+        """
+        context = multiprocessing.get_context(start_method)
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child, factory, args), daemon=True)
+        self._process.start()
+        child.close()
+        self._lock = threading.Lock()
+    
+    def call(self, method, *args, **kwargs):
+        """Run repository.method(*args, **kwargs) in the worker and return its result."""
+        with self._lock:
+            self._conn.send((method, args, kwargs))
+            ok, value = self._conn.recv()
+        if not ok:
+            raise value
+        return value
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return partial(self.call, name)
+    
+    def close(self):
+        """Close the worker's repository and wait for the process to exit."""
+        with self._lock:
+            if self._process.is_alive():
+                self._conn.send(None)
+                self._process.join()
+            self._conn.close()
+
+
+def _serve(conn, factory, args):
+    """Internal: Worker process loop answering ProcessShard calls until told to stop."""
+    repository = factory(*args)
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:  # Parent went away
+                break
+            if request is None:
+                break
+            method, call_args, kwargs = request
+            try:
+                conn.send((True, getattr(repository, method)(*call_args, **kwargs)))
+            except Exception as error:
+                conn.send((False, error))
+    finally:
+        repository.close()
+
+
+class ShardedRepository:
+    """
+    Routes patient and appointment operations to per-clinic shards.
+    
+    Clinic-scoped operations take a clinic_id; operations on existing records
+    are routed by record id; listings, counts and searches span all clinics.
+    Use shard(clinic_id) for anything else a single clinic's repository offers.
+    """
+    
+    def __init__(self, clinic_ids, shards, stride=MAX_SHARDS):
+        """
+        Args:
+            clinic_ids: Clinic identifiers, in shard order
+            shards: One repository per clinic (ClinicRepository or ProcessShard),
+                    shard i allocating ids with StridedIds(i, stride)
+        """
+        if len(clinic_ids) != len(shards) or len(shards) > stride:
+            raise ValueError('Need one shard per clinic, and at most stride of them')
+        self.clinic_ids = list(clinic_ids)
+        self.stride = stride
+        self._shards = list(shards)
+        self._index = {clinic_id: i for i, clinic_id in enumerate(self.clinic_ids)}
+        self._pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='shard')
+    
+    @classmethod
+    def open(cls, clinic_ids, directory=None, processes=False, stride=MAX_SHARDS):
+        """
+        Open one shard per clinic.
+        
+        Args:
+            directory: Keep each clinic in <directory>/<clinic_id>.db (SQLite);
+                       None keeps every shard in memory
+            processes: Run each shard in its own worker process, so
+                       scatter-gather reads run in parallel across processes
+        """
+        shards = []
+        for offset, clinic_id in enumerate(clinic_ids):
+            db_path = os.path.join(directory, f'{clinic_id}.db') if directory else None
+            if processes:
+                shards.append(ProcessShard(open_shard, offset, stride, db_path))
+            else:
+                shards.append(open_shard(offset, stride, db_path))
+        return cls(clinic_ids, shards, stride)
+    
+    def close(self):
+        """Close every shard."""
+        self._pool.shutdown()
+        for shard in self._shards:
+            shard.close()
+    
+    # ========================================
+    # Routing
+    # ========================================
+    
+    def shard(self, clinic_id):
+        """The repository holding clinic_id's data. Raises KeyError for unknown clinics."""
+        return self._shards[self._index[clinic_id]]
+    
+    def clinic_of(self, record_id):
+        """Clinic id owning a patient or appointment id (None if no shard can own it)."""
+        index = record_id % self.stride
+        return self.clinic_ids[index] if index < len(self._shards) else None
+    
+    def _owner(self, record_id):
+        """Internal: Shard owning record_id, or None."""
+        index = record_id % self.stride
+        return self._shards[index] if index < len(self._shards) else None
+    
+    def _scatter(self, method, calls):
+        """Internal: Run shard.method(*args) for every (shard, args) in calls concurrently; results in order."""
+        if len(calls) == 1:
+            shard, args = calls[0]
+            return [getattr(shard, method)(*args)]
+        futures = [self._pool.submit(getattr(shard, method), *args) for shard, args in calls]
+        return [future.result() for future in futures]
+    
+    def _everywhere(self, method, *args):
+        """Internal: Run method(*args) on every shard concurrently."""
+        return self._scatter(method, [(shard, args) for shard in self._shards])
+    
+    def _by_owner(self, method, record_ids, *args):
+        """Internal: Run method(ids, *args) on each shard owning some of record_ids, with those ids."""
+        groups = {}
+        for record_id in record_ids:
+            index = record_id % self.stride
+            if index < len(self._shards):
+                groups.setdefault(index, []).append(record_id)
+        return self._scatter(method, [(self._shards[index], (ids,) + args) for index, ids in groups.items()])
+    
+    def _found_by_owner(self, method, record_ids, *args):
+        """Internal: {id: record dict} of the records method finds across the owning shards."""
+        return {record['id']: record for records in self._by_owner(method, record_ids, *args) for record in records}
+    
+    # ========================================
+    # Patients
+    # ========================================
+    
+    def add_patient(self, clinic_id, name, age, phone, notes=''):
+        """Add a patient to a clinic; returns the patient dict."""
+        return self.shard(clinic_id).add_patient(name, age, phone, notes)
+    
+    def bulk_add_patients(self, clinic_id, records):
+        """Validate and add many patients to one clinic (see ClinicRepository.bulk_add_patients)."""
+        return self.shard(clinic_id).bulk_add_patients(list(records))
+    
+    def find_patient(self, patient_id):
+        """Find a patient by ID in whichever clinic holds it. Returns dict or None."""
+        shard = self._owner(patient_id)
+        return shard.find_patient(patient_id) if shard is not None else None
+    
+    def get_patients_by_ids(self, patient_ids):
+        """Return patient dicts for the ids that exist, in the order given."""
+        patient_ids = list(patient_ids)
+        found = self._found_by_owner('get_patients_by_ids', patient_ids)
+        return [found[pid] for pid in patient_ids if pid in found]
+    
+    def get_patients_with_appointments(self, patient_ids):
+        """Patient dicts with their 'appointments', in the order given; one call per owning shard."""
+        patient_ids = list(patient_ids)
+        found = self._found_by_owner('get_patients_with_appointments', patient_ids)
+        return [found[pid] for pid in patient_ids if pid in found]
+    
+    def update_patient(self, patient_id, name, age, phone, notes=None):
+        """Update patient details in the owning clinic; returns the dict or None if missing."""
+        shard = self._owner(patient_id)
+        return shard.update_patient(patient_id, name, age, phone, notes) if shard is not None else None
+    
+    def delete_patient(self, patient_id):
+        """Delete a patient and their appointments (cascade delete)."""
+        self.delete_patients([patient_id])
+    
+    def delete_patients(self, patient_ids):
+        """Delete patients (and their appointments) across clinics; returns the number deleted."""
+        return sum(self._by_owner('delete_patients', set(patient_ids)))
+    
+    def count_patients(self):
+        """Number of patients in all clinics."""
+        return sum(self._everywhere('count_patients'))
+    
+    def get_patients_page(self, limit, cursor=None):
+        """One page of patients from all clinics in id order (keyset pagination, as ClinicRepository)."""
+        return _merge_pages(self._everywhere('get_patients_page', limit, cursor), limit)
+    
+    # ========================================
+    # Appointments
+    # ========================================
+    
+    def add_appointment(self, patient_id, date, description, start_time=None, duration=None, provider=''):
+        """
+        Add an appointment in the patient's clinic (see ClinicRepository.add_appointment).
+        
+        Raises:
+            KeyError: if no clinic can own patient_id
+        """
+        shard = self._owner(patient_id)
+        if shard is None:
+            raise KeyError(f'No clinic holds patient #{patient_id}')
+        return shard.add_appointment(patient_id, date, description, start_time, duration, provider)
+    
+    def bulk_add_appointments(self, clinic_id, records):
+        """Validate and add many appointments for one clinic's patients (all or nothing)."""
+        return self.shard(clinic_id).bulk_add_appointments(list(records))
+    
+    def get_appointments_for_patients(self, patient_ids):
+        """{patient_id: [appointment dicts, by id]} for the given ids (unknown ids map to [])."""
+        patient_ids = list(patient_ids)
+        by_patient = {pid: [] for pid in patient_ids}
+        for found in self._by_owner('get_appointments_for_patients', patient_ids):
+            by_patient.update(found)
+        return by_patient
+    
+    def get_appointments_by_ids(self, appointment_ids, with_patient_names=False):
+        """Return appointment dicts for the ids that exist, in the order given."""
+        appointment_ids = list(appointment_ids)
+        found = self._found_by_owner('get_appointments_by_ids', appointment_ids, with_patient_names)
+        return [found[aid] for aid in appointment_ids if aid in found]
+    
+    def count_appointments(self):
+        """Number of appointments in all clinics."""
+        return sum(self._everywhere('count_appointments'))
+    
+    def get_appointments_page(self, limit, cursor=None, with_patient_names=False):
+        """One page of appointments from all clinics in id order (keyset pagination)."""
+        return _merge_pages(self._everywhere('get_appointments_page', limit, cursor, with_patient_names), limit)
+    
+    def search_appointments(self, query=None, date=None, date_from=None, date_to=None):
+        """Search every clinic (see ClinicRepository.search_appointments); results in id order."""
+        results = self._everywhere('search_appointments', query, date, date_from, date_to)
+        return list(heapq.merge(*results, key=_record_id))
+    
+    def free_slots(self, clinic_id, provider, date, **options):
+        """Free periods of a provider's day at one clinic (see ClinicRepository.free_slots)."""
+        return self.shard(clinic_id).free_slots(provider, date, **options)
+
+
+def _record_id(record):
+    return record['id']
+
+
+def _merge_pages(pages, limit):
+    """Internal: Merge per-shard (rows, next cursor) pages into the first `limit` rows overall."""
+    rows = list(islice(heapq.merge(*(page for page, _ in pages), key=_record_id), limit))
+    more = any(cursor is not None for _, cursor in pages) or sum(len(page) for page, _ in pages) > limit
+    return rows, (rows[-1]['id'] if more and rows else None)
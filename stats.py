@@ -0,0 +1,133 @@
+"""
+Dashboard statistics for the Clinic application.
+ClinicStats subscribes to repository mutation events and keeps running
+counters, so the dashboard and /api/stats never scan the full datasets.
+Every event is O(1) (a cascade delete is O(deleted rows)).
+
+With SQLite shared between processes, writes made by other processes send no
+events here; the next read applies them from the database's change log (see
+events.Follower).
+"""
+import threading
+from collections import Counter
+from datetime import date as Date
+
+from events import Follower
+
+AGE_BUCKET = 10  # Years per age-distribution bucket
+MAX_AGE_BUCKET = 90  # Ages from here up share the last bucket
+
+
+def age_bucket(age):
+    """Label for the age-distribution bucket of age, e.g. '30-39' or '90+'."""
+    low = min(age // AGE_BUCKET * AGE_BUCKET, MAX_AGE_BUCKET)
+    return f'{low}+' if low == MAX_AGE_BUCKET else f'{low}-{low + AGE_BUCKET - 1}'
+
+
+def iso_week(day):
+    """ISO week label ('2025-W52') of a YYYY-MM-DD date string, or None if it is not a date."""
+    try:
+        year, week, _ = Date.fromisoformat(day).isocalendar()
+    except ValueError:
+        return None
+    return f'{year}-W{week:02d}'
+
+
+class ClinicStats(Follower):
+    """Incrementally maintained totals and distributions for one repository."""
+    
+    def __init__(self, repository, today=Date.today):
+        """
+        Args:
+            repository: The ClinicRepository to follow
+            today: Callable returning the current date (for tests)
+        """
+        self._today = today
+        self._lock = threading.Lock()
+        super().__init__(repository)
+    
+    def reset(self):
+        with self._lock:
+            self._patients = 0
+            self._appointments = 0
+            self._per_day = Counter()  # date -> appointments
+            self._per_week = Counter()  # ISO week -> new patients
+            self._ages = Counter()  # age bucket -> patients
+            self._upcoming = 0  # Appointments dated on or after self._upcoming_from
+            self._upcoming_from = self._today().isoformat()
+    
+    # ========================================
+    # Event handling
+    # ========================================
+    
+    def apply(self, event, payload):
+        """Apply one mutation event to the counters."""
+        with self._lock:
+            if event == 'patient_added':
+                self._add_patient(payload, 1)
+            elif event == 'appointment_added':
+                self._add_appointment(payload, 1)
+            elif event == 'patient_updated':
+                before, after = payload
+                self._ages[age_bucket(before.age)] -= 1
+                self._ages[age_bucket(after.age)] += 1
+            elif event == 'patients_deleted':
+                patients, appointments = payload
+                for patient in patients:
+                    self._add_patient(patient, -1)
+                for appointment in appointments:
+                    self._add_appointment(appointment, -1)
+    
+    def _add_patient(self, patient, sign):
+        self._patients += sign
+        self._ages[age_bucket(patient.age)] += sign
+        week = iso_week(patient.created) if patient.created else None
+        if week:
+            self._per_week[week] += sign
+    
+    def _add_appointment(self, appointment, sign):
+        self._appointments += sign
+        self._per_day[appointment.date] += sign
+        if appointment.date >= self._upcoming_from:
+            self._upcoming += sign
+    
+    # ========================================
+    # Reads
+    # ========================================
+    
+    def today(self):
+        """The date (ISO format) the statistics count as today."""
+        return self._today().isoformat()
+    
+    def snapshot(self):
+        """
+        Return the current statistics as a JSON-ready dict.
+        
+        Returns:
+            Dict with patients, appointments, today, appointments_today,
+            upcoming_appointments (dated today or later), appointments_per_day,
+            new_patients_per_week and age_distribution (the last three sorted
+            by key, with empty entries left out)
+        """
+        self.sync()
+        today = self.today()
+        with self._lock:
+            if today != self._upcoming_from:
+                # The day rolled over: recount once from the per-day counters
+                self._upcoming = sum(n for day, n in self._per_day.items() if day >= today)
+                self._upcoming_from = today
+            return {
+                'patients': self._patients,
+                'appointments': self._appointments,
+                'today': today,
+                'appointments_today': self._per_day.get(today, 0),
+                'upcoming_appointments': self._upcoming,
+                'appointments_per_day': _nonzero(self._per_day),
+                'new_patients_per_week': _nonzero(self._per_week),
+                'age_distribution': _nonzero(self._ages),
+            }
+
+
+def _nonzero(counter):
+    """Internal: Counter entries with a positive count, sorted by key."""
+    return {key: counter[key] for key in sorted(counter) if counter[key] > 0}
@@ -0,0 +1,766 @@
+"""
+Storage backends for the Clinic application.
+ClinicRepository delegates persistence to one of these classes, which share the
+same small interface and deal only in Patient / Appointment model objects:
+
+- MemoryStorage: id-keyed dicts plus secondary indexes (the default).
+- SQLiteStorage: a durable SQLite database in WAL mode, safe to share between
+  several worker processes pointing at the same file.
+
+Every backend also exposes a generation counter that each write bumps by one,
+plus an instance_id, which together identify a version of the data for caching.
+SQLiteStorage also logs every mutation in its database (logs_changes), so all
+processes sharing it serve one change feed (see changes.StoredChangeLog) and
+can apply each other's writes to their read models (see events_since).
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+from changes import MAX_CHANGES
+from indexes import DateIndex, KeyOrder, NameIndex
+from models import Patient, Appointment
+from scheduling import ScheduleIndex, SchedulingConflict
+from validators import PatientNotFound
+
+
+class MemoryStorage:
+    """
+    In-process storage using dicts keyed by id.
+    Lookups, enrichment and cascade deletes are O(1) per affected row.
+    """
+    
+    logs_changes = False  # Only this process writes, so the repository's ChangeLog sees every change
+    
+    def __init__(self):
+        self._patients = {}  # patient_id -> Patient (insertion ordered)
+        self._appointments = {}  # appointment_id -> Appointment (insertion ordered)
+        self._appointments_by_patient = {}  # patient_id -> {appointment_id: Appointment}
+        self._date_index = DateIndex()
+        self._name_index = NameIndex()
+        self._schedule = ScheduleIndex()
+        self._patient_order = KeyOrder()
+        self._appointment_order = KeyOrder()
+        self._next_patient_id = 1
+        self._next_appointment_id = 1
+        self._generation = 0
+        self.seeded = False  # Initial data claimed; journaled, so a store emptied later is not seeded again
+        self.instance_id = uuid.uuid4().hex
+    
+    def generation(self):
+        """Counter bumped by every write."""
+        return self._generation
+    
+    def written_generation(self):
+        """Generation produced by the latest write."""
+        return self._generation
+    
+    def snapshot(self):
+        """Context manager for reads that must see one state (writes are serialized by the repository)."""
+        return nullcontext()
+    
+    def claim_seed(self):
+        """True if the store is empty and was never claimed, so the caller should add the initial data."""
+        if self.seeded or self._patients:
+            return False
+        self.seeded = True
+        return True
+    
+    def last_id(self, table):
+        """Highest id ever assigned in table ('patients' or 'appointments'), 0 if none."""
+        if table == 'patients':
+            return self._next_patient_id - 1
+        return self._next_appointment_id - 1
+    
+    # ========================================
+    # Patients
+    # ========================================
+    
+    def insert_patient(self, patient):
+        """Store a patient, assigning the next id if patient.id is None."""
+        self._store_patient(patient)
+        self._generation += 1
+        return patient
+    
+    def insert_patients(self, patients):
+        """Store many patients in one write."""
+        for patient in patients:
+            self._store_patient(patient)
+        if patients:
+            self._generation += 1
+        return patients
+    
+    def _store_patient(self, patient):
+        if patient.id is None:
+            patient.id = self._next_patient_id
+        self._next_patient_id = max(self._next_patient_id, patient.id + 1)
+        if patient.id not in self._patients:
+            self._patient_order.add(patient.id)
+        self._patients[patient.id] = patient
+        self._appointments_by_patient.setdefault(patient.id, {})
+        self._name_index.add(patient.id, patient.name)
+    
+    def get_patient(self, patient_id):
+        """Return the Patient with this id, or None."""
+        return self._patients.get(patient_id)
+    
+    def iter_patients(self):
+        """Iterate all patients in id order."""
+        return iter(self._patients.values())
+    
+    def page_patients(self, after_id, limit):
+        """Return up to limit patients with id > after_id (keyset pagination)."""
+        return self._patient_order.after(after_id, self._patients, limit)
+    
+    def count_patients(self):
+        return len(self._patients)
+    
+    def update_patient(self, patient_id, name, age, phone, notes=None):
+        """Update a patient in place (notes=None keeps the notes). Returns the Patient or None if missing."""
+        patient = self._patients.get(patient_id)
+        if patient is None:
+            return None
+        if name != patient.name:
+            self._name_index.remove(patient_id)
+            self._name_index.add(patient_id, name)
+        patient.name = name
+        patient.age = int(age)
+        patient.phone = phone
+        if notes is not None:
+            patient.notes = notes
+        patient.version += 1
+        self._generation += 1
+        return patient
+    
+    def delete_patients(self, patient_ids):
+        """Cascade-delete patients. Returns how many existed."""
+        deleted = sum(1 for patient_id in patient_ids if self._remove_patient(patient_id))
+        if deleted:
+            self._generation += 1
+        return deleted
+    
+    def _remove_patient(self, patient_id):
+        """Cascade-delete one patient in O(own appointments). Returns True if found."""
+        if self._patients.pop(patient_id, None) is None:
+            return False
+        self._patient_order.discard(self._patients)
+        self._name_index.remove(patient_id)
+        for appointment_id, appointment in self._appointments_by_patient.pop(patient_id, {}).items():
+            del self._appointments[appointment_id]
+            self._appointment_order.discard(self._appointments)
+            self._date_index.remove(appointment)
+            self._schedule.remove(appointment)
+        return True
+    
+    def patient_names(self, patient_ids):
+        """Return {patient_id: name} for the ids that exist."""
+        patients = self._patients
+        return {pid: patients[pid].name for pid in patient_ids if pid in patients}
+    
+    def get_patients(self, patient_ids):
+        """Return the Patients among patient_ids that exist."""
+        patients = self._patients
+        return [patients[pid] for pid in patient_ids if pid in patients]
+    
+    def appointments_for_patients(self, patient_ids):
+        """Return every appointment of the given patients."""
+        by_patient = self._appointments_by_patient
+        return [a for pid in patient_ids for a in by_patient.get(pid, {}).values()]
+    
+    # ========================================
+    # Appointments
+    # ========================================
+    
+    def insert_appointment(self, appointment):
+        """
+        Store an appointment, assigning the next id if appointment.id is None.
+        Raises PatientNotFound if its patient does not exist, and
+        SchedulingConflict if it overlaps a booking of the same provider.
+        """
+        if appointment.patient_id not in self._patients:
+            raise PatientNotFound(appointment.patient_id)
+        if appointment.start is not None:
+            conflict = self._schedule.find_conflict(
+                appointment.provider, appointment.date, appointment.start, appointment.end)
+            if conflict is not None and conflict != appointment.id:
+                raise SchedulingConflict(conflict, appointment.provider, appointment.date)
+        self._store_appointment(appointment)
+        self._generation += 1
+        return appointment
+    
+    def _store_appointment(self, appointment):
+        if appointment.id is None:
+            appointment.id = self._next_appointment_id
+        self._next_appointment_id = max(self._next_appointment_id, appointment.id + 1)
+        if appointment.id not in self._appointments:
+            self._appointment_order.add(appointment.id)
+        self._appointments[appointment.id] = appointment
+        self._appointments_by_patient.setdefault(appointment.patient_id, {})[appointment.id] = appointment
+        self._date_index.add(appointment)
+        self._schedule.add(appointment)
+    
+    def insert_appointments(self, appointments):
+        """Store many appointments in one write; nothing is stored if any patient is missing or booking conflicts."""
+        batch = ScheduleIndex()
+        for position, appointment in enumerate(appointments):
+            if appointment.patient_id not in self._patients:
+                raise PatientNotFound(appointment.patient_id)
+            if appointment.start is not None:
+                args = (appointment.provider, appointment.date, appointment.start, appointment.end)
+                conflict = self._schedule.find_conflict(*args)
+                if conflict is None:
+                    conflict = batch.find_conflict(*args)
+                    conflict = None if conflict is None else appointments[conflict].id
+                if conflict is not None:
+                    raise SchedulingConflict(conflict, appointment.provider, appointment.date)
+                batch.add_interval(*args, position)
+        for appointment in appointments:
+            self._store_appointment(appointment)
+        if appointments:
+            self._generation += 1
+        return appointments
+    
+    def get_appointments(self, appointment_ids):
+        """Return the Appointments among appointment_ids that exist."""
+        appointments = self._appointments
+        return [appointments[aid] for aid in appointment_ids if aid in appointments]
+    
+    def iter_appointments(self):
+        """Iterate all appointments in id order."""
+        return iter(self._appointments.values())
+    
+    def page_appointments(self, after_id, limit):
+        """Return up to limit appointments with id > after_id (keyset pagination)."""
+        return self._appointment_order.after(after_id, self._appointments, limit)
+    
+    def count_appointments(self):
+        return len(self._appointments)
+    
+    def search_appointments(self, query=None, date=None, date_from=None, date_to=None):
+        """Return matching Appointment objects in id order (see ClinicRepository)."""
+        # Candidate appointments from the date index, if a date filter applies
+        by_date = None
+        if date:
+            by_date = self._date_index.exact(date)
+        elif date_from or date_to:
+            by_date = {a.id: a for a in self._date_index.between(date_from, date_to)}
+        
+        if query:
+            patient_ids = self._name_index.search(query)
+            by_patient = self._appointments_by_patient
+            name_hits = sum(len(by_patient.get(pid, ())) for pid in patient_ids)
+            if by_date is not None and len(by_date) < name_hits:
+                # Fewer appointments on the date(s) than for the matching patients
+                results = [a for a in by_date.values() if a.patient_id in patient_ids]
+            else:
+                results = [a for pid in patient_ids for a in by_patient.get(pid, {}).values()
+                           if by_date is None or a.id in by_date]
+        elif by_date is not None:
+            results = list(by_date.values())
+        else:
+            return list(self._appointments.values())
+        
+        # Preserve the original insertion (id) order
+        results.sort(key=lambda a: a.id)
+        return results
+    
+    def find_conflict(self, provider, date, start, end):
+        """Return the id of an appointment overlapping [start, end) for provider on date, or None."""
+        return self._schedule.find_conflict(provider, date, start, end)
+    
+    def booked_intervals(self, provider, date):
+        """Return the booked (start, end) minutes of provider on date, sorted by start."""
+        return self._schedule.booked(provider, date)
+    
+    def close(self):
+        pass
+
+
+class SQLiteStorage:
+    """
+    SQLite-backed storage.
+    
+    Uses WAL journaling so readers never block the single writer, indexes on
+    patient name, appointment date, appointment patient_id and appointment
+    (provider, date, start_minute) for conflict checks, and only
+    parameterized statements (which sqlite3 caches as prepared statements per
+    connection). Each thread gets its own connection.
+    
+    Every write transaction also appends its mutations to a changes table,
+    tagged with the generation it bumps to (whole writes are pruned, keeping
+    at least the last max_changes). So the change feed covers writes from
+    every process, and a process can replay the writes of others.
+    """
+    
+    logs_changes = True
+    
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS patients ('
+        ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+        ' name TEXT NOT NULL,'
+        ' age INTEGER NOT NULL,'
+        ' phone TEXT NOT NULL,'
+        " notes TEXT NOT NULL DEFAULT '',"
+        " created TEXT NOT NULL DEFAULT '',"
+        ' version INTEGER NOT NULL DEFAULT 1)',
+        'CREATE TABLE IF NOT EXISTS appointments ('
+        ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+        ' patient_id INTEGER NOT NULL,'
+        ' date TEXT NOT NULL,'
+        ' description TEXT NOT NULL,'
+        ' start_minute INTEGER,'
+        ' duration INTEGER,'
+        " provider TEXT NOT NULL DEFAULT '')",
+        'CREATE INDEX IF NOT EXISTS idx_patients_name ON patients (name)',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (date)',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient_id)',
+        'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value NOT NULL)',
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)",
+        'CREATE TABLE IF NOT EXISTS changes ('
+        ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+        ' generation INTEGER NOT NULL,'
+        ' op TEXT NOT NULL,'
+        ' type TEXT NOT NULL,'
+        ' id INTEGER NOT NULL,'
+        ' row TEXT NOT NULL,'  # JSON array of the record's columns (as deleted, for deletes)
+        ' before TEXT)',  # Patient updates: the columns before the update
+        'CREATE INDEX IF NOT EXISTS idx_changes_generation ON changes (generation)',
+    )
+    
+    # Columns added after the first release, created on older databases at startup
+    MIGRATIONS = (
+        ('patients', 'created', "ALTER TABLE patients ADD COLUMN created TEXT NOT NULL DEFAULT ''"),
+        ('patients', 'version', 'ALTER TABLE patients ADD COLUMN version INTEGER NOT NULL DEFAULT 1'),
+        ('appointments', 'start_minute', 'ALTER TABLE appointments ADD COLUMN start_minute INTEGER'),
+        ('appointments', 'duration', 'ALTER TABLE appointments ADD COLUMN duration INTEGER'),
+        ('appointments', 'provider', "ALTER TABLE appointments ADD COLUMN provider TEXT NOT NULL DEFAULT ''"),
+    )
+    POST_MIGRATION = (
+        'CREATE INDEX IF NOT EXISTS idx_appointments_slot ON appointments (provider, date, start_minute)',
+    )
+    
+    # Accepted bookings never overlap, so only the last one starting before the
+    # new booking ends can overlap it: one index seek instead of a range scan
+    FIND_CONFLICT = (
+        'SELECT id, start_minute + duration FROM appointments'
+        ' WHERE provider = ? AND date = ? AND start_minute < ?'
+        ' ORDER BY start_minute DESC LIMIT 1'
+    )
+    
+    # Run inside every write transaction so all processes see the new generation
+    BUMP_GENERATION = "UPDATE meta SET value = value + 1 WHERE key = 'generation'"
+    SELECT_GENERATION = "SELECT value FROM meta WHERE key = 'generation'"
+    
+    # The change feed: sequence numbers continue from the last one ever assigned
+    # (sqlite_sequence), which a new database starts at the current time in
+    # microseconds, like changes.ChangeLog
+    LOG_CHANGE = 'INSERT INTO changes (generation, op, type, id, row, before) VALUES (?, ?, ?, ?, ?, ?)'
+    # Drops the writes older than the one holding the max_changes-th newest change
+    PRUNE_CHANGES = ('DELETE FROM changes WHERE generation < (SELECT generation FROM changes'
+                     " WHERE seq = (SELECT seq FROM sqlite_sequence WHERE name = 'changes') - ?)")
+    
+    PATIENT_COLUMNS = 'id, name, age, phone, notes, created, version'
+    INSERT_PATIENT = f'INSERT INTO patients ({PATIENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)'
+    APPOINTMENT_COLUMNS = 'id, patient_id, date, description, start_minute, duration, provider'
+    INSERT_APPOINTMENT = f'INSERT INTO appointments ({APPOINTMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)'
+    # One statement, so a delete of the patient from another process cannot slip in between
+    INSERT_APPOINTMENT_FOR_PATIENT = (f'INSERT INTO appointments ({APPOINTMENT_COLUMNS}) SELECT ?, ?, ?, ?, ?, ?, ?'
+                                      ' WHERE EXISTS (SELECT 1 FROM patients WHERE id = ?)')
+    
+    def __init__(self, path=None, max_changes=MAX_CHANGES):
+        """
+        Args:
+            path: Database file path. None creates a private in-memory database
+                  (shared between this instance's threads only).
+            max_changes: Number of logged changes kept for the change feed
+        """
+        self.max_changes = max_changes
+        if path is None:
+            self._target = f'file:clinic-{uuid.uuid4().hex}?mode=memory&cache=shared'
+        else:
+            self._target = path
+        self._uri = path is None
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # The first connection creates the schema and, for in-memory databases,
+        # keeps the database alive for the lifetime of this storage.
+        conn = self._conn()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            for table, column, statement in self.MIGRATIONS:
+                if column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+                    conn.execute(statement)
+            for statement in self.POST_MIGRATION:
+                conn.execute(statement)
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('instance', ?)",
+                         (uuid.uuid4().hex,))
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'changes', ?"
+                         " WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'changes')",
+                         (time.time_ns() // 1000,))
+        self.instance_id = conn.execute("SELECT value FROM meta WHERE key = 'instance'").fetchone()[0]
+    
+    def _conn(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._target, uri=self._uri, timeout=30,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.create_function('contains_ci', 2, _contains_ci, deterministic=True)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def generation(self):
+        """Counter bumped by every write transaction, from any process."""
+        return self._conn().execute(self.SELECT_GENERATION).fetchone()[0]
+    
+    def written_generation(self):
+        """
+        Generation produced by this thread's latest write. It is read inside the
+        write transaction, so another process's later write is never mistaken for it.
+        """
+        return self._local.written_generation
+    
+    @contextmanager
+    def snapshot(self):
+        """Make this thread's reads inside the with block see one state of the database."""
+        conn = self._conn()
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute('BEGIN')
+        try:
+            yield
+        finally:
+            conn.commit()
+    
+    def _record_write(self, conn, changes):
+        """
+        Finish a write transaction: bump the generation and log the write's
+        (op, type, id, row, row before or None) changes under it.
+        """
+        conn.execute(self.BUMP_GENERATION)
+        generation = conn.execute(self.SELECT_GENERATION).fetchone()[0]
+        conn.executemany(self.LOG_CHANGE, [
+            (generation, op, kind, record_id, json.dumps(row), json.dumps(before) if before is not None else None)
+            for op, kind, record_id, row, before in changes])
+        conn.execute(self.PRUNE_CHANGES, (self.max_changes,))
+        self._local.written_generation = generation
+    
+    def _record(self, kind, row):
+        """Internal: The Patient or Appointment of a logged row."""
+        return self._patient(row) if kind == 'patient' else self._appointment(row)
+    
+    def changes_since(self, seq, limit):
+        """Up to limit logged changes after seq, oldest first, as (seq, op, type, id, record dict or None)."""
+        rows = self._conn().execute('SELECT seq, op, type, id, row FROM changes WHERE seq > ? ORDER BY seq LIMIT ?',
+                                    (seq, limit))
+        return [(entry_seq, op, kind, record_id,
+                 self._record(kind, json.loads(row)).to_dict() if op == 'upsert' else None)
+                for entry_seq, op, kind, record_id, row in rows]
+    
+    def events_since(self, generation, until=None):
+        """
+        The writes after generation (and before generation until), read back from
+        the change log as (generation, event, payload) in the format of
+        ClinicRepository.subscribe; None if the log no longer holds them all.
+        """
+        conn = self._conn()
+        sql, params = 'SELECT generation, op, type, row, before FROM changes WHERE generation > ?', [generation]
+        if until is not None:
+            sql += ' AND generation < ?'
+            params.append(until)
+        rows = conn.execute(sql + ' ORDER BY seq', params).fetchall()
+        # Checked after reading: writes pruned meanwhile then count as missing too
+        oldest = conn.execute('SELECT generation FROM changes ORDER BY seq LIMIT 1').fetchone()
+        if not rows or oldest is None or oldest[0] > generation + 1:
+            return None
+        events = []
+        deleted = None  # (generation, patients, appointments) of the latest cascade delete
+        for row_generation, op, kind, row, before in rows:
+            record = self._record(kind, json.loads(row))
+            if op == 'delete':
+                if deleted is None or deleted[0] != row_generation:
+                    deleted = (row_generation, [], [])
+                    events.append((row_generation, 'patients_deleted', deleted[1:]))
+                (deleted[1] if kind == 'patient' else deleted[2]).append(record)
+            elif kind == 'appointment':
+                events.append((row_generation, 'appointment_added', record))
+            elif before is None:
+                events.append((row_generation, 'patient_added', record))
+            else:
+                events.append((row_generation, 'patient_updated', (self._patient(json.loads(before)), record)))
+        return events
+    
+    def change_bounds(self):
+        """(Oldest since the logged changes still answer, last sequence number assigned)."""
+        return self._conn().execute(
+            "SELECT COALESCE((SELECT MIN(seq) FROM changes) - 1, seq), seq FROM sqlite_sequence WHERE name = 'changes'"
+        ).fetchone()
+    
+    def claim_seed(self):
+        """
+        True if the database is empty and no process has claimed it for the
+        initial data yet. The check and the claim are one write transaction, so
+        of several workers starting on a new database exactly one seeds it.
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT EXISTS (SELECT 1 FROM patients)').fetchone()[0]:
+                return False
+            return conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('seeded', 1)").rowcount == 1
+    
+    def last_id(self, table, conn=None):
+        """Highest id ever assigned in table ('patients' or 'appointments'), 0 if none."""
+        return (conn or self._conn()).execute(
+            f'SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),'
+            f' COALESCE((SELECT MAX(id) FROM {table}), 0))', (table,)).fetchone()[0]
+    
+    def _assign_ids(self, conn, table, records):
+        """Give records without an id the next ids of table (call inside a write transaction)."""
+        next_id = self.last_id(table, conn) + 1
+        for record in records:
+            if record.id is None:
+                record.id = next_id
+                next_id += 1
+    
+    @staticmethod
+    def _patient(row):
+        return Patient(*row)
+    
+    @staticmethod
+    def _appointment(row):
+        return Appointment(*row)
+    
+    @staticmethod
+    def _patient_row(p):
+        return (p.id, p.name, p.age, p.phone, p.notes, p.created, p.version)
+    
+    @staticmethod
+    def _appointment_row(a):
+        return (a.id, a.patient_id, a.date, a.description, a.start, a.duration, a.provider)
+    
+    def _check_conflict(self, conn, appointment):
+        """Raise SchedulingConflict if appointment overlaps a stored booking (inside a transaction)."""
+        if appointment.start is None:
+            return
+        row = conn.execute(self.FIND_CONFLICT,
+                           (appointment.provider, appointment.date, appointment.end)).fetchone()
+        if row and row[1] > appointment.start:
+            raise SchedulingConflict(row[0], appointment.provider, appointment.date)
+    
+    # ========================================
+    # Patients
+    # ========================================
+    
+    def insert_patient(self, patient):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(self.INSERT_PATIENT, self._patient_row(patient))
+            patient.id = cursor.lastrowid
+            self._record_write(conn, [('upsert', 'patient', patient.id, self._patient_row(patient), None)])
+        return patient
+    
+    def insert_patients(self, patients):
+        """Insert many patients in a single transaction with one executemany."""
+        if not patients:
+            return patients
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # Lock first so the id block is ours
+            self._assign_ids(conn, 'patients', patients)
+            rows = [self._patient_row(p) for p in patients]
+            conn.executemany(self.INSERT_PATIENT, rows)
+            self._record_write(conn, [('upsert', 'patient', row[0], row, None) for row in rows])
+        return patients
+    
+    def get_patient(self, patient_id):
+        row = self._conn().execute(
+            f'SELECT {self.PATIENT_COLUMNS} FROM patients WHERE id = ?', (patient_id,)).fetchone()
+        return self._patient(row) if row else None
+    
+    def iter_patients(self):
+        rows = self._conn().execute(f'SELECT {self.PATIENT_COLUMNS} FROM patients ORDER BY id')
+        return map(self._patient, rows)
+    
+    def page_patients(self, after_id, limit):
+        rows = self._conn().execute(
+            f'SELECT {self.PATIENT_COLUMNS} FROM patients WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id if after_id is not None else 0, limit))
+        return [self._patient(row) for row in rows]
+    
+    def count_patients(self):
+        return self._conn().execute('SELECT COUNT(*) FROM patients').fetchone()[0]
+    
+    def update_patient(self, patient_id, name, age, phone, notes=None):
+        select = f'SELECT {self.PATIENT_COLUMNS} FROM patients WHERE id = ?'
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # The logged before and after are this update's
+            before = conn.execute(select, (patient_id,)).fetchone()
+            if before is None:
+                return None
+            conn.execute('UPDATE patients SET name = ?, age = ?, phone = ?, notes = COALESCE(?, notes),'
+                         ' version = version + 1 WHERE id = ?', (name, int(age), phone, notes, patient_id))
+            after = conn.execute(select, (patient_id,)).fetchone()
+            self._record_write(conn, [('upsert', 'patient', patient_id, after, before)])
+        return self._patient(after)
+    
+    def delete_patients(self, patient_ids):
+        patient_ids = list(patient_ids)
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # The logged records are the ones deleted
+            patients = list(self._select_in(f'SELECT {self.PATIENT_COLUMNS} FROM patients WHERE id IN ({{}})',
+                                            patient_ids))
+            if not patients:
+                return 0
+            appointments = list(self._select_in(
+                f'SELECT {self.APPOINTMENT_COLUMNS} FROM appointments WHERE patient_id IN ({{}})', patient_ids))
+            params = [(row[0],) for row in patients]
+            conn.executemany('DELETE FROM appointments WHERE patient_id = ?', params)
+            conn.executemany('DELETE FROM patients WHERE id = ?', params)
+            self._record_write(conn, [('delete', 'appointment', row[0], row, None) for row in appointments]
+                               + [('delete', 'patient', row[0], row, None) for row in patients])
+        return len(patients)
+    
+    def _select_in(self, sql, ids):
+        """Yield rows of sql (with an IN ({}) placeholder) for ids, in parameter-limit sized chunks."""
+        ids = list(ids)
+        conn = self._conn()
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            yield from conn.execute(sql.format(','.join('?' * len(chunk))), chunk)
+    
+    def patient_names(self, patient_ids):
+        return dict(self._select_in('SELECT id, name FROM patients WHERE id IN ({})', patient_ids))
+    
+    def get_patients(self, patient_ids):
+        return [self._patient(row) for row in self._select_in(
+            f'SELECT {self.PATIENT_COLUMNS} FROM patients WHERE id IN ({{}})', patient_ids)]
+    
+    def appointments_for_patients(self, patient_ids):
+        return [self._appointment(row) for row in self._select_in(
+            f'SELECT {self.APPOINTMENT_COLUMNS} FROM appointments WHERE patient_id IN ({{}})', patient_ids)]
+    
+    # ========================================
+    # Appointments
+    # ========================================
+    
+    def insert_appointment(self, appointment):
+        conn = self._conn()
+        with conn:
+            if appointment.start is not None:
+                conn.execute('BEGIN IMMEDIATE')  # Check and insert as one atomic step
+                self._check_conflict(conn, appointment)
+            cursor = conn.execute(self.INSERT_APPOINTMENT_FOR_PATIENT,
+                                  self._appointment_row(appointment) + (appointment.patient_id,))
+            if not cursor.rowcount:
+                raise PatientNotFound(appointment.patient_id)
+            appointment.id = cursor.lastrowid
+            self._record_write(conn, [('upsert', 'appointment', appointment.id, self._appointment_row(appointment),
+                                       None)])
+        return appointment
+    
+    def insert_appointments(self, appointments):
+        """Insert many appointments in a single transaction with one executemany."""
+        if not appointments:
+            return appointments
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # Lock first so the id block is ours
+            self._assign_ids(conn, 'appointments', appointments)
+            patient_ids = {a.patient_id for a in appointments}
+            patient_ids.difference_update(row[0] for row in self._select_in('SELECT id FROM patients WHERE id IN ({})',
+                                                                            patient_ids))
+            if patient_ids:
+                raise PatientNotFound(min(patient_ids))
+            batch = ScheduleIndex()
+            for appointment in appointments:
+                if appointment.start is not None:
+                    self._check_conflict(conn, appointment)
+                    conflict = batch.find_conflict(appointment.provider, appointment.date,
+                                                   appointment.start, appointment.end)
+                    if conflict is not None:
+                        raise SchedulingConflict(conflict, appointment.provider, appointment.date)
+                    batch.add(appointment)
+            rows = [self._appointment_row(a) for a in appointments]
+            conn.executemany(self.INSERT_APPOINTMENT, rows)
+            self._record_write(conn, [('upsert', 'appointment', row[0], row, None) for row in rows])
+        return appointments
+    
+    def get_appointments(self, appointment_ids):
+        return [self._appointment(row) for row in self._select_in(
+            f'SELECT {self.APPOINTMENT_COLUMNS} FROM appointments WHERE id IN ({{}})', appointment_ids)]
+    
+    def iter_appointments(self):
+        rows = self._conn().execute(
+            f'SELECT {self.APPOINTMENT_COLUMNS} FROM appointments ORDER BY id')
+        return map(self._appointment, rows)
+    
+    def page_appointments(self, after_id, limit):
+        rows = self._conn().execute(
+            f'SELECT {self.APPOINTMENT_COLUMNS} FROM appointments WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id if after_id is not None else 0, limit))
+        return [self._appointment(row) for row in rows]
+    
+    def count_appointments(self):
+        return self._conn().execute('SELECT COUNT(*) FROM appointments').fetchone()[0]
+    
+    def search_appointments(self, query=None, date=None, date_from=None, date_to=None):
+        clauses = []
+        params = []
+        if date:
+            clauses.append('a.date = ?')
+            params.append(date)
+        else:
+            if date_from:
+                clauses.append('a.date >= ?')
+                params.append(date_from)
+            if date_to:
+                clauses.append('a.date <= ?')
+                params.append(date_to)
+        if query:
+            clauses.append('contains_ci(p.name, ?)')
+            params.append(query.lower())
+        columns = ', '.join('a.' + c for c in self.APPOINTMENT_COLUMNS.split(', '))
+        sql = f'SELECT {columns} FROM appointments a'
+        if query:
+            sql += ' JOIN patients p ON p.id = a.patient_id'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY a.id'
+        return [self._appointment(row) for row in self._conn().execute(sql, params)]
+    
+    def find_conflict(self, provider, date, start, end):
+        row = self._conn().execute(self.FIND_CONFLICT, (provider, date, end)).fetchone()
+        return row[0] if row and row[1] > start else None
+    
+    def booked_intervals(self, provider, date):
+        return self._conn().execute(
+            'SELECT start_minute, start_minute + duration FROM appointments'
+            ' WHERE provider = ? AND date = ? AND start_minute IS NOT NULL ORDER BY start_minute',
+            (provider, date)).fetchall()
+    
+    def close(self):
+        """Close every connection opened by this storage."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def _contains_ci(name, query_lower):
+    """SQL function matching Python's `query in name.lower()` exactly."""
+    return name is not None and query_lower in name.lower()
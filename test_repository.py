@@ -3,17 +3,73 @@ Unit Tests for Clinic Legacy Application
 
 Run with: pytest test_repository.py -v
 """
+import asyncio
+import csv
+import gc
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
 import pytest
+from flask import Flask, jsonify
+import app as clinic_app
+from assets import IMMUTABLE, build_assets, compress_responses, minify_css, minify_js
+from async_api import ClinicAPI
+from async_repository import AsyncClinicRepository
+from changes import ChangeLog
+from fuzzy import PatientMatcher, phone_key, phonetic_key
+from importer import ImportStopped, import_records, main as import_main, read_records
+from journal import Journal
+from metrics import Histogram, Registry, SlowRequestProfiler, instrument_repository
+from reports import HAVE_NUMPY, ClinicReports
 from repository import ClinicRepository
+from models import Patient
+from scheduling import SchedulingConflict
+from search import TextSearch, tokenize
+from sharding import ProcessShard, ShardedRepository, StridedIds, open_shard
+from stats import ClinicStats
+from storage import SQLiteStorage
+from validators import PatientNotFound, ValidationError
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def new_repo(request, tmp_path):
+    """Factory for empty repositories, run once per storage backend."""
+    storages = []
+    
+    def factory():
+        if request.param == 'sqlite':
+            storage = SQLiteStorage(str(tmp_path / f'clinic-{len(storages)}.db'))
+            storages.append(storage)
+            return ClinicRepository(storage)
+        return ClinicRepository()
+    
+    yield factory
+    for storage in storages:
+        storage.close()
+
+
+@pytest.fixture
+def client(new_repo):
+    """Test client of the real app, serving a new empty repository (once per storage backend)."""
+    previous = clinic_app.clinic
+    clinic_app.use_repository(new_repo())
+    yield clinic_app.app.test_client()
+    clinic_app.use_repository(previous)
 
 
 class TestPatientOperations:
     """Tests for patient-related repository operations."""
     
     @pytest.fixture
-    def repo(self):
+    def repo(self, new_repo):
         """Create a fresh repository for each test."""
-        return ClinicRepository()
+        return new_repo()
     
     # Test 1: add_patient
     def test_add_patient_creates_patient_with_correct_data(self, repo):
@@ -92,15 +148,66 @@ class TestPatientOperations:
         patients = repo.get_all_patients()
         assert len(patients) == 1
         assert patients[0]['name'] == "To Keep"
+    
+    # Test 22: delete_patients bulk cascade
+    def test_delete_patients_removes_many(self, repo):
+        """Test that delete_patients removes each listed patient and their appointments."""
+        for i in range(4):
+            repo.add_patient(f"Patient {i}", "30", "111")
+            repo.add_appointment(i + 1, "2025-12-25", f"Checkup {i}")
+        
+        deleted = repo.delete_patients([1, 3, 3, 999])
+        
+        assert deleted == 2
+        assert [p['id'] for p in repo.get_all_patients()] == [2, 4]
+        assert [a['patient_id'] for a in repo.get_all_appointments()] == [2, 4]
+        assert len(repo.search_appointments(date="2025-12-25")) == 2
+    
+    # Test 55: every update bumps the patient's version
+    def test_update_bumps_version(self, repo):
+        """Test that versions start at 1 and change only on updates that match."""
+        assert repo.add_patient("John Doe", "30", "091-123-456")['version'] == 1
+        repo.update_patient(1, "John Doe", "31", "091-123-456")
+        repo.update_patient(1, "John Doe", "32", "091-123-456")
+        repo.update_patient(99, "Nobody", "20", "000")
+        
+        assert repo.find_patient(1)['version'] == 3
+    
+    # Test 27: keyset pagination walks every patient once
+    def test_get_patients_page_walks_all_pages(self, repo):
+        """Test that following cursors returns every patient once, skipping deleted ones."""
+        for i in range(7):
+            repo.add_patient(f"Patient {i}", "30", "111")
+        repo.delete_patients([2, 5])
+        
+        seen = []
+        page, cursor = repo.get_patients_page(2)
+        seen.extend(p['id'] for p in page)
+        while cursor is not None:
+            page, cursor = repo.get_patients_page(2, cursor)
+            seen.extend(p['id'] for p in page)
+        
+        assert seen == [1, 3, 4, 6, 7]
+        assert repo.count_patients() == 5
+    
+    # Test 29: iter_patients streams across batch boundaries
+    def test_iter_patients_yields_every_patient(self, repo):
+        """Test that the export generator yields all patients in id order."""
+        for i in range(5):
+            repo.add_patient(f"Patient {i}", "30", "111")
+        
+        streamed = list(repo.iter_patients(batch_size=2))
+        
+        assert streamed == repo.get_all_patients()
 
 
 class TestAppointmentOperations:
     """Tests for appointment-related repository operations."""
     
     @pytest.fixture
-    def repo(self):
+    def repo(self, new_repo):
         """Create a fresh repository with a patient for each test."""
-        repo = ClinicRepository()
+        repo = new_repo()
         repo.add_patient("Test Patient", "30", "111")
         return repo
     
@@ -169,6 +276,19 @@ class TestAppointmentOperations:
         assert len(results_lower) == 1
         assert len(results_upper) == 1
     
+    # Test 72: appointments of missing patients are rejected
+    def test_add_appointment_requires_patient(self, repo):
+        """Test that booking for an unknown or deleted patient raises and stores nothing."""
+        repo.add_patient("Gone Patient", "50", "222")
+        repo.delete_patient(2)
+        
+        for patient_id in (2, 999):
+            with pytest.raises(PatientNotFound):
+                repo.add_appointment(patient_id, "2025-12-25", "Orphan")
+        
+        assert repo.count_appointments() == 0
+        assert repo.add_appointment(1, "2025-12-25", "Checkup")['id'] == 1
+    
     # Test 14: delete_patient cascades to appointments
     def test_delete_patient_removes_appointments(self, repo):
         """Test that deleting a patient also removes their appointments."""
@@ -178,14 +298,97 @@ class TestAppointmentOperations:
         
         appointments = repo.get_all_appointments()
         assert len(appointments) == 0
+    
+    # Test 18: delete_patient keeps other patients' appointments
+    def test_delete_patient_keeps_other_appointments(self, repo):
+        """Test that the cascade only removes the deleted patient's appointments."""
+        repo.add_patient("Other Patient", "40", "222")
+        repo.add_appointment(1, "2025-12-25", "Checkup")
+        repo.add_appointment(2, "2025-12-26", "Follow-up")
+        
+        repo.delete_patient(1)
+        
+        appointments = repo.get_appointments_with_patient_names()
+        assert len(appointments) == 1
+        assert appointments[0]['patient_name'] == "Other Patient"
+    
+    # Test 19: enrichment reflects patient updates
+    def test_enrichment_reflects_updated_patient_name(self, repo):
+        """Test that enriched appointments use the current patient name."""
+        repo.add_appointment(1, "2025-12-25", "Checkup")
+        
+        repo.update_patient(1, "Renamed Patient", "31", "111")
+        
+        enriched = repo.get_appointments_with_patient_names()
+        assert enriched[0]['patient_name'] == "Renamed Patient"
+    
+    # Test 28: appointment pages enriched with patient names
+    def test_get_appointments_page_with_patient_names(self, repo):
+        """Test that appointment pages can be enriched and report the next cursor."""
+        for day in range(1, 4):
+            repo.add_appointment(1, f"2025-12-0{day}", f"Visit {day}")
+        
+        page, cursor = repo.get_appointments_page(2, with_patient_names=True)
+        last_page, last_cursor = repo.get_appointments_page(2, cursor)
+        
+        assert [a['patient_name'] for a in page] == ["Test Patient", "Test Patient"]
+        assert cursor == 2
+        assert [a['description'] for a in last_page] == ["Visit 3"]
+        assert last_cursor is None
+        assert repo.count_appointments() == 3
+    
+    # Test 20: search_appointments by date range
+    def test_search_appointments_filters_by_date_range(self, repo):
+        """Test that date_from/date_to select an inclusive date range."""
+        repo.add_appointment(1, "2025-12-24", "Before")
+        repo.add_appointment(1, "2025-12-26", "Inside")
+        repo.add_appointment(1, "2025-12-25", "Start")
+        repo.add_appointment(1, "2025-12-28", "After")
+        
+        results = repo.search_appointments(date_from="2025-12-25", date_to="2025-12-27")
+        
+        assert [r['description'] for r in results] == ["Inside", "Start"]
+    
+    # Test 21: name search matches substrings and follows renames
+    def test_search_appointments_matches_substring_after_rename(self, repo):
+        """Test that the name index matches inner substrings and tracks updates."""
+        repo.add_appointment(1, "2025-12-25", "Checkup")
+        
+        assert len(repo.search_appointments(query="st pat")) == 1
+        assert len(repo.search_appointments(query="ie")) == 1
+        
+        repo.update_patient(1, "Mona Khaled", "30", "111")
+        
+        assert repo.search_appointments(query="patient") == []
+        assert len(repo.search_appointments(query="KHAL", date="2025-12-25")) == 1
+    
+    # Test 65: several patients with their appointments in one batch
+    def test_patients_with_appointments(self, repo):
+        """Test batched patient documents and per-patient appointment lists."""
+        repo.add_patient("Sara Omar", "25", "222")
+        repo.add_appointment(2, "2025-12-25", "Checkup")
+        repo.add_appointment(1, "2025-12-26", "Follow-up")
+        repo.add_appointment(2, "2025-12-20", "Blood test")
+        calls = []
+        appointments_for_patients = repo._storage.appointments_for_patients
+        repo._storage.appointments_for_patients = lambda ids: calls.append(ids) or appointments_for_patients(ids)
+        
+        patients = repo.get_patients_with_appointments([2, 99, 1])
+        assert [p['id'] for p in patients] == [2, 1]
+        assert [a['id'] for a in patients[0]['appointments']] == [1, 3]
+        assert patients[1]['appointments'][0]['description'] == "Follow-up"
+        assert len(calls) == 1
+        
+        by_patient = repo.get_appointments_for_patients([1, 99])
+        assert [a['id'] for a in by_patient[1]] == [2] and by_patient[99] == []
 
 
 class TestEdgeCases:
     """Tests for edge cases and error handling."""
     
     @pytest.fixture
-    def repo(self):
-        return ClinicRepository()
+    def repo(self, new_repo):
+        return new_repo()
     
     # Test 15: update non-existent patient
     def test_update_nonexistent_patient_returns_none(self, repo):
@@ -208,6 +411,1307 @@ class TestEdgeCases:
         results = repo.search_appointments(query="NonExistent")
         
         assert results == []
+    
+    # Test 31: generation changes on every mutation
+    def test_generation_bumps_on_mutation(self, repo):
+        """Test that each write changes the generation used for cache invalidation."""
+        seen = [repo.generation]
+        repo.add_patient("John", "30", "111")
+        seen.append(repo.generation)
+        repo.add_appointment(1, "2025-12-25", "Checkup")
+        seen.append(repo.generation)
+        repo.update_patient(1, "Jane", "30", "111")
+        seen.append(repo.generation)
+        repo.delete_patient(1)
+        seen.append(repo.generation)
+        
+        assert len(set(seen)) == len(seen)
+    
+    # Test 32: cached search results are invalidated by writes
+    def test_search_cache_is_invalidated_by_update(self, repo):
+        """Test that a repeated search reflects a rename made in between."""
+        repo.add_patient("John", "30", "111")
+        repo.add_appointment(1, "2025-12-25", "Checkup")
+        assert len(repo.search_appointments(query="john")) == 1
+        
+        repo.update_patient(1, "Jane", "30", "111")
+        
+        assert repo.search_appointments(query="john") == []
+        assert repo.search_appointments(query="jane")[0]['patient_name'] == "Jane"
+    
+    # Test 30: age stored compactly as an int
+    def test_age_is_stored_as_int_but_serialized_as_string(self, repo):
+        """Test that models keep age as an int while dicts keep the string format."""
+        repo.add_patient("John", "30", "111")
+        repo.update_patient(1, "John", "31", "111")
+        
+        assert repo._find_patient_obj(1).age == 31
+        assert repo.find_patient(1)['age'] == "31"
+
+
+class TestBulkImport:
+    """Tests for validated bulk inserts."""
+    
+    @pytest.fixture
+    def repo(self, new_repo):
+        return new_repo()
+    
+    # Test 33: bulk_add_patients assigns consecutive ids
+    def test_bulk_add_patients_assigns_ids(self, repo):
+        """Test that bulk-added patients get ids and are searchable like single adds."""
+        repo.add_patient("Existing", "40", "000")
+        
+        ids = repo.bulk_add_patients([
+            {'name': "Ahmed Ali", 'age': 30, 'phone': "111"},
+            {'name': " Sara Omar ", 'age': "25", 'phone': "222", 'notes': "Allergic"},
+        ])
+        
+        assert ids == [2, 3]
+        assert repo.find_patient(3)['name'] == "Sara Omar"
+        assert repo.find_patient(3)['notes'] == "Allergic"
+        assert repo.add_patient("Next", "20", "333")['id'] == 4
+    
+    # Test 34: one invalid record rejects the whole batch
+    def test_bulk_add_is_all_or_nothing(self, repo):
+        """Test that validation errors list every bad record and nothing is written."""
+        with pytest.raises(ValidationError) as error:
+            repo.bulk_add_patients([
+                {'name': "Valid", 'age': "30", 'phone': "111"},
+                {'name': "", 'age': "200", 'phone': "222"},
+            ])
+        
+        assert [index for index, _ in error.value.errors] == [1, 1]
+        assert repo.get_all_patients() == []
+    
+    # Test 35: appointments must reference existing patients
+    def test_bulk_add_appointments_checks_patients(self, repo):
+        """Test that bulk appointments validate fields and patient references."""
+        repo.add_patient("Ahmed Ali", "30", "111")
+        
+        with pytest.raises(ValidationError) as error:
+            repo.bulk_add_appointments([
+                {'patient_id': 1, 'date': "2025-12-25", 'description': "Checkup"},
+                {'patient_id': 42, 'date': "2025-12-26", 'description': "Ghost"},
+            ])
+        assert error.value.errors == [(1, 'Patient not found')]
+        
+        ids = repo.bulk_add_appointments([
+            {'patient_id': "1", 'date': "2025-12-25", 'description': "Checkup"},
+        ])
+        assert ids == [1]
+        assert repo.search_appointments(query="ahmed")[0]['description'] == "Checkup"
+    
+    # Test 70: only valid records are checked for their patient; non-objects are rejected
+    def test_bulk_add_reports_each_record_once(self, repo):
+        """Test that invalid and non-object records get their own errors, not 'Patient not found'."""
+        repo.add_patient("Ahmed Ali", "30", "111")
+        
+        with pytest.raises(ValidationError) as error:
+            repo.bulk_add_appointments([
+                {'patient_id': "1", 'date': "2025-12-25", 'description': ""},
+                {'patient_id': "999", 'date': "2025-12-26", 'description': "Ghost"},
+                [1, 2],
+            ])
+        assert error.value.errors == [(0, 'Description is required'), (1, 'Patient not found'),
+                                      (2, 'Record must be an object of field values')]
+        with pytest.raises(ValidationError) as error:
+            repo.bulk_add_patients([1, None, {'name': "Valid", 'age': "30", 'phone': "111"}])
+        assert [index for index, _ in error.value.errors] == [0, 1]
+        assert repo.count_appointments() == 0 and repo.count_patients() == 1
+    
+    # Test 71: a stopped import reports how many records were written before it
+    def test_import_stops_at_bad_batch_and_counts_imported(self, repo):
+        """Test that earlier batches stay written and the error says how many records they hold."""
+        lines = [f'{{"name": "Patient {i}", "age": 30, "phone": "111"}}\n' for i in range(5)]
+        
+        with pytest.raises(ImportStopped) as error:
+            import_records(repo, 'patients', read_records(lines + ['{"name": "", "age": 30}\n'], 'ndjson'), 2)
+        assert error.value.imported == 4
+        assert [index for index, _ in error.value.errors] == [5, 5]
+        assert repo.count_patients() == 4
+        
+        with pytest.raises(ImportStopped) as error:
+            import_records(repo, 'patients', read_records(lines[:3] + ['{"name": "Torn'], 'ndjson'), 2)
+        assert error.value.imported == 2
+        assert error.value.errors[0][0] == 3
+        assert error.value.errors[0][1].startswith('Malformed record')
+        assert repo.count_patients() == 6
+    
+    # Test 88: the command line imports into the configured store only, and maps source ids to new ones
+    def test_import_command_maps_ids(self, tmp_path, monkeypatch, capsys):
+        """Test that a CLI import adds no demo data and writes the old id -> new id mapping."""
+        source = tmp_path / 'export.csv'
+        source.write_text('id,name,age,phone\n17,Ahmed Ali,30,111\n42,Sara Omar,25,222\n', encoding='utf-8')
+        monkeypatch.setenv('CLINIC_DB', str(tmp_path / 'clinic.db'))
+        
+        assert import_main(['patients', str(source), '--id-map', str(tmp_path / 'ids.csv')]) == 0
+        capsys.readouterr()
+        assert import_main(['patients', str(source), '--id-map', '-', '--batch-size', '1']) == 0
+        
+        repo = ClinicRepository(SQLiteStorage(str(tmp_path / 'clinic.db')))
+        assert [p['name'] for p in repo.get_all_patients()] == ['Ahmed Ali', 'Sara Omar'] * 2
+        with open(tmp_path / 'ids.csv', newline='', encoding='utf-8') as ids:
+            assert list(csv.reader(ids)) == [['record', 'source_id', 'id'], ['0', '17', '1'], ['1', '42', '2']]
+        assert capsys.readouterr().out.splitlines()[:3] == ['record,source_id,id', '0,17,3', '1,42,4']
+        repo.close()
+
+
+class TestConcurrency:
+    """Stress tests for concurrent use of one repository from many threads."""
+    
+    # Test 36: mixed concurrent writes and reads keep every invariant
+    def test_concurrent_operations_keep_invariants(self, new_repo):
+        """Hammer add/update/delete/search from many threads, then check consistency."""
+        repo = new_repo()
+        errors = []
+        created = []
+        
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for i in range(150):
+                    op = rng.random()
+                    if op < 0.35:
+                        patient = repo.add_patient(f"Worker{seed} Patient{i}", "30", "111")
+                        created.append(patient['id'])
+                        try:
+                            repo.add_appointment(patient['id'], f"2025-12-{1 + i % 28:02d}", "Checkup")
+                        except PatientNotFound:
+                            pass  # Another thread deleted the patient first
+                    elif op < 0.5 and created:
+                        pid = rng.choice(created)
+                        repo.update_patient(pid, f"Renamed{seed} {i}", "31", "222")
+                    elif op < 0.6 and created:
+                        repo.delete_patient(rng.choice(created))
+                    else:
+                        for row in repo.search_appointments(query=f"worker{seed}"):
+                            assert f"worker{seed}" in row['patient_name'].lower()
+                        repo.get_appointments_page(20, with_patient_names=True)
+            except Exception as error:  # Surface failures from worker threads
+                errors.append(error)
+        
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert errors == []
+        # Ids were allocated atomically: no duplicates across threads
+        assert len(created) == len(set(created))
+        patients = repo.get_all_patients()
+        patient_ids = {p['id'] for p in patients}
+        assert len(patients) == repo.count_patients()
+        # The cascade left no orphaned appointments and indexes agree with the data
+        appointments = repo.get_appointments_with_patient_names()
+        assert len(appointments) == repo.count_appointments()
+        assert all(a['patient_id'] in patient_ids for a in appointments)
+        for patient in patients:
+            matches = repo.search_appointments(query=patient['name'])
+            assert patient['id'] in {a['patient_id'] for a in matches}
+
+
+class TestAsyncRepository:
+    """Tests for the asyncio facade over ClinicRepository."""
+    
+    # Test 37: awaitable reads and writes match the sync repository
+    def test_async_facade_reads_and_writes(self, new_repo):
+        """Test that concurrent awaited writes all land and reads see them."""
+        repo = AsyncClinicRepository(new_repo())
+        
+        async def scenario():
+            added = await asyncio.gather(*(repo.add_patient(f"Patient {i}", "30", "111") for i in range(20)))
+            page, cursor = await repo.get_patients_page(5)
+            return added, page, cursor, await repo.count_patients()
+        
+        added, page, cursor, count = asyncio.run(scenario())
+        repo.close()
+        
+        assert sorted(p['id'] for p in added) == list(range(1, 21))
+        assert [p['id'] for p in page] == [1, 2, 3, 4, 5]
+        assert cursor == 5
+        assert count == 20
+    
+    # Test 91: the ASGI API revalidates weak and listed ETags and pages like app.py
+    def test_async_api_etags_and_paging(self, new_repo):
+        """Test If-None-Match with W/ tags, lists and *, and the shared ?limit= / ?ids= rules."""
+        sync_repo = new_repo()
+        for i in range(3):
+            sync_repo.add_patient(f"Patient {i}", "30", "111")
+        api = ClinicAPI(AsyncClinicRepository(sync_repo))
+        
+        async def get(path, query='', if_none_match=None):
+            headers = [(b'host', b'clinic')]
+            if if_none_match is not None:
+                headers.append((b'if-none-match', if_none_match.encode('latin-1')))
+            scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode('latin-1'),
+                     'headers': headers}
+            sent = []
+            
+            async def send(message):
+                sent.append(message)
+            await api(scope, None, send)
+            return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+        
+        async def scenario():
+            status, headers, body = await get('/api/patients', 'limit=2')
+            assert status == 200 and [p['id'] for p in json.loads(body)] == [1, 2]
+            assert headers[b'x-next-cursor'] == b'2'
+            etag = headers[b'etag'].decode('latin-1')
+            for header in (etag, f'W/{etag}', f'"other", W/{etag}', '*'):
+                assert (await get('/api/patients', 'limit=2', header))[0] == 304
+            assert (await get('/api/patients', 'limit=2', '"other"'))[0] == 200
+            status, _, body = await get('/api/patients', 'ids=3,1,3')
+            assert [p['id'] for p in json.loads(body)] == [3, 1]
+            assert (await get('/api/patients', 'ids=1,x'))[0] == 400
+        
+        asyncio.run(scenario())
+        sync_repo.close()
+    
+    # Test 74: full-list reads and reads behind a running write never block the event loop
+    def test_async_reads_stay_off_the_loop_when_slow(self):
+        """Test that full lists go to the pool and a held write lock sends inline reads there too."""
+        sync_repo = ClinicRepository()
+        sync_repo.add_patient("Ahmed Ali", "30", "111")
+        pooled = []
+        
+        class CountingPool(ThreadPoolExecutor):
+            def submit(self, fn, *args, **kwargs):
+                pooled.append(fn)
+                return super().submit(fn, *args, **kwargs)
+        
+        repo = AsyncClinicRepository(sync_repo, executor=CountingPool(2))
+        writing, release = threading.Event(), threading.Event()
+        
+        def slow_write():
+            sync_repo._lock.acquire_write()
+            writing.set()
+            release.wait(5)  # The timeout only matters if the read blocked the loop
+            sync_repo._lock.release_write()
+        
+        async def scenario():
+            assert await repo.count_patients() == 1
+            assert await repo.version_tag() == sync_repo.version_tag
+            inline = len(pooled)
+            await repo.get_all_patients()
+            full_list = len(pooled) - inline
+            writer = threading.Thread(target=slow_write)
+            writer.start()
+            writing.wait()
+            read = asyncio.ensure_future(repo.count_patients())
+            await asyncio.sleep(0.05)  # The loop keeps running while the write holds the lock
+            blocked = not read.done()
+            release.set()
+            count = await read
+            writer.join()
+            return inline, full_list, blocked, count
+        
+        assert asyncio.run(scenario()) == (0, 1, True, 1)
+        repo.close()
+
+
+class TestScheduling:
+    """Tests for scheduled appointments, conflict detection and free slots."""
+    
+    @pytest.fixture
+    def repo(self, new_repo):
+        repo = new_repo()
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.add_patient("Sara Omar", "25", "222")
+        return repo
+    
+    # Test 38: overlapping bookings of one provider are rejected
+    def test_conflicts_are_per_provider(self, repo):
+        """Test overlap detection, back-to-back bookings and other providers."""
+        first = repo.add_appointment(1, "2025-12-25", "Checkup", "10:00", "30", "Dr. Hassan")
+        assert first['start_time'] == "10:00"
+        assert first['duration'] == 30
+        
+        with pytest.raises(SchedulingConflict) as error:
+            repo.add_appointment(2, "2025-12-25", "Overlap", "10:15", "30", "Dr. Hassan")
+        assert error.value.conflicting_id == first['id']
+        with pytest.raises(SchedulingConflict):
+            repo.add_appointment(2, "2025-12-25", "Covers", "09:00", "120", "Dr. Hassan")
+        
+        repo.add_appointment(2, "2025-12-25", "Back to back", "10:30", "30", "Dr. Hassan")
+        repo.add_appointment(2, "2025-12-25", "Before", "09:30", "30", "Dr. Hassan")
+        repo.add_appointment(2, "2025-12-25", "Other doctor", "10:00", "30", "Dr. Mona")
+        repo.add_appointment(2, "2025-12-26", "Other day", "10:00", "30", "Dr. Hassan")
+        repo.add_appointment(2, "2025-12-25", "Unscheduled")
+        
+        assert repo.count_appointments() == 6
+        assert repo.get_all_appointments()[-1]['start_time'] is None
+    
+    # Test 39: free slots follow bookings and cascade deletes
+    def test_free_slots(self, repo):
+        """Test that free_slots returns the gaps that fit and frees deleted bookings."""
+        repo.add_appointment(1, "2025-12-25", "Checkup", "09:30", "30", "Dr. Hassan")
+        repo.add_appointment(2, "2025-12-25", "Scan", "11:00", "90", "Dr. Hassan")
+        
+        assert repo.free_slots("Dr. Hassan", "2025-12-25", 60) == [
+            {'start': "10:00", 'end': "11:00"},
+            {'start': "12:30", 'end': "17:00"},
+        ]
+        assert repo.free_slots("Dr. Hassan", "2025-12-25", 30)[0] == {'start': "09:00", 'end': "09:30"}
+        
+        repo.delete_patient(2)
+        assert repo.free_slots("Dr. Hassan", "2025-12-25", 30) == [
+            {'start': "09:00", 'end': "09:30"},
+            {'start': "10:00", 'end': "17:00"},
+        ]
+        repo.add_appointment(1, "2025-12-25", "Rebooked", "11:00", "90", "Dr. Hassan")
+    
+    # Test 40: bulk bookings are checked against the store and each other
+    def test_bulk_add_checks_conflicts(self, repo):
+        """Test that bulk imports report overlapping bookings and write nothing."""
+        repo.add_appointment(1, "2025-12-25", "Checkup", "10:00", "30", "Dr. Hassan")
+        
+        with pytest.raises(ValidationError) as error:
+            repo.bulk_add_appointments([
+                {'patient_id': 2, 'date': "2025-12-25", 'description': "A", 'start_time': "10:10",
+                 'provider': "Dr. Hassan"},
+                {'patient_id': 2, 'date': "2025-12-25", 'description': "B", 'start_time': "11:00",
+                 'duration': 60, 'provider': "Dr. Hassan"},
+                {'patient_id': 2, 'date': "2025-12-25", 'description': "C", 'start_time': "11:30",
+                 'provider': "Dr. Hassan"},
+                {'patient_id': 2, 'date': "2025-12-25", 'description': "D", 'start_time': "25:00"},
+            ])
+        assert error.value.errors == [
+            (0, 'Overlaps appointment #1'),
+            (2, 'Overlaps record 1'),
+            (3, 'Start time must be in HH:MM format'),
+        ]
+        assert repo.count_appointments() == 1
+    
+    # Test 41: scheduled appointments survive journal replay
+    def test_journal_replays_schedule(self, tmp_path):
+        """Test that start time, duration and provider are journaled."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path)))
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.add_appointment(1, "2025-12-25", "Checkup", "10:00", "45", "Dr. Hassan")
+        repo.close()
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        
+        assert restored.get_all_appointments() == repo.get_all_appointments()
+        with pytest.raises(SchedulingConflict):
+            restored.add_appointment(1, "2025-12-25", "Overlap", "10:30", "30", "Dr. Hassan")
+        restored.close()
+
+
+class TestStats:
+    """Tests for the incrementally maintained dashboard statistics."""
+    
+    # Test 43: counters follow adds, updates and cascade deletes
+    def test_counters_follow_mutations(self, new_repo):
+        """Test that every statistic matches a recount after a mix of writes."""
+        repo = new_repo()
+        repo.add_patient("Existing", "91", "000")
+        repo.add_appointment(1, "2025-01-01", "Past")
+        stats = ClinicStats(repo, today=lambda: date(2025, 6, 1))
+        
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.bulk_add_patients([{'name': "Sara Omar", 'age': 35, 'phone': "222"}])
+        repo.add_appointment(2, "2025-06-01", "Today")
+        repo.add_appointment(3, "2025-06-10", "Later")
+        repo.add_appointment(3, "2025-06-10", "Later again")
+        repo.update_patient(2, "Ahmed Ali", "41", "111")
+        repo.delete_patient(3)
+        
+        snapshot = stats.snapshot()
+        assert snapshot['patients'] == 2
+        assert snapshot['appointments'] == 2
+        assert snapshot['appointments_today'] == 1
+        assert snapshot['upcoming_appointments'] == 1
+        assert snapshot['appointments_per_day'] == {"2025-01-01": 1, "2025-06-01": 1}
+        assert snapshot['age_distribution'] == {"40-49": 1, "90+": 1}
+        assert sum(snapshot['new_patients_per_week'].values()) == 2
+    
+    # Test 44: day rollover and writes the repository did not announce
+    def test_rollover_and_resync(self, new_repo):
+        """Test that upcoming counts move with the date and unseen writes trigger a rebuild."""
+        repo = new_repo()
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.add_appointment(1, "2025-06-01", "Checkup")
+        repo.add_appointment(1, "2025-06-02", "Follow-up")
+        today = [date(2025, 6, 1)]
+        stats = ClinicStats(repo, today=lambda: today[0])
+        assert stats.snapshot()['upcoming_appointments'] == 2
+        
+        today[0] = date(2025, 6, 2)
+        assert stats.snapshot()['upcoming_appointments'] == 1
+        
+        # As if another process wrote to a shared database
+        repo._storage.insert_patient(Patient(None, "Elsewhere", 50, "999"))
+        assert stats.snapshot()['patients'] == 2
+    
+    # Test 75: reads during local writes never rebuild, and concurrent syncs rebuild once
+    def test_sync_ignores_writes_in_progress(self, new_repo, monkeypatch):
+        """Test that readers racing a writer neither rebuild the counters nor fail."""
+        repo = new_repo()
+        stats = ClinicStats(repo)
+        resets = []
+        reset = stats.reset
+        monkeypatch.setattr(stats, 'reset', lambda: (resets.append(1), reset()))
+        errors = []
+        done = threading.Event()
+        
+        def read():
+            try:
+                while not done.is_set():
+                    stats.snapshot()
+            except Exception as error:  # Surface failures from reader threads
+                errors.append(error)
+        
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            readers = [threading.Thread(target=read) for _ in range(4)]
+            for thread in readers:
+                thread.start()
+            for i in range(200):
+                repo.add_patient(f"Patient {i}", "30", "111")
+            done.set()
+            for thread in readers:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        
+        assert errors == [] and resets == []
+        assert stats.snapshot()['patients'] == 200
+        
+        # As if another process wrote: every racing reader sees it, and it is applied
+        # once, from SQLite's change log, or by one rebuild without one
+        repo._storage.insert_patient(Patient(None, "Elsewhere", 50, "999"))
+        readers = [threading.Thread(target=stats.snapshot) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        assert len(resets) == (0 if repo._storage.logs_changes else 1)
+        assert stats.snapshot()['patients'] == 201
+    
+    # Test 85: another process's writes are applied from the change log, in order with local ones
+    def test_follows_writes_from_elsewhere(self, tmp_path, monkeypatch):
+        """Test two repositories on one database file, and a rebuild once the log is pruned."""
+        path = str(tmp_path / 'clinic.db')
+        storages = [SQLiteStorage(path), SQLiteStorage(path)]
+        here, elsewhere = (ClinicRepository(storage) for storage in storages)
+        stats, search = ClinicStats(here), TextSearch(here)
+        resets = []
+        reset = stats.reset
+        monkeypatch.setattr(stats, 'reset', lambda: (resets.append(1), reset()))
+        
+        elsewhere.add_patient("Sara Omar", "25", "222", notes="asthma")
+        here.add_patient("Ahmed Ali", "30", "111")  # Its event follows a write made elsewhere
+        assert stats.snapshot()['patients'] == 2
+        elsewhere.add_appointment(1, "2025-06-01", "Checkup")
+        elsewhere.update_patient(1, "Sara Omar", "61", "222")
+        elsewhere.delete_patient(2)
+        snapshot = stats.snapshot()
+        assert (snapshot['patients'], snapshot['appointments']) == (1, 1)
+        assert snapshot['age_distribution'] == {"60-69": 1}
+        assert [pid for pid, _ in search.search_patients("asthma")] == [1]
+        assert resets == []
+        
+        storages[1].max_changes = 0  # Keeps only the latest write
+        elsewhere.add_patient("Yusuf Gadafi", "40", "333")
+        elsewhere.add_patient("Aicha Ben Ali", "50", "444")
+        assert stats.snapshot()['patients'] == 3 and resets == [1]
+        for storage in storages:
+            storage.close()
+
+
+class TestMetrics:
+    """Tests for the Prometheus metrics registry and repository instrumentation."""
+    
+    # Test 45: repository calls are counted and rendered as histograms
+    def test_repository_calls_are_timed(self, new_repo):
+        """Test per-method call counts and the cumulative bucket format."""
+        repo = new_repo()
+        registry = Registry()
+        histogram = instrument_repository(repo, registry)
+        
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.find_patient(1)
+        repo.find_patient(2)
+        repo.delete_patient(1)
+        
+        assert histogram.count(('find_patient',)) == 2
+        assert histogram.count(('delete_patients',)) == 1  # Called through delete_patient
+        text = registry.render()
+        assert '# TYPE clinic_repository_call_duration_seconds histogram' in text
+        assert 'clinic_repository_call_duration_seconds_bucket{method="find_patient",le="+Inf"} 2' in text
+        assert 'clinic_repository_call_duration_seconds_count{method="add_patient"} 1' in text
+    
+    # Test 90: instrumenting a repository again does not time its calls twice
+    def test_instrument_twice(self, new_repo):
+        """Test that a second instrument_repository call leaves the wrappers as they are."""
+        repo = new_repo()
+        registry = Registry()
+        histogram = instrument_repository(repo, registry)
+        wrapped = repo.find_patient
+        assert instrument_repository(repo, registry) is histogram
+        
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.find_patient(1)
+        
+        assert repo.find_patient is wrapped
+        assert histogram.count(('find_patient',)) == 1
+    
+    # Test 46: histogram buckets are cumulative and label values are escaped
+    def test_histogram_exposition(self):
+        """Test bucket placement, sums and label escaping."""
+        histogram = Histogram('h', 'Help.', ('path',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, ('a"b',))
+        
+        assert histogram.render()[2:] == [
+            'h_bucket{path="a\\"b",le="0.1"} 1',
+            'h_bucket{path="a\\"b",le="1.0"} 2',
+            'h_bucket{path="a\\"b",le="+Inf"} 3',
+            'h_sum{path="a\\"b"} 5.55',
+            'h_count{path="a\\"b"} 3',
+        ]
+    
+    # Test 47: only requests over the threshold keep their profile
+    def test_slow_request_profiler(self, tmp_path):
+        """Test that the profiler saves slow requests only."""
+        profiler = SlowRequestProfiler(threshold_ms=50, directory=str(tmp_path))
+        profiler.start()
+        assert profiler.stop(0.01, 'GET /fast') is None
+        profiler.start()
+        path = profiler.stop(0.2, 'GET /slow')
+        
+        assert os.listdir(tmp_path) == [os.path.basename(path)]
+        assert path.endswith('-200ms-GET_slow.prof')
+
+
+class TestFullTextSearch:
+    """Tests for the BM25 index over patient notes and appointment descriptions."""
+    
+    # Test 48: terms are case- and accent-folded, stemmed and stripped of stop words
+    def test_tokenize(self):
+        """Test that variants of a word share one index term."""
+        assert tokenize("Diabetic, DIABETES and the Café") == ['diabet', 'diabet', 'cafe']
+        assert tokenize("Follow-up checkups") == ['follow', 'up', 'checkup']
+    
+    # Test 49: notes and descriptions both contribute to an appointment's rank
+    def test_appointments_ranked_by_notes_and_description(self, new_repo):
+        """Test that matching both fields ranks above matching one."""
+        repo = new_repo()
+        repo.add_patient("Ahmed Ali", "30", "111", notes="Type 2 diabetes")
+        repo.add_patient("Sara Khaled", "25", "222")
+        repo.add_appointment(1, "2025-12-25", "Follow-up")
+        repo.add_appointment(2, "2025-12-26", "Follow-up")
+        repo.add_appointment(2, "2025-12-27", "Eye exam")
+        search = TextSearch(repo)
+        
+        ranked = [aid for aid, _ in search.search_appointments("diabetic follow-up")]
+        
+        assert ranked == [1, 2]
+        assert [pid for pid, _ in search.search_patients("Diabetic")] == [1]
+        assert search.search_appointments("the") == []
+    
+    # Test 50: writes after construction are indexed incrementally
+    def test_index_follows_writes(self, new_repo):
+        """Test adds, notes edits and cascade deletes."""
+        repo = new_repo()
+        search = TextSearch(repo)
+        repo.add_patient("Ahmed Ali", "30", "111", notes="Asthma")
+        repo.add_appointment(1, "2025-12-25", "Inhaler review")
+        
+        assert [aid for aid, _ in search.search_appointments("asthma")] == [1]
+        
+        repo.update_patient(1, "Ahmed Ali", "30", "111", notes="Hypertension")
+        assert search.search_appointments("asthma") == []
+        assert [pid for pid, _ in search.search_patients("hypertension")] == [1]
+        
+        repo.delete_patient(1)
+        assert search.search_appointments("inhaler") == []
+        assert search.search_patients("hypertension") == []
+    
+    # Test 51: edited notes survive journal replay
+    def test_notes_update_is_journaled(self, tmp_path):
+        """Test that a recovered repository indexes the edited notes."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path)))
+        repo.add_patient("Ahmed Ali", "30", "111", notes="Asthma")
+        repo.update_patient(1, "Ahmed Ali", "31", "111", notes="Diabetes")
+        repo.close()
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        
+        assert restored.find_patient(1)['notes'] == "Diabetes"
+        assert [pid for pid, _ in TextSearch(restored).search_patients("diabetic")] == [1]
+        restored.close()
+
+
+class TestFuzzyLookup:
+    """Tests for typo-tolerant patient lookup by name and phone."""
+    
+    # Test 52: transliteration variants share a phonetic key; phone formats share a key
+    def test_keys(self):
+        """Test the phonetic and phone normalizations."""
+        assert phonetic_key("ahmed") == phonetic_key("ahmad")
+        assert phonetic_key("mohamed") == phonetic_key("muhammad")
+        assert phonetic_key("gaddafi") == phonetic_key("qadhafi")
+        assert phonetic_key("youssef") == phonetic_key("yusuf")
+        assert phonetic_key("omar") != phonetic_key("amira")
+        assert phone_key("091-2345678") == phone_key("+218 91 234 5678") == phone_key("00218912345678")
+        assert phone_key("123") is None
+    
+    # Test 53: misspelled names find the patient, exact matches rank first
+    def test_name_lookup(self, new_repo):
+        """Test ranking of exact, misspelled and unrelated names."""
+        repo = new_repo()
+        repo.add_patient("Ahmed Ali", "30", "091-1111111")
+        repo.add_patient("Mohamed Ahmed Ali", "45", "092-2222222")
+        repo.add_patient("Sara Khaled", "25", "093-3333333")
+        matcher = PatientMatcher(repo)
+        
+        ranked = matcher.search("Ahmad Ali")
+        
+        assert [pid for pid, _ in ranked] == [1, 2]
+        assert ranked[0][1] > ranked[1][1]
+        assert matcher.search("Ahmed Ali")[0] == (1, 1.0)
+        assert matcher.search("Zaynab") == []
+    
+    # Test 54: phone lookup ignores formatting and follows updates and deletes
+    def test_phone_lookup_follows_writes(self, new_repo):
+        """Test phone matching, combined criteria and index maintenance."""
+        repo = new_repo()
+        matcher = PatientMatcher(repo)
+        repo.add_patient("Ahmed Ali", "30", "091-1111111")
+        repo.add_patient("Sara Khaled", "25", "091-1111111")
+        
+        assert [pid for pid, _ in matcher.search(phone="+218 91 111 1111")] == [1, 2]
+        assert matcher.search("Sarah", phone="00218911111111")[0][0] == 2
+        
+        repo.update_patient(1, "Ahmed Ali", "30", "094-4444444")
+        repo.delete_patient(2)
+        assert matcher.search(phone="0911111111") == []
+        assert matcher.search(phone="0944444444") == [(1, 1.0)]
+
+
+class TestSharding:
+    """Tests for per-clinic shards behind ShardedRepository."""
+    
+    @pytest.fixture
+    def sharded(self, tmp_path):
+        repo = ShardedRepository.open(['tripoli', 'benghazi', 'misrata'], directory=str(tmp_path))
+        yield repo
+        repo.close()
+    
+    # Test 57: strided ids never collide and continue after stored ones
+    def test_strided_ids(self):
+        """Test allocation per shard offset."""
+        first, second = StridedIds(0, 4), StridedIds(3, 4)
+        second.seed('patients', 7)
+        
+        assert list(first.allocate('patients', 3)) == [4, 8, 12]
+        assert list(second.allocate('patients', 2)) == [11, 15]
+    
+    # Test 58: records are routed to their clinic by id
+    def test_routing_by_clinic_and_id(self, sharded):
+        """Test globally unique ids, id routing and cascade deletes across shards."""
+        ahmed = sharded.add_patient('tripoli', "Ahmed Ali", "30", "111")
+        sara = sharded.add_patient('benghazi', "Sara Omar", "25", "222")
+        ali = sharded.add_patient('tripoli', "Ali Omar", "40", "333")
+        appointment = sharded.add_appointment(sara['id'], "2025-12-25", "Checkup")
+        
+        assert len({ahmed['id'], sara['id'], ali['id']}) == 3
+        assert sharded.clinic_of(sara['id']) == sharded.clinic_of(appointment['id']) == 'benghazi'
+        assert sharded.shard('tripoli').count_patients() == 2
+        assert sharded.update_patient(sara['id'], "Sara Omar", "26", "222")['age'] == "26"
+        assert [p['name'] for p in sharded.get_patients_by_ids([ali['id'], sara['id'], 999])] == [
+            "Ali Omar", "Sara Omar"]
+        assert [a['id'] for p in sharded.get_patients_with_appointments([ali['id'], sara['id']])
+                for a in p['appointments']] == [appointment['id']]
+        
+        sharded.delete_patient(sara['id'])
+        assert sharded.find_patient(sara['id']) is None
+        assert sharded.count_appointments() == 0
+    
+    # Test 59: searches and pages span every clinic in id order
+    def test_scatter_gather_reads(self, sharded):
+        """Test merged search results and keyset pages across shards."""
+        for i, clinic_id in enumerate(sharded.clinic_ids * 2):
+            patient = sharded.add_patient(clinic_id, f"Omar {i}", "30", f"09{i}")
+            sharded.add_appointment(patient['id'], "2025-12-25", "Checkup")
+        
+        results = sharded.search_appointments(query="omar", date="2025-12-25")
+        assert len(results) == 6
+        assert [a['id'] for a in results] == sorted(a['id'] for a in results)
+        
+        seen, cursor = [], None
+        while True:
+            page, cursor = sharded.get_patients_page(4, cursor)
+            seen.extend(p['id'] for p in page)
+            if cursor is None:
+                break
+        assert seen == sorted(seen) and len(seen) == sharded.count_patients() == 6
+    
+    # Test 60: a shard in a worker process behaves like a local one
+    def test_process_shard(self, tmp_path):
+        """Test calls, results and exceptions through a worker process."""
+        shard = ProcessShard(open_shard, 1, 4, str(tmp_path / 'clinic.db'))
+        try:
+            assert shard.add_patient("Ahmed Ali", "30", "111")['id'] == 1
+            assert shard.add_patient("Sara Omar", "25", "222")['id'] == 5
+            with pytest.raises(ValidationError) as error:
+                shard.bulk_add_patients([{'name': '', 'age': '30', 'phone': '111'}])
+            assert error.value.errors[0][0] == 0
+        finally:
+            shard.close()
+    
+    # Test 87: shard workers never open the application's own store
+    def test_process_shard_leaves_default_store(self, tmp_path, monkeypatch):
+        """Test that a worker importing repository does not open or seed CLINIC_JOURNAL_DIR."""
+        monkeypatch.delenv('CLINIC_DB', raising=False)
+        monkeypatch.setenv('CLINIC_JOURNAL_DIR', str(tmp_path / 'journal'))
+        shard = ProcessShard(open_shard, 1)
+        try:
+            assert shard.count_patients() == 0
+        finally:
+            shard.close()
+        assert not (tmp_path / 'journal').exists()
+
+
+class TestChangeFeed:
+    """Tests for the sequence-numbered change log."""
+    
+    # Test 63: adds, updates and cascade deletes arrive in order, in pages
+    def test_changes_since(self, new_repo):
+        """Test the logged changes and paging through them."""
+        repo = new_repo()
+        start = repo.get_changes(None)
+        assert start['resync'] and start['changes'] == []
+        since = start['last_seq']
+        
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.add_appointment(1, "2025-12-25", "Checkup")
+        repo.update_patient(1, "Ahmed Ali", "31", "111")
+        repo.delete_patient(1)
+        
+        first = repo.get_changes(since, limit=2)
+        assert first['more'] and not first['resync']
+        rest = repo.get_changes(first['last_seq'])
+        changes = first['changes'] + rest['changes']
+        assert [(c['op'], c['type'], c['id']) for c in changes] == [
+            ('upsert', 'patient', 1), ('upsert', 'appointment', 1), ('upsert', 'patient', 1),
+            ('delete', 'appointment', 1), ('delete', 'patient', 1)]
+        assert [c['seq'] for c in changes] == list(range(since + 1, since + 6))
+        assert changes[2]['record']['age'] == "31" and 'record' not in changes[3]
+        assert not rest['more'] and repo.get_changes(rest['last_seq'])['changes'] == []
+    
+    # Test 64: stale positions resync, and long polls wake up on writes
+    def test_resync_and_long_poll(self):
+        """Test trimmed, future and unannounced-write positions, and a waiting reader."""
+        log = ChangeLog(max_changes=2, first_seq=100)
+        for i in range(1, 4):
+            log.handle('patient_added', Patient(i, f"Patient {i}", 30, "111"))
+        assert log.since(100)['resync']
+        assert [c['id'] for c in log.since(101)['changes']] == [2, 3]
+        assert log.since(104)['resync']  # e.g. a position from before a restart
+        
+        generation = [1]
+        log = ChangeLog(lambda: generation[0], first_seq=0)
+        log.handle('patient_added', Patient(1, "Ahmed Ali", 30, "111"))
+        generation[0] = 5  # As if another process wrote to a shared database
+        assert log.since(1)['resync'] and log.last_seq == 2
+        
+        writer = threading.Timer(0.05, log.handle, ('patient_added', Patient(2, "Sara Omar", 25, "222")))
+        writer.start()
+        polled = log.since(2, timeout=5)
+        writer.join()
+        assert [c['id'] for c in polled['changes']] == [2]
+        assert log.since(3, timeout=0.01)['changes'] == []
+    
+    # Test 76: processes sharing a database serve one feed
+    def test_shared_database_feed(self, tmp_path):
+        """Test that another repository on the same file sees, pages and waits for the same changes."""
+        path = str(tmp_path / 'clinic.db')
+        storages = [SQLiteStorage(path, max_changes=2), SQLiteStorage(path, max_changes=2)]
+        writer, reader = (ClinicRepository(storage) for storage in storages)
+        since = reader.get_changes(None)['last_seq']
+        assert writer.get_changes(None)['last_seq'] == since
+        
+        writer.add_patient("Ahmed Ali", "30", "111")
+        writer.add_appointment(1, "2025-12-25", "Checkup")
+        changes = reader.get_changes(since)['changes']
+        assert changes == writer.get_changes(since)['changes']
+        assert [(c['seq'], c['type'], c['record']['id']) for c in changes] == [
+            (since + 1, 'patient', 1), (since + 2, 'appointment', 1)]
+        
+        poller = ThreadPoolExecutor(1)
+        polled = poller.submit(reader.get_changes, since + 2, timeout=5)
+        writer.delete_patient(1)
+        assert [(c['op'], c['type']) for c in polled.result()['changes']] == [
+            ('delete', 'appointment'), ('delete', 'patient')]
+        poller.shutdown()
+        assert reader.get_changes(since)['resync']  # Whole writes beyond the last 2 changes are pruned
+        assert not reader.get_changes(since + 1)['resync']
+        for storage in storages:
+            storage.close()
+    
+    # Test 86: a poll landing inside a write does not send clients to resync
+    def test_poll_during_write(self, monkeypatch):
+        """Test reading the in-memory feed between a storage change and its event."""
+        repo = ClinicRepository()
+        since = repo.get_changes(None)['last_seq']
+        insert, polls = repo._storage.insert_patient, []
+        
+        def insert_and_poll(patient):
+            insert(patient)
+            polls.append(repo.get_changes(since))  # Takes no lock, like a long poll in another thread
+            return patient
+        
+        monkeypatch.setattr(repo._storage, 'insert_patient', insert_and_poll)
+        repo.add_patient("Ahmed Ali", "30", "111")
+        assert polls[0] == {'changes': [], 'last_seq': since, 'more': False, 'resync': False}
+        assert [c['id'] for c in repo.get_changes(since)['changes']] == [1]
+
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason='NumPy is not installed')
+class TestReports:
+    """Tests for the columnar group-by reports."""
+    
+    # Test 61: appointment groupings follow adds, updates and cascade deletes
+    def test_appointment_reports(self, new_repo):
+        """Test counts and booked minutes per period, provider and age."""
+        repo = new_repo()
+        repo.add_patient("Ahmed Ali", "34", "111")
+        repo.add_appointment(1, "2024-12-30", "Checkup", "09:00", 30, "Dr. Salem")
+        reports = ClinicReports(repo)
+        repo.add_patient("Sara Omar", "71", "222")
+        repo.add_patient("Ali Omar", "95", "333")
+        repo.add_appointment(2, "2025-01-05", "Follow-up", "10:00", 45, "Dr. Huda")
+        repo.add_appointment(2, "2025-01-06", "Blood test")
+        repo.add_appointment(3, "someday", "Unknown date")
+        
+        by_month = reports.run('appointments', 'month')
+        assert by_month['total'] == 3
+        assert by_month['groups'] == [{'key': '2024-12', 'count': 1, 'minutes': 30},
+                                      {'key': '2025-01', 'count': 2, 'minutes': 45}]
+        weeks = reports.run('appointments', 'week')['groups']
+        assert [g['key'] for g in weeks] == ['2025-W01', '2025-W02']
+        assert [g['count'] for g in weeks] == [2, 1]
+        assert reports.run('appointments', 'weekday', date_from='2025-01-01')['groups'] == [
+            {'key': 'Monday', 'count': 1, 'minutes': 0}, {'key': 'Sunday', 'count': 1, 'minutes': 45}]
+        assert [g['key'] for g in reports.run('appointments', 'provider')['groups']] == ['', 'Dr. Huda', 'Dr. Salem']
+        
+        repo.update_patient(2, "Sara Omar", "69", "222")
+        repo.delete_patient(3)
+        ages = reports.run('appointments', 'age')
+        assert ages['total'] == 3
+        assert ages['groups'] == [{'key': '30-39', 'count': 1, 'minutes': 30},
+                                  {'key': '60-69', 'count': 2, 'minutes': 45}]
+    
+    # Test 62: patient reports, compaction and invalid requests
+    def test_patient_reports(self, new_repo):
+        """Test age histograms and registration dates across many deletes."""
+        repo = new_repo()
+        repo.bulk_add_patients([{'name': f"Patient {i}", 'age': i, 'phone': "111"} for i in range(100)])
+        reports = ClinicReports(repo)
+        repo.delete_patients(range(1, 61))
+        repo.add_patient("Late Arrival", "5", "222")
+        
+        histogram = reports.run('patients', 'age')
+        assert histogram['total'] == 41
+        assert [(g['key'], g['count']) for g in histogram['groups']] == [
+            ('0-9', 1), ('60-69', 10), ('70-79', 10), ('80-89', 10), ('90+', 10)]
+        assert reports.run('patients', 'year')['groups'] == [{'key': str(date.today().year), 'count': 41}]
+        with pytest.raises(ValueError):
+            reports.run('patients', 'provider')
+        with pytest.raises(ValueError):
+            reports.run('appointments', date_from='yesterday')
+
+
+class TestAssets:
+    """Tests for the static asset pipeline and response compression."""
+    
+    # Test 66: minified, fingerprinted and precompressed builds
+    def test_build_assets(self, tmp_path):
+        """Test the minifiers and content-hashed output with gzip copies."""
+        assert minify_css("/* Nav */\n.nav a ,\n.nav b  {\n    font-family: 'Segoe  UI';\n}\n") == \
+            ".nav a,.nav b{font-family:'Segoe  UI';}"
+        assert minify_js("/** Doc */\nfunction f() {\n    // Note\n    return '// kept';\n}\n") == \
+            "function f() {\nreturn '// kept';\n}"
+        
+        static = tmp_path / 'static'
+        (static / 'css').mkdir(parents=True)
+        (static / 'css' / 'site.css').write_text("body {\n    color: red;\n}\n")
+        (static / 'logo.txt').write_text("not an asset")
+        manifest = build_assets(str(static), str(tmp_path / 'build'))
+        
+        built = manifest['css/site.css']
+        assert list(manifest) == ['css/site.css'] and built.startswith('css/site.') and built.endswith('.css')
+        assert (tmp_path / 'build' / built).read_text() == "body{color:red;}"
+        assert gzip.decompress((tmp_path / 'build' / f'{built}.gz').read_bytes()) == b"body{color:red;}"
+        (static / 'css' / 'site.css').write_text("body { color: blue; }")
+        assert build_assets(str(static), str(tmp_path / 'build'))['css/site.css'] != built
+    
+    # Test 67: HTML and JSON bodies are compressed only when accepted and worthwhile
+    def test_compress_responses(self):
+        """Test negotiation, the size threshold and skipped responses."""
+        app = Flask(__name__)
+        compress_responses(app, min_size=100)
+        app.add_url_rule('/big', 'big', lambda: jsonify(['row'] * 100))
+        app.add_url_rule('/small', 'small', lambda: jsonify(['row']))
+        app.add_url_rule('/text', 'text', lambda: ('x' * 1000, 200, {'Content-Type': 'text/plain'}))
+        app.add_url_rule('/missing', 'missing', lambda: (jsonify(['row'] * 100), 404))
+        client = app.test_client()
+        
+        response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip' and 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == client.get('/big').data
+        assert 'Content-Encoding' not in client.get('/big').headers
+        for url in ('/small', '/text', '/missing'):
+            assert 'Content-Encoding' not in client.get(url, headers={'Accept-Encoding': 'gzip'}).headers
+
+
+class TestSQLiteStorage:
+    """Tests specific to the durable SQLite backend."""
+    
+    # Test 23: data survives reopening the database
+    def test_data_persists_across_instances(self, tmp_path):
+        """Test that a second repository on the same file sees earlier writes."""
+        path = str(tmp_path / 'clinic.db')
+        writer_storage = SQLiteStorage(path)
+        writer = ClinicRepository(writer_storage)
+        writer.add_patient("Durable Patient", "40", "111")
+        writer.add_appointment(1, "2025-12-25", "Checkup")
+        
+        reader_storage = SQLiteStorage(path)
+        reader = ClinicRepository(reader_storage)
+        
+        assert reader.find_patient(1)['name'] == "Durable Patient"
+        assert reader.search_appointments(query="durable")[0]['description'] == "Checkup"
+        assert reader.add_patient("Second", "20", "222")['id'] == 2
+        writer_storage.close()
+        reader_storage.close()
+    
+    # Test 42: databases created before scheduling are migrated
+    def test_schedule_columns_are_migrated(self, tmp_path):
+        """Test that an old appointments table gains the scheduling columns."""
+        import sqlite3
+        path = str(tmp_path / 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE appointments (id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                     ' patient_id INTEGER NOT NULL, date TEXT NOT NULL, description TEXT NOT NULL)')
+        conn.execute("INSERT INTO appointments VALUES (1, 1, '2025-12-25', 'Old')")
+        conn.commit()
+        conn.close()
+        
+        storage = SQLiteStorage(path)
+        repo = ClinicRepository(storage)
+        
+        assert repo.get_all_appointments()[0]['provider'] == ""
+        patient = repo.add_patient("Ahmed Ali", "30", "111")
+        repo.add_appointment(patient['id'], "2025-12-25", "New", "10:00", "30", "Dr. Hassan")
+        assert repo.free_slots("Dr. Hassan", "2025-12-25", 30)[0] == {'start': "09:00", 'end': "10:00"}
+        storage.close()
+    
+    # Test 68: of several workers opening a new database, exactly one seeds it
+    def test_only_one_worker_claims_the_seed(self, tmp_path):
+        """Test that claim_seed succeeds once per database, and never on one with data."""
+        path = str(tmp_path / 'clinic.db')
+        storages = [SQLiteStorage(path) for _ in range(4)]
+        claims = []
+        threads = [threading.Thread(target=lambda s=s: claims.append(ClinicRepository(s).claim_seed()))
+                   for s in storages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert sorted(claims) == [False, False, False, True]
+        storages.append(SQLiteStorage(str(tmp_path / 'used.db')))
+        used = ClinicRepository(storages[-1])
+        used.add_patient("Existing", "40", "111")
+        assert not used.claim_seed()
+        memory = ClinicRepository()
+        assert memory.claim_seed()
+        memory.add_patient("Existing", "40", "111")
+        assert not memory.claim_seed()
+        for storage in storages:
+            storage.close()
+
+
+class TestJournal:
+    """Tests for the write-ahead journal of the in-memory repository."""
+    
+    def _populate(self, repo):
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.add_patient("Sara Omar", "25", "222")
+        repo.add_patient("Gone Patient", "50", "333")
+        repo.add_appointment(1, "2025-12-25", "Checkup")
+        repo.add_appointment(3, "2025-12-26", "Removed")
+        repo.update_patient(2, "Sara Khaled", "26", "222")
+        repo.delete_patient(3)
+    
+    # Test 24: replay restores every mutation
+    def test_replay_restores_state(self, tmp_path):
+        """Test that a new repository on the same journal sees the same data."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path)))
+        self._populate(repo)
+        repo.close()
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        
+        assert restored.get_all_patients() == repo.get_all_patients()
+        assert restored.get_all_appointments() == repo.get_all_appointments()
+        assert restored.search_appointments(query="ahmed")[0]['description'] == "Checkup"
+        assert restored.add_patient("Next", "40", "444")['id'] == 4
+        restored.close()
+    
+    # Test 25: snapshots compact the log
+    def test_snapshot_compacts_log(self, tmp_path):
+        """Test that snapshotting removes covered segments and replay still works."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path), snapshot_every=4))
+        self._populate(repo)
+        repo.add_appointment(1, "2025-12-27", "After snapshot")
+        repo.close()
+        
+        segments = [f for f in os.listdir(tmp_path) if f.startswith('journal-')]
+        assert len(segments) == 1
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        assert restored.get_all_appointments() == repo.get_all_appointments()
+        assert restored.find_patient(2)['name'] == "Sara Khaled"
+        restored.close()
+    
+    # Test 89: a journaled store seeds once, even after all its patients are deleted
+    @pytest.mark.parametrize('snapshot_every', [1_000_000, 2])
+    def test_seed_claim_survives_replay(self, tmp_path, snapshot_every):
+        """Test that the seed claim is journaled (and kept by snapshots)."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path), snapshot_every=snapshot_every))
+        assert repo.claim_seed()
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.add_patient("Sara Omar", "25", "222")
+        repo.delete_patients([1, 2])
+        repo.close()
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        assert restored.count_patients() == 0
+        assert not restored.claim_seed()
+        restored.close()
+    
+    # Test 56: patient versions survive snapshots
+    def test_snapshot_keeps_versions(self, tmp_path):
+        """Test that a snapshot records versions the compacted updates produced."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path), snapshot_every=3))
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.update_patient(1, "Ahmed Ali", "31", "111")
+        repo.update_patient(1, "Ahmed Ali", "32", "111")
+        repo.add_patient("Sara Khaled", "25", "222")
+        repo.close()
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        
+        assert [p['version'] for p in restored.get_all_patients()] == [3, 1]
+        restored.close()
+    
+    # Test 69: updates made while a background snapshot is written are replayed once
+    def test_background_snapshot_is_not_affected_by_later_updates(self, tmp_path):
+        """Test that the snapshot keeps the captured values, not the live (updated in place) patients."""
+        journal = Journal(str(tmp_path))
+        repo = ClinicRepository(journal=journal)
+        repo.add_patient("Ahmed Ali", "30", "111")
+        captured = threading.Event()
+        write_snapshot = journal._write_snapshot
+        
+        def delayed_write(*args):
+            captured.wait()
+            write_snapshot(*args)
+        
+        journal._write_snapshot = delayed_write
+        journal.snapshot(repo._storage, background=True)
+        repo.update_patient(1, "Ahmed Ali", "31", "111")
+        captured.set()
+        repo.close()
+        
+        frozen = gc.get_freeze_count()
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        
+        assert gc.get_freeze_count() == frozen  # Freezing the GC is opt-in (freeze_gc=True)
+        assert restored.find_patient(1)['version'] == 2
+        assert restored.find_patient(1)['age'] == "31"
+        restored.close()
+    
+    # Test 26: a torn final record is ignored
+    def test_replay_ignores_torn_tail(self, tmp_path):
+        """Test that a partially written last line does not break recovery."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path)))
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.close()
+        segment = [f for f in os.listdir(tmp_path) if f.startswith('journal-')][0]
+        with open(tmp_path / segment, 'a', encoding='utf-8') as f:
+            f.write('["P",2,"Half')
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        
+        assert [p['name'] for p in restored.get_all_patients()] == ["Ahmed Ali"]
+        restored.close()
+    
+    # Test 73: appointments logged after their patient's delete are dropped on replay
+    def test_replay_skips_orphaned_appointments(self, tmp_path):
+        """Test that a journal holding an orphaned appointment still recovers."""
+        repo = ClinicRepository(journal=Journal(str(tmp_path)))
+        repo.add_patient("Ahmed Ali", "30", "111")
+        repo.close()
+        segment = [f for f in os.listdir(tmp_path) if f.startswith('journal-')][0]
+        with open(tmp_path / segment, 'a', encoding='utf-8') as f:
+            f.write('["D",[1]]\n["A",1,1,"2025-12-25","Orphan"]\n')
+        
+        restored = ClinicRepository(journal=Journal(str(tmp_path)))
+        
+        assert restored.count_patients() == 0
+        assert restored.count_appointments() == 0
+        restored.close()
+
+
+class TestRoutes:
+    """Tests for app.py's routes, through the Flask test client."""
+    
+    # Test 77: cached pages revalidate by ETag, and pages with flash messages bypass the cache
+    def test_cached_view(self, client):
+        """Test 304 responses, a new ETag after a write and the flash bypass."""
+        page = client.get('/patients')
+        etag = page.headers['ETag']
+        assert page.status_code == 200 and page.headers['Cache-Control'] == 'no-cache'
+        assert client.get('/patients', headers={'If-None-Match': etag}).status_code == 304
+        
+        added = client.post('/patients/add', data={'name': "Ahmed Ali", 'age': "30", 'phone': "0911234567"})
+        assert added.status_code == 302
+        flashed = client.get('/patients')
+        assert b'Patient added successfully!' in flashed.data and 'ETag' not in flashed.headers
+        page = client.get('/patients')
+        assert b'Patient added successfully!' not in page.data and b'Ahmed Ali' in page.data
+        assert page.headers['ETag'] != etag
+        assert client.get('/patients', headers={'If-None-Match': etag}).status_code == 200
+    
+    # Test 92: the dashboard's cached page and ETag expire when the date changes
+    def test_dashboard_expires_at_midnight(self, client, monkeypatch):
+        """Test that a new day re-renders the dashboard's appointments-today count."""
+        today = date(2025, 12, 25)
+        monkeypatch.setattr(clinic_app.stats, '_today', lambda: today)
+        patient = clinic_app.clinic.add_patient("Ahmed Ali", "30", "111")
+        clinic_app.clinic.add_appointment(patient['id'], "2025-12-26", "Checkup")
+        today_card = '<div class="stat-value">{}</div> <div class="stat-label">Today</div>'.format
+        page = client.get('/')
+        etag = page.headers['ETag']
+        assert today_card(0) in ' '.join(page.get_data(as_text=True).split())
+        assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+        
+        today = date(2025, 12, 26)
+        page = client.get('/', headers={'If-None-Match': etag})
+        assert page.status_code == 200 and page.headers['ETag'] != etag
+        assert today_card(1) in ' '.join(page.get_data(as_text=True).split())
+    
+    # Test 78: bulk import reports what it imported, also when it stops early
+    def test_import(self, client, monkeypatch):
+        """Test NDJSON and CSV imports, rejected records and a partial import."""
+        body = '\n'.join('{"name": "Patient %d", "age": 30, "phone": "111"}' % i for i in range(3))
+        response = client.post('/api/import?type=patients', data=body)
+        assert response.status_code == 201 and response.get_json() == {'imported': 3, 'type': 'patients'}
+        response = client.post('/api/import?type=appointments', content_type='text/csv',
+                               data='patient_id,date,description\n1,2025-12-25,Checkup\n')
+        assert response.get_json() == {'imported': 1, 'type': 'appointments'}
+        assert client.post('/api/import?type=doctors', data=body).status_code == 400
+        
+        monkeypatch.setattr(clinic_app, 'import_records', lambda repo, kind, records: import_records(
+            repo, kind, records, batch_size=2))
+        response = client.post('/api/import?type=patients', data=body + '\n{"name": "", "age": 30, "phone": "111"}')
+        assert response.status_code == 400
+        assert response.get_json()['imported'] == 2
+        assert response.get_json()['errors'] == [{'record': 3, 'message': 'Name is required'}]
+        assert len(client.get('/api/patients').get_json()) == 5  # The first batch stays imported
+    
+    # Test 79: exports stream every record as NDJSON or a JSON array
+    def test_export(self, client):
+        """Test both export formats of both record types."""
+        clinic_app.clinic.bulk_add_patients([{'name': f"Patient {i}", 'age': 30, 'phone': "111"} for i in range(1200)])
+        clinic_app.clinic.add_appointment(7, "2025-12-25", "Checkup")
+        lines = client.get('/api/patients/export').data.decode().splitlines()
+        assert len(lines) == 1200 and json.loads(lines[-1])['name'] == "Patient 1199"
+        exported = client.get('/api/patients/export?format=json')
+        assert exported.mimetype == 'application/json' and exported.get_json() == clinic_app.clinic.get_all_patients()
+        assert client.get('/api/appointments/export?format=json').get_json() == [
+            clinic_app.clinic.get_all_appointments()[0]]
+    
+    # Test 80: pages link to the next one until the last
+    def test_paging_headers(self, client):
+        """Test Link, X-Next-Cursor and X-Total-Count while walking all pages."""
+        clinic_app.clinic.bulk_add_patients([{'name': f"Patient {i}", 'age': 30, 'phone': "111"} for i in range(5)])
+        url, names = '/api/patients?limit=2', []
+        while url:
+            response = client.get(url)
+            assert response.headers['X-Total-Count'] == '5'
+            names.extend(p['name'] for p in response.get_json())
+            link = response.headers.get('Link')
+            assert (link is None) == ('X-Next-Cursor' not in response.headers)
+            url = link and link[1:link.index('>')]
+            assert url is None or f"cursor={response.headers['X-Next-Cursor']}" in url
+        assert names == [f"Patient {i}" for i in range(5)]
+    
+    # Test 81: the change feed checks its arguments and long polls
+    def test_changes(self, client):
+        """Test rejected arguments, a resync and a long poll woken by a write."""
+        for query in ('since=abc', 'limit=0', 'wait=-1', f'wait={clinic_app.MAX_CHANGES_WAIT + 1}'):
+            assert client.get(f'/api/changes?{query}').status_code == 400
+        start = client.get('/api/changes').get_json()
+        assert start['resync']
+        
+        writer = threading.Timer(0.05, clinic_app.clinic.add_patient, ("Ahmed Ali", "30", "111"))
+        writer.start()
+        polled = client.get(f"/api/changes?since={start['last_seq']}&wait=5").get_json()
+        writer.join()
+        assert [(c['op'], c['record']['name']) for c in polled['changes']] == [('upsert', "Ahmed Ali")]
+        assert client.get(f"/api/changes?since={polled['last_seq']}").get_json()['changes'] == []
+    
+    # Test 82: batched patient reads by id, with or without their appointments
+    def test_patients_by_id(self, client):
+        """Test ?ids=, ?include=appointments and the per-patient routes."""
+        clinic_app.clinic.bulk_add_patients([{'name': f"Patient {i}", 'age': 30, 'phone': "111"} for i in range(3)])
+        clinic_app.clinic.add_appointment(2, "2025-12-25", "Checkup")
+        assert [p['id'] for p in client.get('/api/patients?ids=3,1,9,3').get_json()] == [3, 1]
+        embedded = client.get('/api/patients?ids=2,1&include=appointments').get_json()
+        assert [[a['description'] for a in p['appointments']] for p in embedded] == [["Checkup"], []]
+        for url in ('/api/patients?ids=1,x', '/api/patients?ids=1&include=doctors', '/api/patients/1?include=doctors'):
+            assert client.get(url).status_code == 400
+        
+        assert client.get('/api/patients/2').get_json()['name'] == "Patient 1"
+        assert client.get('/api/patients/2?include=appointments').get_json()['appointments'][0]['date'] == "2025-12-25"
+        assert [a['description'] for a in client.get('/api/patients/2/appointments').get_json()] == ["Checkup"]
+        assert client.get('/api/patients/1/appointments').get_json() == []
+        assert client.get('/api/patients/9').status_code == 404
+        assert client.get('/api/patients/9/appointments').status_code == 404
+    
+    # Test 83: the real app serves fingerprinted assets and compresses large responses
+    def test_assets_and_compression(self, client):
+        """Test asset_url in pages, /assets/ encodings and caching, and JSON compression."""
+        with clinic_app.app.test_request_context():
+            url = clinic_app.app.jinja_env.globals['asset_url']('css/style.css')
+        assert url.startswith('/assets/css/style.') and url.encode() in client.get('/').data
+        plain = client.get(url)
+        assert plain.headers['Cache-Control'] == IMMUTABLE
+        compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert compressed.headers['Content-Encoding'] == 'gzip' and gzip.decompress(compressed.data) == plain.data
+        assert client.get('/assets/css/style.css').status_code == 404  # Only fingerprinted names are served
+        
+        clinic_app.clinic.bulk_add_patients([{'name': f"Patient {i}", 'age': 30, 'phone': "111"} for i in range(20)])
+        response = client.get('/api/patients', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(response.data)) == client.get('/api/patients').get_json()
+    
+    # Test 84: booking for a patient that does not exist re-shows the form with an error
+    def test_appointment_for_missing_patient(self, client):
+        """Test the PatientNotFound path of the create form."""
+        response = client.post('/appointments/create',
+                               data={'patient_id': '9', 'date': "2025-12-25", 'description': "Checkup"})
+        assert response.status_code == 200 and b'Patient not found' in response.data
+        assert clinic_app.clinic.get_all_appointments() == []
 
 
 # Run tests if executed directly
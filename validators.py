@@ -0,0 +1,112 @@
+"""
+Input validation rules for the Clinic application.
+Shared by the form routes and the bulk import path so both enforce the same rules,
+and by both API servers (app.py, async_api.py) for the paging and ?ids= arguments.
+"""
+from scheduling import MINUTES_PER_DAY, parse_time
+
+MAX_PAGE_SIZE = 1000  # Most records one API request returns
+
+
+class ValidationError(ValueError):
+    """Raised when one or more records fail validation; nothing is written."""
+    
+    def __init__(self, errors):
+        """
+        Args:
+            errors: List of (record_index, message) tuples
+        """
+        self.errors = errors
+        super().__init__(f'{len(errors)} validation error(s), first: '
+                         f'record {errors[0][0]}: {errors[0][1]}' if errors else 'validation failed')
+    
+    def __reduce__(self):
+        # Rebuild from the error list (e.g. when raised in a shard worker process)
+        return type(self), (self.errors,)
+
+
+class PatientNotFound(ValueError):
+    """Raised when an appointment refers to a patient that does not exist; nothing is written."""
+    
+    def __init__(self, patient_id):
+        self.patient_id = patient_id
+        super().__init__(f'Patient #{patient_id} not found')
+    
+    def __reduce__(self):
+        return type(self), (self.patient_id,)
+
+
+def validate_patient(name, age, phone):
+    """Return a list of error messages for patient form values (empty if valid)."""
+    errors = []
+    if not name:
+        errors.append('Name is required')
+    if not age:
+        errors.append('Age is required')
+    elif not age.isdigit() or int(age) < 0 or int(age) > 150:
+        errors.append('Age must be a valid number between 0 and 150')
+    if not phone:
+        errors.append('Phone is required')
+    return errors
+
+
+def validate_appointment(patient_id, date, description):
+    """Return a list of error messages for appointment form values (empty if valid)."""
+    errors = []
+    if not patient_id:
+        errors.append('Please select a patient')
+    elif not str(patient_id).isdigit():
+        errors.append('Patient ID must be a number')
+    if not date:
+        errors.append('Date is required')
+    if not description:
+        errors.append('Description is required')
+    return errors
+
+
+def validate_schedule(start_time, duration):
+    """Return a list of error messages for the optional start time / duration values."""
+    errors = []
+    duration = str(duration) if duration not in (None, '') else ''
+    if not start_time:
+        if duration:
+            errors.append('A start time is required when a duration is given')
+        return errors
+    try:
+        start = parse_time(start_time)
+    except ValueError:
+        return ['Start time must be in HH:MM format']
+    if duration and not duration.isdigit():
+        errors.append('Duration must be a whole number of minutes')
+    elif duration and not 0 < int(duration) <= MINUTES_PER_DAY - start:
+        errors.append('Duration must be positive and end on the same day')
+    return errors
+
+
+def page_args(args, default_limit=None):
+    """
+    Read limit and cursor from query arguments (a mapping of strings); a missing
+    or invalid limit falls back to default_limit (None: no paging), a missing or
+    invalid cursor to None. Limits are capped at MAX_PAGE_SIZE.
+    """
+    limit = _int_arg(args, 'limit')
+    cursor = _int_arg(args, 'cursor')
+    if limit is None or limit < 1:
+        limit = default_limit
+    return (min(limit, MAX_PAGE_SIZE) if limit else None), cursor
+
+
+def id_list(text):
+    """Parse ?ids=1,2,3 into distinct ints in the order given (None if malformed or too many)."""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in text.split(',') if part.strip()))
+    except ValueError:
+        return None
+    return ids if len(ids) <= MAX_PAGE_SIZE else None
+
+
+def _int_arg(args, name):
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return None